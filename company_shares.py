@@ -4,215 +4,4358 @@ import sys
 import os
 import csv
 import copy
+import time
+import struct
+import tempfile
+import itertools
+import gzip
+import bz2
+import threading
+import Queue
 
 # importing collections to use ordered dictionary in python 2.7
 import collections
+import multiprocessing
+import mmap
+import marshal
+import heapq
+import array
+
+# numpy is optional. It is only required by the numpy processing engine.
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# lzma is optional. It is only required to read xz compressed CSV files.
+try:
+    import lzma
+except ImportError:
+    try:
+        from backports import lzma
+    except ImportError:
+        lzma = None
 
 # CONSTANTS
 COMPANY_HEADER = "COMPANY NAME"
+PHASE_HEADER = "PHASE"
+SECONDS_HEADER = "SECONDS"
+ERROR_TYPE_HEADER = "ERROR TYPE"
+ERROR_COUNT_HEADER = "ERRORS"
 YEAR_HEADER = "YEAR"
 MONTH_HEADER = "MONTH"
 SHARE_HEADER = "MAX SHARE VALUE"
+TOP_SHARE_HEADER = "SHARE VALUE"
+COMPANIES_HEADER = "COMPANIES"
+FIRST_MONTH_HEADER = "FIRST MONTH"
+LAST_MONTH_HEADER = "LAST MONTH"
+PERCENT_HEADER = "% OF COMPANIES"
 MIN_YEAR = 1990
 YEAR_COLUMN = 0
 MONTH_COLUMN = 1
 YEAR_HEADER = 'YEAR'
 MONTH_HEADER = 'MONTH'
 MIN_HEADER_COLUMNS = 3
+CSV_ERROR_FORMAT = "\n%s \n\tPlease Check the CSV file: %s"
+FIRST_COMPANY_COLUMN = 2
+INITIAL_SHARE_VALUE = -999999
+INITIAL_SHARE_TUPLE = ('NA', 'NA', INITIAL_SHARE_VALUE)
+
+# smallest byte range handed to a worker process by the chunked engine
+MIN_CHUNK_SIZE = 1 << 20
+
+# processing engines supported by SharesInfo
+PYTHON_ENGINE = 'python'
+NUMPY_ENGINE = 'numpy'
+CHUNKED_ENGINE = 'chunked'
+SHARDED_ENGINE = 'sharded'
+ENGINES = (PYTHON_ENGINE, NUMPY_ENGINE, CHUNKED_ENGINE, SHARDED_ENGINE)
+
+# month names as written in the CSV files. MONTH_INDEX_DICT maps the short and
+# full names, as written and in lower case, and the month numbers to the month
+# index, 0 for January, so that the usual spellings are found without stripping
+# and lowering them. The other spellings of a month, eg. 'Sept', 'JAN.' or '007',
+# are mapped by _parseMonthLabel.
+# shortest prefix of a full month name taken as the month, eg. 'Sept'
+MIN_MONTH_PREFIX = 3
+MONTH_NAMES = ('Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun',
+               'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec')
+FULL_MONTH_NAMES = ('January', 'February', 'March', 'April', 'May', 'June', 'July',
+                    'August', 'September', 'October', 'November', 'December')
+MONTH_INDEX_DICT = {}
+for monthIndex, monthName in enumerate(MONTH_NAMES):
+    MONTH_INDEX_DICT[monthName] = monthIndex
+    MONTH_INDEX_DICT[monthName.lower()] = monthIndex
+    MONTH_INDEX_DICT[FULL_MONTH_NAMES[monthIndex]] = monthIndex
+    MONTH_INDEX_DICT[FULL_MONTH_NAMES[monthIndex].lower()] = monthIndex
+    MONTH_INDEX_DICT[str(monthIndex + 1)] = monthIndex
+    MONTH_INDEX_DICT['%02d' % (monthIndex + 1)] = monthIndex
+del monthIndex, monthName
+
+# incremental processing state file
+STATE_FORMAT_VERSION = 5
+STATE_TAIL_SIZE = 256
+LINE_SEARCH_BLOCK_SIZE = 64 * 1024
+
+# decimal places of the share prices. Prices are kept as integers scaled by
+# 10 ** priceDecimals, which stay exact within 64 bits up to MAX_PRICE_DECIMALS.
+MAX_PRICE_DECIMALS = 9
+
+# readers of the share rows supported by SharesInfo
+CSV_READER = 'csv'
+MMAP_READER = 'mmap'
+READERS = (CSV_READER, MMAP_READER)
+
+# layouts of the CSV files supported by SharesInfo. WIDE_LAYOUT has a column per
+# company, Year,Month,Company A,Company B,... and LONG_LAYOUT a row per company
+# and month, Year,Month,Company,Price.
+WIDE_LAYOUT = 'wide'
+LONG_LAYOUT = 'long'
+LAYOUTS = (WIDE_LAYOUT, LONG_LAYOUT)
+LONG_HEADER = ('YEAR', 'MONTH', 'COMPANY', 'PRICE')
+COMPANY_COLUMN = 2
+PRICE_COLUMN = 3
+
+# compression formats of the CSV files, detected by file extension or, for
+# other file names, by the magic bytes at the start of the file.
+GZIP_COMPRESSION = 'gzip'
+BZIP2_COMPRESSION = 'bz2'
+XZ_COMPRESSION = 'xz'
+COMPRESSION_EXTENSIONS = {'.gz': GZIP_COMPRESSION, '.bz2': BZIP2_COMPRESSION,
+                          '.xz': XZ_COMPRESSION}
+COMPRESSION_MAGIC = (('\x1f\x8b', GZIP_COMPRESSION), ('BZh', BZIP2_COMPRESSION),
+                     ('\xfd7zXZ\x00', XZ_COMPRESSION))
+
+# size of the compressed blocks read by the decompression thread, and number of
+# decompressed blocks it may get ahead of the parser
+DECOMPRESS_BLOCK_SIZE = 256 * 1024
+DECOMPRESS_QUEUE_SIZE = 8
+
+# binary columnar shares store compiled from a CSV file. The file starts with
+# STORE_PREFIX_FORMAT (magic, format version, metadata size) and the marshalled
+# metadata, followed, at 8 byte aligned offsets, by the int32 time key of every
+# row, the share values of every company and the validity bitmap of every company.
+# The time keys and share values are little endian whatever the platform, with
+# the share values as STORE_VALUE_FORMAT 64 bit integers.
+STORE_MAGIC = 'SHRSTORE'
+STORE_FORMAT_VERSION = 3
+STORE_EXTENSION = '.sharestore'
+STORE_PREFIX_FORMAT = '<8sII'
+STORE_PREFIX_SIZE = struct.calcsize(STORE_PREFIX_FORMAT)
+STORE_ALIGNMENT = 8
+STORE_TIME_TYPECODE = 'i'
+STORE_VALUE_FORMAT = '<q'
+STORE_VALUE_SIZE = struct.calcsize(STORE_VALUE_FORMAT)
+
+# typecode of the arrays of share values. The native long is 64 bit on most
+# platforms but 32 bit on Windows, and Python 2 arrays have no 'q' typecode:
+# the store values are then read as lists of ints.
+SHARE_ARRAY_TYPECODE = 'l'
+
+# typecode of the company indexes of the months of a PeakMonthIndex
+COMPANY_INDEX_TYPECODE = 'i'
+
+# largest number of months without any peak inside a cluster of peak months,
+# number of clusters in the report and width of the bars of the histogram.
+PEAK_CLUSTER_GAP = 1
+PEAK_CLUSTER_REPORT_SIZE = 10
+PEAK_HISTOGRAM_WIDTH = 40
+
+# months are packed as int32 time keys, year * 12 + month index, which bounds
+# the years. NO_TIME_KEY stands for the initial share tuple of a Company().
+NO_TIME_KEY = -1
+MAX_TIME_KEY = (1 << 31) - 1
+MAX_YEAR = (MAX_TIME_KEY - 11) // 12
+
+# validity flags of the 8 rows of a bitmap byte, the first row in the highest bit
+BITMAP_FLAGS = tuple(tuple(bool(byte & (0x80 >> bit)) for bit in range(8))
+                     for byte in range(256))
+
+# reason codes of the errors of the ignored rows and cells, with their names in
+# the error summary. Row errors have no column.
+MISSING_SHARES_ERROR = 0
+EXTRA_SHARES_ERROR = 1
+INVALID_YEAR_ERROR = 2
+OLD_YEAR_ERROR = 3
+INVALID_SHARE_ERROR = 4
+MISSING_COMPANY_ERROR = 5
+DUPLICATE_MONTH_ERROR = 6
+INVALID_MONTH_ERROR = 7
+ERROR_NAMES = ('missing share values', 'extra share values', 'invalid year',
+               'year before %s' %MIN_YEAR, 'invalid share value', 'missing company name',
+               'duplicate company month', 'invalid month')
+NO_COLUMN = -1
+ERROR_MESSAGE_FORMATS = (
+    "Error while processing row:%(row)s. Insufficient share values data.\n\tIgnoring this row.",
+    "Error while processing row:%(row)s. Unexpected extra share value data.\n\tIgnoring this row.",
+    "\nInvalid string value at row:%(row)s,cloumn:%(column)s -> '%(value)s'"
+    "\nCould not convert the string into a number.",
+    "\nInvalid string value at row:%(row)s,cloumn:%(column)s -> '%(value)s'"
+    "\nThe tool only considers data from Year:%(minYear)s",
+    "\nInvalid string value at row:%(row)s,cloumn:%(column)s -> '%(value)s'"
+    "\nCould not convert the string into a number.",
+    "Error while processing row:%(row)s. Missing company name.\n\tIgnoring this row.",
+    "Error while processing row:%(row)s. Duplicate share value of company: %(value)s "
+    "for the month.\n\tIgnoring this row.",
+    "\nInvalid string value at row:%(row)s,cloumn:%(column)s -> '%(value)s'"
+    "\nExpected a month name or number.")
+
+# error records kept by a CsvErrorSink and messages shown in its summary
+DEFAULT_MAX_ERROR_RECORDS = 1000
+DEFAULT_SUMMARY_MESSAGES = 10
+
+# kinds of the items yielded by SharesInfo.iterResults, and number of share rows
+# read between two batches of yielded errors by the python engine
+RESULT_ITEM = 'result'
+ERROR_ITEM = 'error'
+RESULT_BATCH_ROWS = 1024
+
+# number of share rows checked together by RowValidator, and number of year and
+# month strings it caches, so that a file of garbage years cannot grow the cache.
+VALIDATION_BATCH_ROWS = 1024
+VALIDATION_CACHE_SIZE = 4096
+
+# phases timed by ProcessingStats, in display order.
+# VALIDATION, PARSING and TRACKING split the python loop over the share rows,
+# MATRIX is the parsing of the share matrix of the numpy engine and the cache,
+# ROWS is the loop over the share rows of the sharded workers and of the long
+# layout and WORKERS the
+# wall time of the worker processes of the parallel engines.
+CHECK_PHASE = 'checks'
+HEADER_PHASE = 'header'
+VALIDATION_PHASE = 'validation'
+PARSING_PHASE = 'parsing'
+TRACKING_PHASE = 'tracking'
+MATRIX_PHASE = 'matrix'
+ROWS_PHASE = 'rows'
+WORKERS_PHASE = 'workers'
+FINALIZE_PHASE = 'finalize'
+DISPLAY_PHASE = 'display'
+PHASES = (CHECK_PHASE, HEADER_PHASE, VALIDATION_PHASE, PARSING_PHASE, TRACKING_PHASE,
+          MATRIX_PHASE, ROWS_PHASE, WORKERS_PHASE, FINALIZE_PHASE, DISPLAY_PHASE)
+
+
+class ShareAggregator():
+    """
+    base class of the per company statistics computed in a single pass over
+    the share values. An aggregator is updated with the valid share values of a
+    company, in file order, and the aggregator of the rows that follow can be
+    merged into it, so the statistics work with the parallel engines too.
+    Subclasses set name and implement update, merge, getResult and formatResult.
+    updateColumn can be overridden with a faster version.
+    Company, the max share values with their ties, is the default aggregator.
+    """
+    name = None
+
+    def update(self, timeKey, shareValue):
+        """
+        Update the statistic with the share value of a month, given by its time key.
+        """
+
+        raise NotImplementedError
+
+
+    def updateColumn(self, timeKeys, shareValues):
+        """
+        Update the statistic with the share values of a company column, in file
+        order, as found by the engines working on a share matrix.
+        """
+
+        for timeKey, shareValue in zip(timeKeys, shareValues):
+            self.update(timeKey, shareValue)
+
+
+    def merge(self, otherAggregator):
+        """
+        Merge the aggregator of the rows that follow the rows of this aggregator.
+        """
+
+        raise NotImplementedError
+
+
+    def getResult(self):
+        """
+        Return the value of the statistic.
+        """
+
+        raise NotImplementedError
+
+
+    def formatResult(self, priceDecimals=0):
+        """
+        Return the value of the statistic as displayed, the share values having
+        priceDecimals decimal places.
+        """
+
+        return str(self.getResult())
+
+
+class Company(ShareAggregator):
+    """
+    class to store per company max share value info
+    """
+    name = 'max'
+
+    # aggregators of the other statistics, see AggregatedCompany
+    aggregators = ()
+
+    def __init__(self, topCount=1, tieLimit=None):
+        """
+        initialize the max share info of a company. The months are kept as packed
+        time keys, year * 12 + month index, so a month takes 4 bytes and the
+        months compare chronologically. The (year, month) strings are only built
+        by finalizeTopShares(), that sets maxShareList:
+        maxShareList = [(Year, Month, maxShareValue),]
+        eg. maxShareList = [('2013', 'Jan', 2000),]
+        Using list of tuples as companies can maxShareValue for more than one month.
+
+        With topCount K > 1, the months with the K highest share values are kept
+        in a heap of K entries, plus the months tied with the lowest of them.
+        maxShareList holds these months ranked by share value, ties in
+        chronological order. K = 1 is the max value with its ties.
+
+        With tieLimit N, only the first N and the last N months tied at the max
+        value are kept, and the months in between are counted in droppedTies.
+        The tied months are compacted once 3 N of them are stored, so a company
+        with many ties costs at most 3 N time keys.
+
+        :parameters:
+            topCount: `int`
+                number of highest months to keep.
+
+            tieLimit: `int`
+                number of first and of last tied months to keep with topCount = 1.
+                None keeps all of them.
+
+        :returns:
+            None
+
+        :raises:
+            None
+            
+        """
+
+        # initialising share value with a very small negative number.
+        # in normal circumstances, we do not expect the share values
+        # to reach this low. This logic could be improved but currently assuming.
+   
+        # list of tuples for max share info, (year, month, share_value), set by
+        # finalizeTopShares()
+        self.maxShareList = [INITIAL_SHARE_TUPLE,]
+        self.topCount = topCount
+
+        # max share value and the time keys of the months tied with it, in file
+        # order. NO_TIME_KEY stands for the initial share tuple.
+        self.maxShareValue = INITIAL_SHARE_VALUE
+        self.timeKeys = array.array(STORE_TIME_TYPECODE, [NO_TIME_KEY])
+
+        # number of months tied at the max value dropped between the first and
+        # the last tieLimit ones, and the number of stored months compacted.
+        self.tieLimit = tieLimit
+        self.droppedTies = 0
+        self.tieCapacity = sys.maxint if tieLimit is None else 3 * tieLimit
+
+        # min heap of (share_value, sequence, time_key) of the topCount highest
+        # months and the months tied with the root that did not fit in the heap.
+        # The initial tuple ranks like a share value, as it does for K = 1.
+        if topCount > 1:
+            self.topShareHeap = [(INITIAL_SHARE_VALUE, -1, NO_TIME_KEY)]
+            self.topShareTies = []
+            self.topShareSequence = 0
+
+
+    def updateMaxShareKey(self, timeKey, shareValue):
+        """
+        Update the max share info with the share value of a month.
+        A bigger value replaces the tied months and an equal value is appended
+        to them, dropping the middle ones if tieLimit is exceeded.
+
+        :parameters:
+            timeKey: `int`
+                time key of the month, as returned by getTimeKey.
+
+            shareValue: `int`
+                share value of the company for the month.
+
+        :returns:
+            None
+
+        :raises:
+            None
+
+        """
+
+        if self.topCount > 1:
+            self._pushTopShare(timeKey, shareValue)
+            return
+
+        if shareValue > self.maxShareValue:
+            self.maxShareValue = shareValue
+            del self.timeKeys[1:]
+            self.timeKeys[0] = timeKey
+            self.droppedTies = 0
+        elif shareValue == self.maxShareValue:
+            self.timeKeys.append(timeKey)
+            if len(self.timeKeys) > self.tieCapacity:
+                self._dropTies()
+
+
+    def updateMaxShare(self, year, month, shareValue):
+        """
+        Update the max share info with the share value of a month given by its
+        year and month as in the CSV file. See updateMaxShareKey.
+
+        :parameters:
+            year: `string`
+                year of the share value as in the CSV file.
+
+            month: `string`
+                month of the share value as in the CSV file.
+
+            shareValue: `int`
+                share value of the company for the year and month.
+
+        :returns:
+            None
+
+        :raises:
+            Exception: `CsvError`
+                if the year is not a number or the month is unknown.
+
+        """
+
+        self.updateMaxShareKey(getTimeKey(year, month), shareValue)
+
+
+    def _pushTopShare(self, timeKey, shareValue):
+        """
+        Push the share value of a month in the bounded heap of the top months.
+        """
+
+        shareEntry = (shareValue, self.topShareSequence, timeKey)
+        self.topShareSequence+= 1
+
+        if len(self.topShareHeap) < self.topCount:
+            heapq.heappush(self.topShareHeap, shareEntry)
+        elif shareValue == self.topShareHeap[0][0]:
+            self.topShareTies.append(shareEntry)
+        elif shareValue > self.topShareHeap[0][0]:
+            removedEntry = heapq.heapreplace(self.topShareHeap, shareEntry)
+            if removedEntry[0] == self.topShareHeap[0][0]:
+                self.topShareTies.append(removedEntry)
+            else:
+                self.topShareTies = []
+
+
+    def _dropTies(self):
+        """
+        Drop the tied months between the first and the last tieLimit ones,
+        counting them in droppedTies.
+        """
+
+        dropCount = len(self.timeKeys) - 2 * self.tieLimit
+        if dropCount > 0:
+            del self.timeKeys[self.tieLimit:self.tieLimit + dropCount]
+            self.droppedTies+= dropCount
+
+
+    def getTopShares(self):
+        """
+        Return the kept months and their share values in their packed form,
+        highest share value first, ties in chronological order. With tieLimit,
+        the months counted in droppedTies are not returned.
+
+        :parameters:
+            None
+
+        :returns:
+            (timeKeys, shareValues): `tuple`
+                int32 array with the time keys of the months, NO_TIME_KEY for
+                the initial share tuple, and the list of their share values.
+
+        :raises:
+            None
+
+        """
+
+        if self.topCount == 1:
+            if self.tieLimit is not None:
+                self._dropTies()
+            return self.timeKeys, [self.maxShareValue] * len(self.timeKeys)
+
+        shareEntries = sorted(self.topShareHeap + self.topShareTies,
+                              key=lambda shareEntry: (-shareEntry[0], shareEntry[1]))
+        timeKeys = array.array(STORE_TIME_TYPECODE,
+                               [timeKey for shareValue, sequence, timeKey in shareEntries])
+        return timeKeys, [shareValue for shareValue, sequence, timeKey in shareEntries]
+
+
+    def finalizeTopShares(self):
+        """
+        Set maxShareList to the (year, month, shareValue) tuples of the kept
+        months, ranked as by getTopShares. The strings of the years and month
+        names are only built here, with the canonical month names.
+
+        :parameters:
+            None
+
+        :returns:
+            None
+
+        :raises:
+            None
+
+        """
+
+        timeKeys, shareValues = self.getTopShares()
+        self.maxShareList = [formatTimeKey(timeKey) + (shareValue,)
+                             for timeKey, shareValue in zip(timeKeys, shareValues)]
+
+
+    def mergeTopShares(self, timeKeys, shareValues, droppedTies=0):
+        """
+        Merge months and share values, ranked as by getTopShares and found over
+        the rows that follow the rows of this company, into this company.
+        Merging the partial results in file order gives the same months, ties
+        and chronological order included, as a single pass over the file.
+        With topCount = 1, the months have to be tied with the same share value.
+        With tieLimit, the merged ties are the first and last tieLimit months of
+        both parts, and their dropped months are added up with the ones between
+        them, so the result does not depend on how the file was split.
+
+        :parameters:
+            timeKeys: `sequence`
+                time keys of the months. The initial share tuple, NO_TIME_KEY,
+                is ignored.
+
+            shareValues: `sequence`
+                share values of the months.
+
+            droppedTies: `int`
+                number of tied months dropped from timeKeys, as in droppedTies.
+
+        :returns:
+            None
+
+        :raises:
+            None
+
+        """
+
+        shareEntries = [(timeKey, shareValue) for timeKey, shareValue
+                        in zip(timeKeys, shareValues) if timeKey != NO_TIME_KEY]
+        if not shareEntries:
+            return
+
+        if self.topCount > 1:
+            for timeKey, shareValue in shareEntries:
+                self._pushTopShare(timeKey, shareValue)
+            return
+
+        otherShareValue = shareEntries[0][1]
+        if otherShareValue > self.maxShareValue:
+            self.maxShareValue = otherShareValue
+            self.timeKeys = array.array(STORE_TIME_TYPECODE,
+                                        [timeKey for timeKey, shareValue in shareEntries])
+            self.droppedTies = droppedTies
+        elif otherShareValue == self.maxShareValue:
+            self.timeKeys.extend([timeKey for timeKey, shareValue in shareEntries])
+            self.droppedTies+= droppedTies
+        else:
+            return
+        if self.tieLimit is not None:
+            self._dropTies()
+
+
+    def mergeCompany(self, otherCompany):
+        """
+        Merge the max share info of otherCompany, computed over the rows that
+        follow the rows of this company, into this company. See mergeTopShares.
+
+        :parameters:
+            otherCompany: `Company`
+                Company() object with the max share info of the later rows.
+
+        :returns:
+            None
+
+        :raises:
+            None
+
+        """
+
+        timeKeys, shareValues = otherCompany.getTopShares()
+        self.mergeTopShares(timeKeys, shareValues, otherCompany.droppedTies)
+
+
+    # the ShareAggregator interface of the max share values
+    update = updateMaxShareKey
+    merge = mergeCompany
+
+
+    def getResult(self):
+        """
+        Return the (year, month, shareValue) of the kept months, ranked as by
+        getTopShares, without the initial share tuple.
+        """
+
+        timeKeys, shareValues = self.getTopShares()
+        return [formatTimeKey(timeKey) + (shareValue,)
+                for timeKey, shareValue in zip(timeKeys, shareValues) if timeKey != NO_TIME_KEY]
+
+
+    def updateAggregators(self, timeKeys, shareValues):
+        """
+        Update the aggregators of the other statistics with the valid share
+        values of the company column of a share matrix.
+        """
+
+        for aggregator in self.aggregators:
+            aggregator.updateColumn(timeKeys, shareValues)
+
+
+    def mergeAggregators(self, aggregators):
+        """
+        Merge the aggregators of the other statistics of the rows that follow
+        the rows of this company.
+        """
+
+        for aggregator, otherAggregator in zip(self.aggregators, aggregators):
+            aggregator.merge(otherAggregator)
+
+
+    def getStatistics(self):
+        """
+        Return an ordered dictionary with the names of the other statistics as
+        keys and their results as values.
+        """
+
+        return collections.OrderedDict([(aggregator.name, aggregator.getResult())
+                                        for aggregator in self.aggregators])
+
+
+class AggregatedCompany(Company):
+    """
+    class to store per company max share value info along with other
+    statistics, updated in the same pass over the share values.
+    Plain Company objects are used when there are no other statistics, so
+    that the update of the max share values stays a single call.
+    """
+    def __init__(self, topCount=1, aggregatorClasses=(), tieLimit=None):
+        """
+        initialize the max share info and an aggregator of every class.
+
+        :parameters:
+            topCount: `int`
+                number of highest months to keep.
+
+            aggregatorClasses: `list`
+                ShareAggregator subclasses of the other statistics.
+
+            tieLimit: `int`
+                number of first and of last tied months to keep, see Company.
+
+        :returns:
+            None
+
+        :raises:
+            None
+
+        """
+
+        Company.__init__(self, topCount, tieLimit)
+        self.aggregators = [aggregatorClass() for aggregatorClass in aggregatorClasses]
+
+
+    def update(self, timeKey, shareValue):
+        self.updateMaxShareKey(timeKey, shareValue)
+        for aggregator in self.aggregators:
+            aggregator.update(timeKey, shareValue)
+
+
+    def merge(self, otherCompany):
+        self.mergeCompany(otherCompany)
+        self.mergeAggregators(otherCompany.aggregators)
+
+
+class YearlyPeakAggregator(ShareAggregator):
+    """
+    class to find the peak share value of a company in every year, with the
+    months tied at the peak. The peaks are kept in a dictionary keyed by year,
+    the peak share value along with a mask of the tied months, so a year costs
+    one entry whatever its ties and a gap between the years seen costs nothing.
+    The share values are python ints, of any size.
+    A month repeated in the file is counted once.
+    Result: (year, month, shareValue) of the peak months, in chronological order.
+    """
+    name = 'yearly'
+
+    def __init__(self):
+        # year -> [peak share value, mask of the months tied at the peak]
+        self.yearPeaks = {}
+
+
+    def update(self, timeKey, shareValue):
+        year, monthIndex = divmod(timeKey, 12)
+        yearPeak = self.yearPeaks.get(year)
+        if yearPeak is None or shareValue > yearPeak[0]:
+            self.yearPeaks[year] = [shareValue, 1 << monthIndex]
+        elif shareValue == yearPeak[0]:
+            yearPeak[1]|= 1 << monthIndex
+
+
+    def merge(self, otherAggregator):
+        for year, (shareValue, monthMask) in otherAggregator.yearPeaks.iteritems():
+            yearPeak = self.yearPeaks.get(year)
+            if yearPeak is None or shareValue > yearPeak[0]:
+                self.yearPeaks[year] = [shareValue, monthMask]
+            elif shareValue == yearPeak[0]:
+                yearPeak[1]|= monthMask
+
+
+    def getYearPeak(self, year):
+        """
+        Return the (shareValue, monthMask) of the peak of a year, None if the
+        company has no valid share value that year.
+        """
+
+        yearPeak = self.yearPeaks.get(year)
+        if yearPeak is None:
+            return None
+        return tuple(yearPeak)
+
+
+    def getResult(self):
+        peakList = []
+        for year in sorted(self.yearPeaks):
+            shareValue, monthMask = self.yearPeaks[year]
+            peakList.extend((str(year), monthName, shareValue)
+                            for monthName in _getMaskMonths(monthMask))
+        return peakList
+
+
+    def formatResult(self, priceDecimals=0):
+        return str(len(self.yearPeaks))
+
+
+class YearlyPeakTable():
+    """
+    class to store the yearly peaks of the companies of a CSV file as a
+    companies x years table: the peak share value and the mask of the months
+    tied at the peak of every company and year with a valid share value, in a
+    dictionary per company keyed by year. The years of the table are the years
+    with a peak of any company, so a year far from the others costs one column.
+    """
+    def __init__(self, companyNames):
+        """
+        initialize an empty table.
+
+        :parameters:
+            companyNames: `list`
+                company names in table order.
+
+        :returns:
+            None
+
+        :raises:
+            None
+
+        """
+
+        self.companyNames = list(companyNames)
+        # year -> (peak share value, mask of the tied months), per company
+        self.companyPeaks = [{} for companyName in self.companyNames]
+
+
+    def setCompanyPeaks(self, companyIndex, yearlyAggregator):
+        """
+        Copy the yearly peaks of a YearlyPeakAggregator into the row of a company.
+        """
+
+        self.companyPeaks[companyIndex] = dict(
+            (year, tuple(yearPeak)) for year, yearPeak in yearlyAggregator.yearPeaks.iteritems())
+
+
+    def getYears(self):
+        """
+        Return the years of the table, the years with a peak of any company in
+        chronological order.
+        """
+
+        return sorted(set().union(*self.companyPeaks))
+
+
+    def getPeak(self, companyName, year):
+        """
+        Return the peak of a company in a year.
+
+        :parameters:
+            companyName: `string`
+                name of the company.
+
+            year: `int`
+                year of the peak.
+
+        :returns:
+            (shareValue, monthNames): `tuple`
+                peak share value and short names of the months tied at the peak,
+                in chronological order. None if the company has no valid share
+                value that year.
+
+        :raises:
+            Exception: `CsvError`
+                if the company is not in the table.
+
+        """
+
+        if companyName not in self.companyNames:
+            raise CsvError("Company: %s is not in the CSV file." %companyName)
+        yearPeak = self.companyPeaks[self.companyNames.index(companyName)].get(year)
+        if yearPeak is None:
+            return None
+        return yearPeak[0], _getMaskMonths(yearPeak[1])
+
+
+    def iterPeaks(self):
+        """
+        Yield the (companyName, year, monthNames, shareValue) of every cell with
+        a peak, company by company and year by year.
+        """
+
+        for companyName, yearPeaks in zip(self.companyNames, self.companyPeaks):
+            for year in sorted(yearPeaks):
+                shareValue, monthMask = yearPeaks[year]
+                yield (companyName, year, _getMaskMonths(monthMask), shareValue)
+
+
+class PeakMonthIndex():
+    """
+    class to store the inverted index of the max share values of the companies
+    of a CSV file: for every month, the indexes of the companies whose max
+    share value, their all-time high, falls in that month. The indexes are kept
+    in an int32 array per month, keyed by the packed time key of the month, and
+    are added from the packed time keys of the companies as they are finalized.
+    """
+    def __init__(self, companyNames):
+        """
+        initialize an empty index.
+
+        :parameters:
+            companyNames: `list`
+                company names in index order.
+
+        :returns:
+            None
+
+        :raises:
+            None
+
+        """
+
+        self.companyNames = list(companyNames)
+
+        # time key -> array of the indexes of the companies peaking that month
+        self.companyIndexes = {}
+
+        # number of tied months dropped by the companies with a tieLimit, that
+        # are not indexed.
+        self.droppedPeaks = 0
+
+
+    def addCompanyPeaks(self, companyIndex, timeKeys, shareValues, droppedTies=0):
+        """
+        Add the months tied at the max share value of a company, as returned by
+        Company.getTopShares. The lower top months and the initial share tuple
+        are not indexed, and a month repeated in the file is indexed once.
+        The companies have to be added in index order.
+        """
+
+        for timeKey, shareValue in zip(timeKeys, shareValues):
+            if shareValue != shareValues[0]:
+                break
+            if timeKey == NO_TIME_KEY:
+                continue
+            companyIndexes = self.companyIndexes.get(timeKey)
+            if companyIndexes is None:
+                companyIndexes = array.array(COMPANY_INDEX_TYPECODE)
+                self.companyIndexes[timeKey] = companyIndexes
+            elif companyIndexes[-1] == companyIndex:
+                continue
+            companyIndexes.append(companyIndex)
+        self.droppedPeaks+= droppedTies
+
+
+    def getCompanies(self, year, month):
+        """
+        Return the names of the companies whose max share value falls in a
+        month, in index order.
+
+        :parameters:
+            year: `int` or `string`
+                year, eg. 2001 or '2001'.
+
+            month: `int` or `string`
+                month number from 1 to 12 or month name, eg. 3, 'Mar' or 'March'.
+
+        :returns:
+            companyNames: `list`
+                names of the companies, empty if no company peaks that month.
+
+        :raises:
+            Exception: `CsvError`
+                if the year is not a number or the month is unknown.
+
+        """
+
+        return [self.companyNames[companyIndex] for companyIndex
+                in self.companyIndexes.get(getTimeKey(year, month), ())]
+
+
+    def getPeakCount(self, year, month):
+        """
+        Return the number of companies whose max share value falls in a month.
+        See getCompanies.
+        """
+
+        return len(self.companyIndexes.get(getTimeKey(year, month), ()))
+
+
+    def getHistogram(self):
+        """
+        Return the (year, month, companyCount) of every month in which at least
+        one company peaks, in chronological order.
+        """
+
+        return [formatTimeKey(timeKey) + (len(self.companyIndexes[timeKey]),)
+                for timeKey in sorted(self.companyIndexes)]
+
+
+    def getClusters(self, clusterGap=PEAK_CLUSTER_GAP):
+        """
+        Return the clusters of peak months, the runs of months with peaks that
+        are separated by at most clusterGap months without any peak, ranked by
+        the number of companies peaking in them, then chronologically.
+
+        :parameters:
+            clusterGap: `int`
+                largest number of months without any peak inside a cluster.
+
+        :returns:
+            clusterList: `list`
+                (firstYear, firstMonth, lastYear, lastMonth, companyCount) of
+                every cluster. A company is counted once per cluster.
+
+        :raises:
+            None
+
+        """
+
+        clusterKeys = []
+        companySet = set()
+        firstKey = lastKey = None
+        for timeKey in sorted(self.companyIndexes):
+            if lastKey is not None and timeKey - lastKey > clusterGap + 1:
+                clusterKeys.append((firstKey, lastKey, len(companySet)))
+                companySet = set()
+                firstKey = None
+            if firstKey is None:
+                firstKey = timeKey
+            companySet.update(self.companyIndexes[timeKey])
+            lastKey = timeKey
+        if firstKey is not None:
+            clusterKeys.append((firstKey, lastKey, len(companySet)))
+
+        clusterKeys.sort(key=lambda clusterInfo: (-clusterInfo[2], clusterInfo[0]))
+        return [formatTimeKey(firstKey) + formatTimeKey(lastKey) + (companyCount,)
+                for firstKey, lastKey, companyCount in clusterKeys]
+
+
+class MappedRow():
+    """
+    class to access the fields of a share row directly in a memory mapped CSV file.
+    Only the field boundaries are kept. A field is sliced from the mapped buffer
+    when it is accessed, so the row behaves like the list of strings given by
+    csv.reader without materializing it.
+    Quoted fields are not supported.
+    """
+    def __init__(self, shareMap, fieldOffsets):
+        """
+        initialize the row with the mapped buffer and the field boundaries.
+
+        :parameters:
+            shareMap: `mmap.mmap`
+                memory mapped CSV file.
+
+            fieldOffsets: `list`
+                start offset of every field followed by the offset one byte after
+                the end of the last field. Field i is shareMap[fieldOffsets[i]:fieldOffsets[i+1]-1]
+                and is empty for an empty line.
+
+        :returns:
+            None
+
+        :raises:
+            None
+
+        """
+
+        self.shareMap = shareMap
+        self.fieldOffsets = fieldOffsets
+
+
+    def __len__(self):
+        return len(self.fieldOffsets) - 1
+
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[fieldIndex] for fieldIndex in range(*index.indices(len(self)))]
+        if index < 0:
+            index+= len(self)
+        if index < 0 or index >= len(self):
+            raise IndexError("row field index out of range")
+        return self.shareMap[self.fieldOffsets[index]:self.fieldOffsets[index+1]-1]
+
+
+class CsvError(Exception):
+    """
+    custom exception to raise if CSV file cannot be accessed
+    or is not readable or if it contains invalid data.
+    """
+    #using the default definition of the Exception class
+    pass
+
+
+class DecompressedFile():
+    """
+    class to read the lines of a compressed CSV file as they are decompressed.
+    A background thread reads and decompresses the file while the lines are
+    parsed, and hands the decompressed blocks over through a bounded queue, so
+    that at most DECOMPRESS_QUEUE_SIZE blocks are held in memory. zlib, bz2 and
+    lzma release the GIL while they decompress, so reading, decompression and
+    parsing overlap. Only sequential reading is supported: the object can be
+    iterated over and read with readline, like a file opened in binary mode.
+    """
+    def __init__(self, csvPath, compression):
+        """
+        open the compressed file and start the decompression thread.
+
+        :parameters:
+            csvPath: `string`
+                path of the compressed CSV file.
+
+            compression: `string`
+                GZIP_COMPRESSION, BZIP2_COMPRESSION or XZ_COMPRESSION.
+
+        :returns:
+            None
+
+        :raises:
+            Exception: `IOError`
+                if the file cannot be opened.
+
+        """
+
+        self.csvPath = csvPath
+        self.compression = compression
+        self.rawFile = open(csvPath, 'rb')
+        self.closed = False
+
+        # number of decompressed bytes of the lines read so far
+        self.position = 0
+
+        self.blockQueue = Queue.Queue(DECOMPRESS_QUEUE_SIZE)
+        self.lineIterator = self._iterLines()
+        self.thread = threading.Thread(target=self._decompress)
+        self.thread.daemon = True
+        self.thread.start()
+
+
+    def __iter__(self):
+        return self.lineIterator
+
+
+    def readline(self):
+        """
+        Return the next line, with its line ending, or '' at the end of the file.
+        """
+
+        for line in self.lineIterator:
+            return line
+        return ''
+
+
+    def tell(self):
+        """
+        Return the offset of the next line in the decompressed data.
+        """
+
+        return self.position
+
+
+    def close(self):
+        """
+        Stop the decompression thread and close the compressed file.
+        """
+
+        if self.closed:
+            return
+        self.closed = True
+        # the thread may be waiting for room in the queue.
+        while self.thread.is_alive():
+            try:
+                self.blockQueue.get(timeout=0.1)
+            except Queue.Empty:
+                pass
+        self.thread.join()
+        self.rawFile.close()
+
+
+    def _decompress(self):
+        """
+        Target of the decompression thread. Queues the decompressed blocks as
+        (block, None), then ('', None) at the end of the file or ('', error)
+        if the file cannot be decompressed.
+        """
+
+        try:
+            if self.compression == GZIP_COMPRESSION:
+                blockIterator = _iterGzipBlocks(self.rawFile)
+            elif self.compression == BZIP2_COMPRESSION:
+                blockIterator = _iterStreamBlocks(self.rawFile, bz2.BZ2Decompressor)
+            else:
+                blockIterator = _iterStreamBlocks(self.rawFile, lzma.LZMADecompressor)
+
+            for block in blockIterator:
+                if self.closed:
+                    return
+                self.blockQueue.put((block, None))
+            self.blockQueue.put(('', None))
+        except CsvError, e:
+            self.blockQueue.put(('', CsvError("Truncated compressed file: %s \n\t%s"
+                                              %(self.csvPath, e))))
+        except Exception, e:
+            self.blockQueue.put(('', CsvError("Could not decompress %s file: %s \n\t%s"
+                                              %(self.compression, self.csvPath, e))))
+
+
+    def _iterLines(self):
+        """
+        Yield the lines of the decompressed blocks. A last line without line
+        ending is yielded as it is.
+        """
+
+        pending = ''
+        while True:
+            block, error = self.blockQueue.get()
+            if error is not None:
+                raise error
+            if not block:
+                break
+
+            data = pending + block
+            start = 0
+            find = data.find
+            while True:
+                end = find('\n', start) + 1
+                if not end:
+                    break
+                self.position+= end - start
+                yield data[start:end]
+                start = end
+            pending = data[start:]
+
+        if pending:
+            self.position+= len(pending)
+            yield pending
+
+
+def parseShareValue(value, priceDecimals=0):
+    """
+    Return the integer share value of a string, scaled by 10 ** priceDecimals,
+    eg. '123.45' -> 12345 with 2 decimal places. Values with fewer decimal places
+    are padded and values with more are rejected, so that the scaled values
+    compare exactly. The usual forms, integers and values with exactly
+    priceDecimals places, are converted with a single int() call.
+
+    :parameters:
+        value: `string`
+            share value as in the CSV file, eg. '123.45'.
+
+        priceDecimals: `int`
+            number of decimal places of the share prices.
+
+    :returns:
+        shareValue: `int`
+            scaled share value.
+
+    :raises:
+        Exception: `ValueError`
+            if the string is not a number with at most priceDecimals decimal places.
+
+    """
+
+    if not priceDecimals:
+        return int(value)
+
+    whole, dot, fraction = value.partition('.')
+    if not dot:
+        return int(whole) * 10 ** priceDecimals
+    if len(fraction) == priceDecimals and fraction.isdigit():
+        return int(whole + fraction)
+
+    whole = whole.lstrip()
+    fraction = fraction.rstrip()
+    if (len(fraction) > priceDecimals or (fraction and not fraction.isdigit())
+        or not (whole.strip('+-') or fraction)):
+        raise ValueError("invalid literal for a share value with %s decimal places: '%s'"
+                         %(priceDecimals, value))
+    return int(whole + fraction + '0' * (priceDecimals - len(fraction)))
+
+
+def formatShareValue(shareValue, priceDecimals=0):
+    """
+    Return the string of a share value scaled by 10 ** priceDecimals, with
+    priceDecimals decimal places, eg. 12345 -> '123.45' with 2 decimal places.
+
+    :parameters:
+        shareValue: `int`
+            scaled share value.
+
+        priceDecimals: `int`
+            number of decimal places of the share prices.
+
+    :returns:
+        `string`
+            share value with its decimal places.
+
+    :raises:
+        None
+
+    """
+
+    if not priceDecimals:
+        return str(shareValue)
+
+    whole, fraction = divmod(abs(shareValue), 10 ** priceDecimals)
+    sign = '-' if shareValue < 0 else ''
+    return '%s%d.%0*d' %(sign, whole, priceDecimals, fraction)
+
+
+def getTimeKey(year, month):
+    """
+    Return the time key of a year and month, year * 12 + month index,
+    so that time keys sort chronologically.
+
+    :parameters:
+        year: `int` or `string`
+            year, eg. 2001 or '2001'.
+
+        month: `int` or `string`
+            month number from 1 to 12 or month name, eg. 3, 'Mar' or 'March'.
+
+    :returns:
+        timeKey: `int`
+            time key of the year and month.
+
+    :raises:
+        Exception: `CsvError`
+            if the year is not a number, is beyond MAX_YEAR or the month is unknown.
+
+    """
+
+    try:
+        yearValue = int(str(year).strip())
+    except ValueError:
+        raise CsvError("Invalid year: '%s'. Could not convert the string into a number." %year)
+    if not 0 <= yearValue <= MAX_YEAR:
+        raise CsvError("Invalid year: '%s'. Expected a year from 0 to %s." %(year, MAX_YEAR))
+
+    monthIndex = _getMonthIndex(str(month))
+    if monthIndex is None:
+        raise CsvError("Invalid month: '%s'. Expected a month name or number." %month)
+
+    return yearValue * 12 + monthIndex
+
+
+def formatTimeKey(timeKey):
+    """
+    Return the (year, month) strings of a time key, with the short month name,
+    eg. 2001 * 12 + 2 -> ('2001', 'Mar'). ('NA', 'NA') for NO_TIME_KEY.
+
+    :parameters:
+        timeKey: `int`
+            time key as returned by getTimeKey.
+
+    :returns:
+        (year, month): `tuple`
+            year and month name of the time key.
+
+    :raises:
+        None
+
+    """
+
+    if timeKey == NO_TIME_KEY:
+        return INITIAL_SHARE_TUPLE[:2]
+    return str(timeKey // 12), MONTH_NAMES[timeKey % 12]
+
+
+class SharesStore():
+    """
+    class to read a binary columnar shares store compiled by compileSharesStore.
+    The store is memory mapped when it is opened and the columns are only read
+    when they are used, so a run only touches the columns it scans.
+    The arrays returned for numpy share the mapped memory and keep it alive.
+    """
+    def __init__(self, storePath):
+        """
+        open the store and read its metadata.
+
+        :parameters:
+            storePath: `string`
+                path of the shares store.
+
+        :returns:
+            None
+
+        :raises:
+            Exception: `CsvError`
+                if the file is not a shares store, has another format version,
+                has share values of another layout or size or is truncated.
+
+            Exception: `IOError`
+                if the file cannot be opened.
+
+        """
+
+        self.storePath = storePath
+        storeFile = open(storePath, 'rb')
+        try:
+            fileSize = os.fstat(storeFile.fileno()).st_size
+            prefix = storeFile.read(STORE_PREFIX_SIZE)
+            if len(prefix) < STORE_PREFIX_SIZE:
+                raise CsvError("File: %s is not a shares store." %storePath)
+            magic, version, metadataSize = struct.unpack(STORE_PREFIX_FORMAT, prefix)
+            if magic != STORE_MAGIC:
+                raise CsvError("File: %s is not a shares store." %storePath)
+            if version != STORE_FORMAT_VERSION:
+                raise CsvError("Shares store: %s has format version %s instead of %s. "
+                               "Compile it again." %(storePath, version, STORE_FORMAT_VERSION))
+
+            try:
+                (valueFormat, itemSize, self.priceDecimals, self.headerList, self.rowCount,
+                 self.errorList, self.invalidCount) = marshal.loads(
+                    storeFile.read(metadataSize))
+            except (ValueError, EOFError, TypeError):
+                raise CsvError("Shares store: %s is corrupted." %storePath)
+            if valueFormat != STORE_VALUE_FORMAT or itemSize != STORE_VALUE_SIZE:
+                raise CsvError("Shares store: %s has share values of %s bytes as '%s' instead "
+                               "of %s bytes as '%s'. Compile it again."
+                               %(storePath, itemSize, valueFormat, STORE_VALUE_SIZE,
+                                 STORE_VALUE_FORMAT))
+
+            self.companyCount = len(self.headerList) - FIRST_COMPANY_COLUMN
+            self.itemSize = itemSize
+            self.bitmapSize = (self.rowCount + 7) // 8
+            self.timeOffset = _alignStoreOffset(STORE_PREFIX_SIZE + metadataSize)
+            self.valueOffset = _alignStoreOffset(self.timeOffset + 4 * self.rowCount)
+            self.bitmapOffset = self.valueOffset + itemSize * self.rowCount * self.companyCount
+            self.storeSize = self.bitmapOffset + self.bitmapSize * self.companyCount
+            if fileSize < self.storeSize:
+                raise CsvError("Shares store: %s is truncated." %storePath)
+
+            self.storeMap = mmap.mmap(storeFile.fileno(), 0, access=mmap.ACCESS_READ)
+        finally:
+            storeFile.close()
+
+
+    def getCompanyNames(self):
+        """
+        Return the company names of the store in header order.
+        """
+
+        return [companyName.strip() for companyName in self.headerList[FIRST_COMPANY_COLUMN:]]
+
+
+    def getTimeKeys(self):
+        """
+        Return an int32 array with the time key, year * 12 + month index, of
+        every row.
+        """
+
+        timeKeys = array.array(STORE_TIME_TYPECODE)
+        timeKeys.fromstring(self.storeMap[self.timeOffset:self.timeOffset + 4 * self.rowCount])
+        if sys.byteorder != 'little':
+            timeKeys.byteswap()
+        return timeKeys
+
+
+    def getValues(self, companyIndex):
+        """
+        Return an array with the share values of a company, in row order, or a
+        list where the arrays of SHARE_ARRAY_TYPECODE are narrower than the store
+        values. The invalid cells hold a value lower than the initial share value.
+        """
+
+        start = self.valueOffset + self.itemSize * self.rowCount * companyIndex
+        valueBytes = self.storeMap[start:start + self.itemSize * self.rowCount]
+        if array.array(SHARE_ARRAY_TYPECODE).itemsize != STORE_VALUE_SIZE:
+            return list(struct.unpack('<%sq' %self.rowCount, valueBytes))
+
+        values = array.array(SHARE_ARRAY_TYPECODE)
+        values.fromstring(valueBytes)
+        if sys.byteorder != 'little':
+            values.byteswap()
+        return values
+
+
+    def getValidFlags(self, companyIndex):
+        """
+        Return the validity flag of every share value of a company, False for
+        the invalid cells.
+        """
+
+        start = self.bitmapOffset + self.bitmapSize * companyIndex
+        bitmap = bytearray(self.storeMap[start:start + self.bitmapSize])
+        flagList = list(itertools.chain.from_iterable(map(BITMAP_FLAGS.__getitem__, bitmap)))
+        del flagList[self.rowCount:]
+        return flagList
+
+
+    def getShareMatrix(self):
+        """
+        Return the share values and the validity flags as numpy matrices,
+        rows = months, columns = companies. The share values are a view of the
+        mapped store. Requires numpy.
+        """
+
+        valueCount = self.rowCount * self.companyCount
+        shareMatrix = numpy.frombuffer(self.storeMap, dtype='<i%s' %self.itemSize,
+                                       count=valueCount, offset=self.valueOffset)
+        shareMatrix = shareMatrix.reshape(self.companyCount, self.rowCount).T
+
+        bitmapMatrix = numpy.frombuffer(self.storeMap, dtype=numpy.uint8,
+                                        count=self.bitmapSize * self.companyCount,
+                                        offset=self.bitmapOffset)
+        bitmapMatrix = bitmapMatrix.reshape(self.companyCount, self.bitmapSize)
+        validMatrix = numpy.unpackbits(bitmapMatrix, axis=1)[:, :self.rowCount].T
+        return shareMatrix, validMatrix.astype(bool)
+
+
+    def getShareMatrixLists(self):
+        """
+        Return the share values and the validity flags as flat, row major,
+        arrays like the valueList and validList of SharesInfo.loadShareMatrix.
+        """
+
+        companyCount = self.companyCount
+        if array.array(SHARE_ARRAY_TYPECODE).itemsize != STORE_VALUE_SIZE:
+            valueList = [0] * (self.rowCount * companyCount)
+        else:
+            valueList = array.array(SHARE_ARRAY_TYPECODE, [0]) * (self.rowCount * companyCount)
+        validList = array.array('b', [0]) * (self.rowCount * companyCount)
+        for companyIndex in range(companyCount):
+            valueList[companyIndex::companyCount] = self.getValues(companyIndex)
+            validList[companyIndex::companyCount] = array.array(
+                'b', self.getValidFlags(companyIndex))
+        return valueList, validList
+
+
+    def close(self):
+        """
+        Unmap the store. The arrays returned by getShareMatrix must not be
+        used anymore.
+        """
+
+        self.storeMap.close()
+
+
+def getCompression(csvPath):
+    """
+    Return the compression format of a CSV file, from its extension or, for
+    other file names, from the magic bytes at the start of the file.
+
+    :parameters:
+        csvPath: `string`
+            path of the CSV file.
+
+    :returns:
+        compression: `string`
+            GZIP_COMPRESSION, BZIP2_COMPRESSION or XZ_COMPRESSION, or None for
+            a plain CSV file.
+
+    :raises:
+        Exception: `IOError`
+            if the file has no known extension and cannot be read.
+
+    """
+
+    extension = os.path.splitext(csvPath)[1].lower()
+    if extension in COMPRESSION_EXTENSIONS:
+        return COMPRESSION_EXTENSIONS[extension]
+
+    csvFile = open(csvPath, 'rb')
+    try:
+        fileStart = csvFile.read(max(len(magic) for magic, compression in COMPRESSION_MAGIC))
+    finally:
+        csvFile.close()
+    for magic, compression in COMPRESSION_MAGIC:
+        if fileStart.startswith(magic):
+            return compression
+    return None
+
+
+def openCsvFile(csvPath):
+    """
+    Open a CSV file for reading, decompressing it on the fly if it is compressed.
+
+    :parameters:
+        csvPath: `string`
+            path of the CSV file.
+
+    :returns:
+        csvFile: `file` or `DecompressedFile`
+            file object opened in binary mode for a plain CSV file, and a
+            DecompressedFile() for a compressed one.
+
+    :raises:
+        Exception: `IOError`
+            if the file cannot be opened.
+
+    """
+
+    compression = getCompression(csvPath)
+    if compression is None:
+        return open(csvPath, 'rb')
+    return DecompressedFile(csvPath, compression)
+
+
+def isSharesStore(csvPath):
+    """
+    Return True if the file is a shares store compiled by compileSharesStore,
+    from its extension or its magic bytes.
+
+    :parameters:
+        csvPath: `string`
+            path of the CSV file or shares store.
+
+    :returns:
+        `bool`
+            True for a shares store.
+
+    :raises:
+        Exception: `IOError`
+            if the file has not the store extension and cannot be read.
+
+    """
+
+    if os.path.splitext(csvPath)[1].lower() == STORE_EXTENSION:
+        return True
+
+    csvFile = open(csvPath, 'rb')
+    try:
+        return csvFile.read(len(STORE_MAGIC)) == STORE_MAGIC
+    finally:
+        csvFile.close()
+
+
+def compileSharesStore(csvPath, storePath=None, reader=CSV_READER, priceDecimals=0):
+    """
+    Parse and validate a CSV file once and write it as a binary columnar shares
+    store, that SharesInfo opens directly instead of parsing the CSV again.
+    The rejected rows and cells are left out, and their errors are stored so
+    that runs over the store report them like runs over the CSV file.
+    The store is written to a temporary file first, so that readers never see
+    a partially written store.
+
+    :parameters:
+        csvPath: `string`
+            path of the CSV file, plain or compressed.
+
+        storePath: `string`
+            path of the store. Defaults to csvPath with STORE_EXTENSION appended.
+
+        reader: `string`
+            reader of the share rows. One of READERS.
+
+        priceDecimals: `int`
+            number of decimal places of the share prices. Runs over the store
+            have to use the same number.
+
+    :returns:
+        storePath: `string`
+            path of the written store.
+
+    :raises:
+        Exception: `CsvError`
+            if the CSV file path, reader, number of decimal places or header is
+            invalid, or if a share value does not fit the store integers.
+
+        Exception: `IOError`, `OSError`
+            if the store cannot be written.
+
+    """
+
+    if storePath is None:
+        storePath = csvPath + STORE_EXTENSION
+
+    sharesInfo = SharesInfo(csvPath, reader=reader, errorSink=CsvErrorSink(None),
+                            priceDecimals=priceDecimals)
+    sharesInfo.checkCsvPath(csvPath)
+    sharesInfo.checkReader(reader)
+    sharesInfo.checkPriceDecimals(priceDecimals)
+    maxShareDict, timeKeys, valueList, validList = sharesInfo.loadShareMatrix()
+    csvFile = openCsvFile(csvPath)
+    try:
+        headerList = csv.reader([csvFile.readline()], delimiter=',').next()
+    finally:
+        csvFile.close()
+
+    companyCount = len(maxShareDict)
+    rowCount = len(timeKeys)
+    metadata = marshal.dumps((STORE_VALUE_FORMAT, STORE_VALUE_SIZE, priceDecimals,
+                              list(headerList), rowCount, sharesInfo.errorSink.getRecords(),
+                              list(validList).count(False)), 2)
+    prefix = struct.pack(STORE_PREFIX_FORMAT, STORE_MAGIC, STORE_FORMAT_VERSION, len(metadata))
+
+    blockList = [prefix, metadata]
+    blockList.append('\0' * (_alignStoreOffset(len(prefix) + len(metadata))
+                             - len(prefix) - len(metadata)))
+    blockList.append(struct.pack('<%si' %rowCount, *timeKeys))
+    blockList.append('\0' * (_alignStoreOffset(4 * rowCount) - 4 * rowCount))
+    try:
+        for companyIndex in range(companyCount):
+            blockList.append(struct.pack('<%sq' %rowCount, *valueList[companyIndex::companyCount]))
+    except struct.error:
+        raise CsvError("Share values of CSV file: %s do not fit in %s bit integers."
+                       %(csvPath, 8 * STORE_VALUE_SIZE))
+    for companyIndex in range(companyCount):
+        blockList.append(_packValidFlags(validList[companyIndex::companyCount]))
+
+    storeDir = os.path.dirname(os.path.abspath(storePath))
+    fileHandle, tempPath = tempfile.mkstemp(dir=storeDir, suffix='.tmp')
+    try:
+        for block in blockList:
+            os.write(fileHandle, block)
+        os.close(fileHandle)
+        if os.path.exists(storePath):
+            os.remove(storePath)
+        os.rename(tempPath, storePath)
+    except (IOError, OSError):
+        if os.path.exists(tempPath):
+            os.remove(tempPath)
+        raise
+    return storePath
+
+
+def formatCsvError(reasonCode, rowIndex, columnIndex=NO_COLUMN, value=''):
+    """
+    Return the message of an error of an ignored row or cell, the same message
+    as the one of the CsvError raised by the SharesInfo checks.
+
+    :parameters:
+        reasonCode: `int`
+            reason of the error, eg. INVALID_SHARE_ERROR.
+
+        rowIndex: `int`
+            index of the share row.
+
+        columnIndex: `int`
+            index of the column, NO_COLUMN for the row errors.
+
+        value: `string`
+            offending value of the cell.
+
+    :returns:
+        errorMessage: `string`
+            message of the error.
+
+    :raises:
+        None
+
+    """
+
+    return ERROR_MESSAGE_FORMATS[reasonCode] %{'row': rowIndex, 'column': columnIndex,
+                                               'value': value, 'minYear': MIN_YEAR}
+
+
+class CsvErrorSink():
+    """
+    class to collect the errors of the ignored rows and cells as compact records
+    of reason code, row and column instead of formatted messages.
+    Every error is counted per reason and column, but only the first maxRecords
+    errors keep a record with the offending value. Messages are only formatted
+    when they are read.
+    """
+    def __init__(self, maxRecords=DEFAULT_MAX_ERROR_RECORDS):
+        """
+        initialize an empty sink.
+
+        :parameters:
+            maxRecords: `int`
+                number of errors recorded in detail. None records every error.
+
+        :returns:
+            None
+
+        :raises:
+            None
+
+        """
+
+        self.maxRecords = maxRecords
+        self.errorCount = 0
+
+        # (reasonCode, columnIndex) -> number of errors
+        self.errorCounts = {}
+
+        # recorded errors, in parallel arrays.
+        self.reasonCodes = array.array('b')
+        self.rowIndexes = array.array('l')
+        self.columnIndexes = array.array('l')
+        self.values = []
+
+
+    def addError(self, reasonCode, rowIndex, columnIndex=NO_COLUMN, value=''):
+        """
+        Count an error and record it if the sink is not full.
+
+        :parameters:
+            reasonCode: `int`
+                reason of the error, eg. INVALID_SHARE_ERROR.
+
+            rowIndex: `int`
+                index of the share row.
+
+            columnIndex: `int`
+                index of the column, NO_COLUMN for the row errors.
+
+            value: `string`
+                offending value of the cell.
+
+        :returns:
+            None
+
+        :raises:
+            None
+
+        """
+
+        self.errorCount+= 1
+        countKey = (reasonCode, columnIndex)
+        self.errorCounts[countKey] = self.errorCounts.get(countKey, 0) + 1
+        if self.maxRecords is None or len(self.values) < self.maxRecords:
+            self.reasonCodes.append(reasonCode)
+            self.rowIndexes.append(rowIndex)
+            self.columnIndexes.append(columnIndex)
+            self.values.append(value)
+
+
+    def getRecords(self):
+        """
+        Return the recorded errors as a list of (reasonCode, rowIndex, columnIndex, value).
+        """
+
+        return zip(self.reasonCodes, self.rowIndexes, self.columnIndexes, self.values)
+
+
+    def iterMessages(self):
+        """
+        Yield the message of every recorded error, formatted on demand.
+        """
+
+        for errorRecord in self.getRecords():
+            yield formatCsvError(*errorRecord)
+
+
+    def mergeSink(self, otherSink, rowOffset=0):
+        """
+        Add the errors of otherSink, eg. collected by a worker process, to this
+        sink. The recorded errors are kept in (row, column) order, so that merging
+        the sinks of the parts of a file keeps the first maxRecords errors of the file.
+
+        :parameters:
+            otherSink: `CsvErrorSink`
+                sink to merge.
+
+            rowOffset: `int`
+                number of share rows before the rows of otherSink, added to the
+                row indexes of its records, eg. for the sink of a byte range
+                numbered from its first row.
+
+        :returns:
+            None
+
+        :raises:
+            None
+
+        """
+
+        self.errorCount+= otherSink.errorCount
+        for countKey, errorCount in otherSink.errorCounts.items():
+            self.errorCounts[countKey] = self.errorCounts.get(countKey, 0) + errorCount
+
+        errorRecords = self.getRecords() + [
+            (reasonCode, rowIndex + rowOffset, columnIndex, value)
+            for reasonCode, rowIndex, columnIndex, value in otherSink.getRecords()]
+        errorRecords.sort(key=lambda errorRecord: (errorRecord[1], errorRecord[2]))
+        if self.maxRecords is not None:
+            errorRecords = errorRecords[:self.maxRecords]
+
+        self.reasonCodes = array.array('b', [record[0] for record in errorRecords])
+        self.rowIndexes = array.array('l', [record[1] for record in errorRecords])
+        self.columnIndexes = array.array('l', [record[2] for record in errorRecords])
+        self.values = [record[3] for record in errorRecords]
+
+
+    def getSummary(self, companyNames):
+        """
+        Return the error counts grouped by error type and company.
+
+        :parameters:
+            companyNames: `list`
+                company names in header order. Empty for the long layout, whose
+                columns are not companies.
+
+        :returns:
+            summaryList: `list`
+                (errorName, errorCount, companyCounts) for every error type with
+                errors, in reason code order. companyCounts is a list of
+                (companyName, errorCount) in header order, empty for row errors.
+
+        :raises:
+            None
+
+        """
+
+        summaryList = []
+        for reasonCode, errorName in enumerate(ERROR_NAMES):
+            columnCounts = sorted((columnIndex, errorCount) for (countCode, columnIndex), errorCount
+                                  in self.errorCounts.items() if countCode == reasonCode)
+            if not columnCounts:
+                continue
+            companyCounts = [(companyNames[columnIndex - FIRST_COMPANY_COLUMN], errorCount)
+                             for columnIndex, errorCount in columnCounts
+                             if FIRST_COMPANY_COLUMN <= columnIndex
+                             < FIRST_COMPANY_COLUMN + len(companyNames)]
+            summaryList.append((errorName, sum(errorCount for columnIndex, errorCount
+                                               in columnCounts), companyCounts))
+        return summaryList
+
+
+    def displaySummary(self, companyNames, csvPath, messageCount=DEFAULT_SUMMARY_MESSAGES):
+        """
+        Print the error counts grouped by error type and company, followed by
+        the messages of the first recorded errors.
+
+        :parameters:
+            companyNames: `list`
+                company names in header order.
+
+            csvPath: `string`
+                path of the CSV file.
+
+            messageCount: `int`
+                number of error messages to print.
+
+        :returns:
+            None
+
+        :raises:
+            None
+
+        """
+
+        print "\n\nError summary for CSV file: %s" %csvPath
+        print "===========================================\n"
+        if not self.errorCount:
+            print "No errors."
+            return
+
+        print "%-25s %20s %10s"%(ERROR_TYPE_HEADER, COMPANY_HEADER, ERROR_COUNT_HEADER)
+        for errorName, errorCount, companyCounts in self.getSummary(companyNames):
+            print "%-25s %20s %10s"%(errorName, '', errorCount)
+            for companyName, companyCount in companyCounts:
+                print "%-25s %20s %10s"%('', companyName, companyCount)
+
+        print "\nTotal errors: %s, recorded: %s" %(self.errorCount, len(self.values))
+        for index, errorMessage in enumerate(self.iterMessages()):
+            if index >= messageCount:
+                print "\n... %s more recorded errors." %(len(self.values) - messageCount)
+                break
+            print errorMessage
+
+
+class ProcessingStats():
+    """
+    class to collect the wall time of every phase and the counters of a SharesInfo
+    run. The python loop over the share rows is only timed per phase when a stats
+    object is set, so runs without one pay nothing for it.
+    For the parallel engines the times of the row phases are summed over the
+    worker processes.
+    """
+    def __init__(self, callback=None):
+        """
+        initialize empty stats.
+
+        :parameters:
+            callback: `function`
+                called as callback(phase, seconds, stats) every time a phase ends.
+
+        :returns:
+            None
+
+        :raises:
+            None
+
+        """
+
+        self.callback = callback
+
+        # phase -> wall time in seconds
+        self.phaseSeconds = {}
+
+        self.bytesRead = 0
+        self.rowsAccepted = 0
+
+        # reason code -> number of ignored rows
+        self.rejectedRows = {}
+
+        self.cellsParsed = 0
+        self.invalidCells = 0
+
+        # updates equal to the max value of a company in the python loop, with
+        # topCount = 1, and months kept beyond topCount once finalized, in total
+        # and per company.
+        self.tieAppends = 0
+        self.tieMonths = 0
+        self.maxTieMonths = 0
+
+
+    def addPhaseTime(self, phase, seconds):
+        """
+        Add the wall time of a phase and call the callback.
+
+        :parameters:
+            phase: `string`
+                name of the phase, one of PHASES.
+
+            seconds: `float`
+                wall time spent in the phase.
+
+        :returns:
+            None
+
+        :raises:
+            None
+
+        """
+
+        self.phaseSeconds[phase] = self.phaseSeconds.get(phase, 0.0) + seconds
+        if self.callback is not None:
+            self.callback(phase, seconds, self)
+
+
+    def rejectRow(self, reasonCode):
+        """
+        Count an ignored row.
+        """
+
+        self.rejectedRows[reasonCode] = self.rejectedRows.get(reasonCode, 0) + 1
+
+
+    def getRejectedRowCount(self):
+        """
+        Return the number of ignored rows.
+        """
+
+        return sum(self.rejectedRows.values())
+
+
+    def countShareMatrix(self, timeKeys, validList):
+        """
+        Count the accepted rows and the parsed and invalid cells of a share matrix.
+        """
+
+        self.rowsAccepted+= len(timeKeys)
+        self.cellsParsed+= len(validList)
+        self.invalidCells+= list(validList).count(False)
+
+
+    def countTies(self, maxShareDict, topCount):
+        """
+        Count the months kept beyond topCount by the finalized companies, and
+        the tied months they dropped.
+        """
+
+        for companyObject in maxShareDict.values():
+            tieMonths = (max(0, len(companyObject.maxShareList) - topCount)
+                         + companyObject.droppedTies)
+            self.tieMonths+= tieMonths
+            self.maxTieMonths = max(self.maxTieMonths, tieMonths)
+
+
+    def mergeStats(self, otherStats):
+        """
+        Add the times and counters of otherStats, eg. collected by a worker
+        process, to these stats. The callback is not called.
+
+        :parameters:
+            otherStats: `ProcessingStats`
+                stats to merge.
+
+        :returns:
+            None
+
+        :raises:
+            None
+
+        """
+
+        for phase, seconds in otherStats.phaseSeconds.items():
+            self.phaseSeconds[phase] = self.phaseSeconds.get(phase, 0.0) + seconds
+        for reasonCode, rowCount in otherStats.rejectedRows.items():
+            self.rejectedRows[reasonCode] = self.rejectedRows.get(reasonCode, 0) + rowCount
+
+        self.bytesRead+= otherStats.bytesRead
+        self.rowsAccepted+= otherStats.rowsAccepted
+        self.cellsParsed+= otherStats.cellsParsed
+        self.invalidCells+= otherStats.invalidCells
+        self.tieAppends+= otherStats.tieAppends
+
+
+    def displayStats(self, csvPath):
+        """
+        Print the time of every phase and the counters.
+
+        :parameters:
+            csvPath: `string`
+                path of the CSV file.
+
+        :returns:
+            None
+
+        :raises:
+            None
+
+        """
+
+        print "\n\nProcessing stats for CSV file: %s" %csvPath
+        print "===========================================\n"
+        print "%-20s %12s"%(PHASE_HEADER, SECONDS_HEADER)
+        for phase in PHASES:
+            if phase in self.phaseSeconds:
+                print "%-20s %12.6f"%(phase, self.phaseSeconds[phase])
+
+        print "\nBytes read: %s" %self.bytesRead
+        print "Rows accepted: %s, rejected: %s" %(self.rowsAccepted, self.getRejectedRowCount())
+        for reasonCode, errorName in enumerate(ERROR_NAMES):
+            if reasonCode in self.rejectedRows:
+                print "    %s: %s" %(errorName, self.rejectedRows[reasonCode])
+        print "Cells parsed: %s, invalid: %s" %(self.cellsParsed, self.invalidCells)
+        print "Tie appends: %s, tied months kept: %s, most by a company: %s" %(
+            self.tieAppends, self.tieMonths, self.maxTieMonths)
+
+
+class RowValidator():
+    """
+    class to check the share rows of a CSV file in batches. It is compiled once
+    from the header row: the number of columns is kept, and every year and month
+    string is converted and checked the first time it is seen and cached with
+    its outcome. The checks of checkMissingSharesData, checkExtraSharesData,
+    verifyYearValue and verifyMonthValue then cost a length comparison and two
+    dictionary lookups per row, which also give the time key of the row.
+    A trusted validator, for feeds already verified by an earlier run, skips
+    the checks of the rows and only converts their months into time keys. The
+    rows of the years before MIN_YEAR are still reported and ignored.
+    """
+    def __init__(self, headerList, reportRowError, trusted=False):
+        """
+        initialize the validator of the rows of a CSV header.
+
+        :parameters:
+            headerList: `list`
+                list of strings representing the CSV header row, as accepted by
+                validateCsvHeaderRow or validateLongHeaderRow.
+
+            reportRowError: `function`
+                reportRowError(errorCode, rowIndex, rowList) reports an ignored
+                row, eg. SharesInfo._reportRowError.
+
+            trusted: `bool`
+                if True, the rows are not checked, except for the years before
+                MIN_YEAR. A row that cannot be converted aborts processing instead
+                of being reported and ignored.
+
+        :returns:
+            None
+
+        :raises:
+            None
+
+        """
+
+        self.columnCount = len(headerList)
+        self.reportRowError = reportRowError
+        self.trusted = trusted
+
+        # (errorCode, year * 12) of the year strings seen. errorCode is None for
+        # the valid years and year * 12 is None if the year is not a number.
+        self.yearCodes = {}
+
+        # month index of the month strings seen, None for the unknown months
+        self.monthIndexes = {}
+
+        # year * 12 of the valid year strings seen, used by the trusted feeds
+        self.yearKeys = {}
+
+        # number of the last share row read by iterRows
+        self.rowCount = 0
+
+
+    def iterRows(self, csvReader, rowCount=0):
+        """
+        Check the share rows of csvReader VALIDATION_BATCH_ROWS at a time and
+        yield the rows to process. The error of an ignored row is reported when
+        its turn comes, so that the errors stay in row order with the errors of
+        the cells of the rows processed before it.
+
+        :parameters:
+            csvReader: `iterator`
+                iterator over the share rows as lists of strings.
+
+            rowCount: `int`
+                number of share rows before the first row of csvReader.
+
+        :returns:
+            (rowIndex, row, timeKey): `tuple`
+                number, values and time key of every row to process. rowCount
+                holds the number of the last row read.
+
+        :raises:
+            Exception: `CsvError`
+                if a row of a trusted feed cannot be converted.
+
+        """
+
+        csvReader = iter(csvReader)
+        self.rowCount = rowCount
+        reportRowError = self.reportRowError
+        while True:
+            rowList = list(itertools.islice(csvReader, VALIDATION_BATCH_ROWS))
+            if not rowList:
+                return
+
+            timeKeys, rowErrors = self.checkRows(rowList)
+            rowIndex = self.rowCount
+            self.rowCount+= len(rowList)
+            for batchIndex, timeKey in enumerate(timeKeys):
+                rowIndex+= 1
+                if timeKey == NO_TIME_KEY:
+                    reportRowError(rowErrors[batchIndex], rowIndex, rowList[batchIndex])
+                else:
+                    yield rowIndex, rowList[batchIndex], timeKey
+
+
+    def checkRows(self, rowList):
+        """
+        Check a batch of share rows without reporting their errors.
+
+        :parameters:
+            rowList: `list`
+                share rows as lists of strings.
+
+        :returns:
+            (timeKeys, rowErrors): `tuple`
+                time key of every row, NO_TIME_KEY for the rows to ignore, and a
+                dictionary with the index in rowList of the rows to ignore as keys
+                and the reason code of their error as values.
+
+        :raises:
+            Exception: `CsvError`
+                if a row of a trusted feed cannot be converted.
+
+        """
+
+        if self.trusted:
+            return self._convertRows(rowList)
+
+        columnCount = self.columnCount
+        yearCodes = self.yearCodes
+        monthIndexes = self.monthIndexes
+        timeKeys = []
+        rowErrors = {}
+        for batchIndex, row in enumerate(rowList):
+            if len(row) != columnCount:
+                if len(row) < columnCount:
+                    rowErrors[batchIndex] = MISSING_SHARES_ERROR
+                else:
+                    rowErrors[batchIndex] = EXTRA_SHARES_ERROR
+                timeKeys.append(NO_TIME_KEY)
+                continue
+
+            try:
+                errorCode, yearKey = yearCodes[row[YEAR_COLUMN]]
+            except KeyError:
+                errorCode, yearKey = self._getYearCode(row[YEAR_COLUMN])
+            if errorCode is None:
+                try:
+                    monthIndex = monthIndexes[row[MONTH_COLUMN]]
+                except KeyError:
+                    monthIndex = self._getMonthIndex(row[MONTH_COLUMN])
+                if monthIndex is not None:
+                    timeKeys.append(yearKey + monthIndex)
+                    continue
+                errorCode = INVALID_MONTH_ERROR
+
+            rowErrors[batchIndex] = errorCode
+            timeKeys.append(NO_TIME_KEY)
+
+        return timeKeys, rowErrors
+
+
+    def _convertRows(self, rowList):
+        """
+        Return the (timeKeys, rowErrors) of a batch of rows of a trusted feed, as
+        checkRows. Only the number of values of the whole batch is checked, with
+        a set of the row lengths, so that a short row cannot fail in the middle of
+        the companies. The rows of the years before MIN_YEAR are ignored.
+        """
+
+        rowLengths = set(map(len, rowList))
+        if rowLengths != set([self.columnCount]):
+            raise CsvError("Trusted feed has share rows of %s values, expected %s."
+                           %(', '.join(map(str, sorted(rowLengths - set([self.columnCount])))),
+                             self.columnCount))
+
+        yearKeys = self.yearKeys
+        monthIndexes = self.monthIndexes
+        try:
+            return [yearKeys[row[YEAR_COLUMN]] + monthIndexes[row[MONTH_COLUMN]]
+                    for row in rowList], {}
+        except (KeyError, TypeError):
+            # a year or month seen for the first time, an old year or a month
+            # not convertible.
+            pass
+
+        timeKeys = []
+        rowErrors = {}
+        for batchIndex, row in enumerate(rowList):
+            errorCode, yearKey = self._getYearCode(row[YEAR_COLUMN])
+            monthIndex = self._getMonthIndex(row[MONTH_COLUMN])
+            if yearKey is None or monthIndex is None:
+                raise CsvError("Trusted feed has a share row with an invalid month: %s %s"
+                               %(row[YEAR_COLUMN], row[MONTH_COLUMN]))
+            if errorCode is None:
+                if len(yearKeys) < VALIDATION_CACHE_SIZE:
+                    yearKeys[row[YEAR_COLUMN]] = yearKey
+                timeKeys.append(yearKey + monthIndex)
+            else:
+                rowErrors[batchIndex] = errorCode
+                timeKeys.append(NO_TIME_KEY)
+        return timeKeys, rowErrors
+
+
+    def _getYearCode(self, year):
+        """
+        Return the (errorCode, year * 12) of a year string, cached if there is room.
+        """
+
+        yearCode = self.yearCodes.get(year)
+        if yearCode is not None:
+            return yearCode
+
+        try:
+            yearValue = int(year)
+        except ValueError:
+            yearCode = (INVALID_YEAR_ERROR, None)
+        else:
+            if yearValue < MIN_YEAR:
+                yearCode = (OLD_YEAR_ERROR, yearValue * 12)
+            elif yearValue > MAX_YEAR:
+                yearCode = (INVALID_YEAR_ERROR, None)
+            else:
+                yearCode = (None, yearValue * 12)
+        if len(self.yearCodes) < VALIDATION_CACHE_SIZE:
+            self.yearCodes[year] = yearCode
+        return yearCode
+
+
+    def _getMonthIndex(self, month):
+        """
+        Return the month index of a month string, None if it is unknown, cached
+        if there is room.
+        """
+
+        monthIndex = _getMonthIndex(month)
+        if len(self.monthIndexes) < VALIDATION_CACHE_SIZE:
+            self.monthIndexes[month] = monthIndex
+        return monthIndex
+
+
+class SharesInfo():
+    """
+    class to process the CSV file.
+    Assuming that the user initialises the class with csv file path
+    """
+    def __init__(self, csvPath=None, engine=PYTHON_ENGINE, workers=None, reader=CSV_READER,
+                 cache=None, statePath=None, topCount=1, errorSink=None, resultWriter=None,
+                 stats=None, priceDecimals=0, layout=WIDE_LAYOUT, aggregators=None,
+                 groupByYear=False, trusted=False, tieLimit=None, indexPeaks=False,
+                 resultCache=None):
+        """
+        Initialize cvsPath with the string passed by the user while
+        instantiating the this class.
+
+        :parameters:
+            csvPath: `string`
+                filepath passed by the user while instantiating the this class.
+
+            engine: `string`
+                processing engine used to find the max share values.
+                PYTHON_ENGINE walks every cell in pure python.
+                NUMPY_ENGINE builds a months x companies matrix and uses
+                vectorized column reductions. Requires numpy.
+                CHUNKED_ENGINE splits the rows of the file in byte ranges
+                processed by separate worker processes.
+                SHARDED_ENGINE splits the company columns in shards
+                processed by separate worker processes over the same file.
+
+            workers: `int`
+                number of worker processes for the parallel engines.
+                Defaults to the number of CPUs.
+
+            reader: `string`
+                reader of the share rows.
+                CSV_READER uses csv.reader.
+                MMAP_READER scans the fields directly over the memory mapped
+                file and only slices the fields that are used.
+
+            cache: `shares_cache.ParsedDataCache`
+                on-disk cache of the parsed share matrix. If set, the CSV is
+                only parsed when the cache has no valid entry for it.
+
+            statePath: `string`
+                file where the per company max share info and the offset where
+                processing stopped are saved. If set, only the rows appended to
+                the CSV since the last run are processed, with the python loop.
+
+            topCount: `int`
+                number of highest months kept per company, with the months tied
+                with the lowest of them. maxShareList of every company is ranked
+                by share value. 1 keeps the max value and its ties.
+
+            errorSink: `CsvErrorSink`
+                if set, the errors of the ignored rows and cells are recorded in
+                the sink instead of being printed, and processCsvFile prints a
+                summary of them after the results.
+
+            resultWriter: `shares_output.ResultWriter`
+                if set, processCsvFile streams the results to the writer, one
+                company at a time, instead of displaying them.
+
+            stats: `ProcessingStats`
+                if set, the wall time of every phase and the counters of the run
+                are collected in it.
+
+            priceDecimals: `int`
+                number of decimal places of the share prices. The share values
+                are kept as integers scaled by 10 ** priceDecimals, so that max
+                and tie comparisons stay exact, and are displayed with
+                priceDecimals decimal places.
+
+            layout: `string`
+                layout of the CSV file.
+                WIDE_LAYOUT has a share value column per company.
+                LONG_LAYOUT has a row per company and month with the columns
+                Year,Month,Company,Price. Its rows are streamed into a per company
+                max aggregator, whatever the engine, so that memory grows with
+                the number of companies rather than companies x months.
+
+            aggregators: `list`
+                ShareAggregator subclasses of other statistics computed in the
+                same pass as the max share values, eg. from
+                shares_aggregators.getAggregatorClasses(['min', 'mean']). The
+                companies are then AggregatedCompany objects, and displayResults
+                prints the statistics after the max share values. Not supported
+                with statePath.
+
+            groupByYear: `bool`
+                if True, the peak share value of every company in every year,
+                with its tied months, is found in the same pass as the max share
+                values. getYearlyPeaks returns them as a YearlyPeakTable and
+                displayResults prints them after the max share values. Not
+                supported with statePath.
+
+            trusted: `bool`
+                if True, the CSV file is a trusted feed, already verified by an
+                earlier run: the share rows are not checked for missing or extra
+                share values or unknown months, only converted. A row that cannot
+                be converted aborts processing with CsvError. The rows of the
+                years before MIN_YEAR are still reported and ignored, and the
+                share values are still parsed and checked.
+
+            tieLimit: `int`
+                if set, only the first tieLimit and the last tieLimit months
+                tied at the max value of a company are kept, and displayResults
+                prints the number of the tied months in between. Only supported
+                with topCount = 1.
+
+            indexPeaks: `bool`
+                if True, the months of the max share values of the companies are
+                indexed by month as they are finalized. getPeakMonthIndex returns
+                them as a PeakMonthIndex and displayResults prints the number of
+                companies peaking in every month and the clusters of peak months.
+
+            resultCache: `shares_cache.ResultCache`
+                in-memory cache of the processed results. If set, a CSV file
+                that did not change since it was processed with the same options
+                is not processed again: its cached Company objects are returned,
+                shared with the earlier callers, and its errors are reported
+                again. Not used with statePath or stats.
+
+        :returns:
+            None
+
+        :raises:
+            Exception: `CsvError`
+                if options that cannot be used together are set, see
+                checkOptionConflicts.
+            
+        """
+        self.checkOptionConflicts(engine, cache, statePath, layout)
+        self.csvPath = csvPath
+        self.engine = engine
+        self.workers = workers
+        self.reader = reader
+        self.cache = cache
+        self.statePath = statePath
+        self.topCount = topCount
+        self.errorSink = errorSink
+        self.resultWriter = resultWriter
+        self.stats = stats
+        self.priceDecimals = priceDecimals
+        self.layout = layout
+        self.aggregators = aggregators
+        self.groupByYear = groupByYear
+        self.trusted = trusted
+        self.tieLimit = tieLimit
+        self.indexPeaks = indexPeaks
+        self.resultCache = resultCache
+
+        # aggregator classes of every company: the other statistics, followed
+        # by the yearly peaks if they are requested.
+        self.companyAggregators = list(aggregators or ())
+        if groupByYear:
+            self.companyAggregators.append(YearlyPeakAggregator)
+
+        # offset of the first share row read by the last incremental run
+        self.resumeOffset = None
+
+        # list to collect the row error messages instead of printing them
+        self.errorMessages = None
+
+        # dictionary with company name as keys and Company() objects as values,
+        # set by processCsvFile.
+        self.maxShareDict = None
+
+        # PeakMonthIndex() of the companies, set by _processCsvFile if indexPeaks is set.
+        self.peakMonthIndex = None
+
+        # RowValidator() of the header of the last share rows checked
+        self.rowValidator = None
+
+
+    def processCsvFile(self):
+        """
+        This is main function that processes the CSV, parses data and displays results.
+
+        :parameters:
+            None
+
+        :returns:
+            None
+
+        :raises:
+            None
+            
+        """
+        
+        startTime = time.time()
+
+        #check if the csv file exists and is readable and is not None
+        try:
+            self.checkCsvPath(self.csvPath)
+        except CsvError, e:
+            print "\nInvalid CSV file path: %s \n\t%s"%(self.csvPath, e)
+            print "Processing Aborted!"
+            return
+
+        #check if the selected engine can be used
+        try:
+            self.checkEngine(self.engine)
+        except CsvError, e:
+            print "\nInvalid processing engine: %s \n\t%s"%(self.engine, e)
+            print "Processing Aborted!"
+            return
+
+        #check if the selected reader can be used
+        try:
+            self.checkReader(self.reader)
+        except CsvError, e:
+            print "\nInvalid CSV reader: %s \n\t%s"%(self.reader, e)
+            print "Processing Aborted!"
+            return
+
+        #check if the number of top months is valid
+        try:
+            self.checkTopCount(self.topCount)
+        except CsvError, e:
+            print "\nInvalid number of top months: %s \n\t%s"%(self.topCount, e)
+            print "Processing Aborted!"
+            return
+
+        #check if the number of kept tied months is valid
+        try:
+            self.checkTieLimit(self.tieLimit, self.topCount)
+        except CsvError, e:
+            print "\nInvalid number of tied months: %s \n\t%s"%(self.tieLimit, e)
+            print "Processing Aborted!"
+            return
+
+        #check if the number of decimal places of the prices is valid
+        try:
+            self.checkPriceDecimals(self.priceDecimals)
+        except CsvError, e:
+            print "\nInvalid number of decimal places: %s \n\t%s"%(self.priceDecimals, e)
+            print "Processing Aborted!"
+            return
+
+        #check if the layout of the CSV file is supported
+        try:
+            self.checkLayout(self.layout)
+        except CsvError, e:
+            print "\nInvalid CSV layout: %s \n\t%s"%(self.layout, e)
+            print "Processing Aborted!"
+            return
+        self._addPhaseTime(CHECK_PHASE, startTime)
+        
+        # process CSV file and collect max shares info.
+        try:
+            self.maxShareDict = self._processCsvFile()
+        except CsvError, e:
+            print "\nInvalid data in CSV file: %s \n\t%s"%(self.csvPath, e)
+            print "Processing Aborted!"
+            return
+        
+        # print self.maxShareDict
+        startTime = time.time()
+        if self.resultWriter is not None:
+            self.resultWriter.writeResults(self.maxShareDict, self.csvPath, self.priceDecimals)
+        elif self.maxShareDict:
+            self.displayResults()
+        self._addPhaseTime(DISPLAY_PHASE, startTime)
+
+        if self.errorSink is not None:
+            self.errorSink.displaySummary(self.getErrorCompanyNames(), self.csvPath)
+
+
+    def getErrorCompanyNames(self):
+        """
+        Return the company names the errors of errorSink are grouped by, the
+        companies of the header for the wide layout and none for the long layout.
+        """
+
+        if self.layout == LONG_LAYOUT or not self.maxShareDict:
+            return []
+        return self.maxShareDict.keys()
+
+
+    def iterResults(self, companyNames=None, withErrors=True):
+        """
+        Process the CSV and yield its results as a stream of items, without
+        printing them and without keeping the Company() objects in maxShareDict.
+        Every item is (RESULT_ITEM, (companyName, peakList)) or, if withErrors
+        is True, (ERROR_ITEM, (reasonCode, rowIndex, columnIndex, value)) for an
+        ignored row or cell, formatted by formatCsvError.
+        The python engine reads the wide layout in batches of RESULT_BATCH_ROWS
+        rows and yields the errors of every batch as it goes, so a caller that
+        stops iterating stops the reading of the file. The other engines, the
+        layouts, stores, cache and incremental state yield the errors once the
+        file is processed. The results always follow the errors.
+        The errors are also recorded in errorSink if it is set, and are never
+        printed. With indexPeaks set, getPeakMonthIndex returns the index of
+        all the companies once the results are yielded.
+
+        :parameters:
+            companyNames: `list`
+                names of the companies to yield, in this order. Defaults to all
+                the companies. With the python engine, the cells of the other
+                companies of the wide layout are not even parsed, unless
+                indexPeaks is set, and with every engine their errors are not
+                yielded.
+
+            withErrors: `bool`
+                if False, only the results are yielded. If errorSink is not set
+                either, the errors are only counted, not recorded.
+
+        :returns:
+            items: `generator`
+                items as described above. peakList is Company.getResult() of the
+                company: a list of (year, month, shareValue) tuples, year a string
+                and month the short month name of formatTimeKey, eg.
+                [('1990', 'Feb', 30), ('1991', 'Mar', 30)], highest share value
+                first and ties in chronological order, without the initial share
+                tuple and the months dropped by tieLimit. shareValue is an int
+                scaled by 10 ** priceDecimals.
+
+        :raises:
+            Exception: `CsvError`
+                if the CSV file path, the options or the CSV header data are
+                invalid, or if a company of companyNames is not in the file.
+                Raised when the first item is requested.
+
+        """
+
+        self.checkCsvPath(self.csvPath)
+        errorSink = self.errorSink
+        if withErrors or errorSink is not None:
+            self.errorSink = CsvErrorSink(None)
+        else:
+            # the errors would be discarded, none is recorded.
+            self.errorSink = CsvErrorSink(0)
+        try:
+            if (self.engine == PYTHON_ENGINE and self.layout == WIDE_LAYOUT
+                and self.cache is None and self.statePath is None
+                and not isSharesStore(self.csvPath)):
+                resultItems = self._iterResultsPython(companyNames)
+            else:
+                resultItems = self._iterResultsProcessed(companyNames)
+
+            for itemType, item in resultItems:
+                if itemType == ERROR_ITEM:
+                    if errorSink is not None:
+                        errorSink.addError(*item)
+                    if not withErrors:
+                        continue
+                yield itemType, item
+        finally:
+            self.errorSink = errorSink
+
+
+    def _iterResultsPython(self, companyNames):
+        """
+        Yield the items of iterResults for the python engine over the wide
+        layout, processing the share rows of the selected company columns in
+        batches of RESULT_BATCH_ROWS rows.
+        """
+
+        self.checkReader(self.reader)
+        self.checkTopCount(self.topCount)
+        self.checkTieLimit(self.tieLimit, self.topCount)
+        self.checkPriceDecimals(self.priceDecimals)
+        csvFile = openCsvFile(self.csvPath)
+        try:
+            headerList, maxShareDict = self._readCsvHeader(csvFile)
+            companyNames = self._getResultCompanyNames(maxShareDict, companyNames)
+            columnDict = dict((companyName, columnIndex) for columnIndex, companyName
+                              in enumerate(maxShareDict, FIRST_COMPANY_COLUMN))
+            # the index of the peak months holds every company, the errors of
+            # the other companies are not yielded.
+            indexedNames = companyNames
+            skippedColumns = set()
+            if self.indexPeaks:
+                indexedNames = maxShareDict.keys()
+                skippedColumns = set(columnDict[companyName] for companyName in indexedNames
+                                     if companyName not in companyNames)
+            columnList = [(columnDict[companyName], maxShareDict[companyName])
+                          for companyName in indexedNames]
+
+            csvReader = self._getRowReader(csvFile, csvFile.tell())
+            rowCount = 0
+            while True:
+                rowBatch = list(itertools.islice(csvReader, RESULT_BATCH_ROWS))
+                if not rowBatch:
+                    break
+                startTime = time.time()
+                rowCount = self._processCsvColumns(rowBatch, headerList, columnList, rowCount)
+                self._addPhaseTime(ROWS_PHASE, startTime)
+                for errorItem in self._drainErrorItems():
+                    if errorItem[1][2] in skippedColumns:
+                        continue
+                    yield errorItem
+        finally:
+            csvFile.close()
+
+        if self.indexPeaks:
+            self.peakMonthIndex = PeakMonthIndex(maxShareDict.keys())
+            for companyIndex, companyObject in enumerate(maxShareDict.values()):
+                timeKeys, shareValues = companyObject.getTopShares()
+                self.peakMonthIndex.addCompanyPeaks(companyIndex, timeKeys, shareValues,
+                                                    companyObject.droppedTies)
+
+        for companyName in companyNames:
+            yield RESULT_ITEM, (companyName, maxShareDict[companyName].getResult())
+
+
+    def _iterResultsProcessed(self, companyNames):
+        """
+        Yield the items of iterResults once the whole file is processed by the
+        selected engine.
+        """
+
+        maxShareDict = self._processCsvFile()
+        companyNames = self._getResultCompanyNames(maxShareDict, companyNames)
+        skippedColumns = set()
+        if self.layout == WIDE_LAYOUT:
+            skippedColumns = set(columnIndex for columnIndex, companyName
+                                 in enumerate(maxShareDict, FIRST_COMPANY_COLUMN)
+                                 if companyName not in companyNames)
+
+        for itemType, errorRecord in self._drainErrorItems():
+            if errorRecord[2] not in skippedColumns:
+                yield itemType, errorRecord
+
+        for companyName in companyNames:
+            yield RESULT_ITEM, (companyName, maxShareDict[companyName].getResult())
+
+
+    def _getResultCompanyNames(self, maxShareDict, companyNames):
+        """
+        Return the names of the companies yielded by iterResults, all the
+        companies of maxShareDict if companyNames is None.
+        """
+
+        if companyNames is None:
+            return maxShareDict.keys()
+        unknownNames = [companyName for companyName in companyNames
+                        if companyName not in maxShareDict]
+        if unknownNames:
+            raise CsvError("Companies: %s are not in the CSV file." %', '.join(unknownNames))
+        return list(companyNames)
+
+
+    def _drainErrorItems(self):
+        """
+        Return the error items of the errors recorded since the last call and
+        empty errorSink, keeping its maxRecords.
+        """
+
+        errorItems = [(ERROR_ITEM, errorRecord) for errorRecord in self.errorSink.getRecords()]
+        self.errorSink = CsvErrorSink(self.errorSink.maxRecords)
+        return errorItems
+
+
+    def _processCsvColumns(self, csvReader, headerList, columnList, rowCount=0):
+        """
+        Validate the share rows from csvReader and update the Company objects
+        of the selected columns only.
+
+        :parameters:
+            csvReader: `iterator`
+                iterator over the share rows as lists of strings.
+
+            headerList: `list`
+                list of strings representing a row of CSV header data.
+
+            columnList: `list`
+                (columnIndex, Company()) of the selected companies.
+
+            rowCount: `int`
+                number of share rows before the first row of csvReader.
+
+        :returns:
+            rowCount: `int`
+                number of the last processed share row.
+
+        :raises:
+            None
+
+        """
+
+        acceptedCount = 0
+        invalidCount = 0
+        rowValidator = self._getRowValidator(headerList)
+        for rowCount, row, timeKey in rowValidator.iterRows(csvReader, rowCount):
+            acceptedCount+= 1
+            for sharesIndex, companyObject in columnList:
+                shareValue = self._getShareValue(rowCount, sharesIndex, row)
+                if shareValue is None:
+                    invalidCount+= 1
+                    continue
+                companyObject.update(timeKey, shareValue)
+
+        if self.stats is not None:
+            self.stats.rowsAccepted+= acceptedCount
+            self.stats.cellsParsed+= acceptedCount * len(columnList)
+            self.stats.invalidCells+= invalidCount
+        return rowValidator.rowCount
+
+
+    def _processCsvFile(self):
+        """
+        This is the internal function that processes the CSV and returns a dictionary
+        with company name as keys and Company objects as values.
+        The work is delegated to the function for the selected engine.
+        
+        :parameters:
+            None
+
+        :returns:
+            maxShareDict: `dict`
+                dictionary with company name as keys and Company() objects as values.
+                maxSharesDict = {
+                                  'Company A' : Company(),
+                                  'Company B' : Company()
+                                }
+
+        :raises:
+            Exception: `CsvError`
+                if CSV header data is insufficient/invalid
+                OR
+                if company names in the header data are not unique.
+                OR
+                if the selected engine, reader, number of top months, number of
+                tied months, number of decimal places or layout is not supported.
+                OR
+                if the file is a shares store that cannot be read.
+                
+            
+        """
+
+        self.checkEngine(self.engine)
+        self.checkReader(self.reader)
+        self.checkTopCount(self.topCount)
+        self.checkTieLimit(self.tieLimit, self.topCount)
+        self.checkPriceDecimals(self.priceDecimals)
+        self.checkLayout(self.layout)
+        if self.resultCache is not None and self.statePath is None and self.stats is None:
+            return self._processCsvFileResultCached()
+        return self._findMaxShareDict()
+
+
+    def _processCsvFileResultCached(self):
+        """
+        Return the results of the CSV file from the result cache, or process
+        the CSV file and store its results in the result cache. The errors of
+        the ignored rows and cells are stored with the results in a CsvErrorSink
+        with the maxRecords of errorSink, which is part of the key, and reported
+        again on every call, merged into errorSink if it is set. The returned
+        Company() objects are copies, the cached ones cannot be modified.
+
+        :parameters:
+            None
+
+        :returns:
+            maxShareDict: `dict`
+                dictionary with company name as keys and Company() objects as values.
+
+        :raises:
+            Exception: `CsvError`
+                if CSV header data is insufficient/invalid
+                OR
+                if company names in the header data are not unique.
+
+        """
+
+        resultKey = self._getResultKey()
+        resultData = self.resultCache.load(self.csvPath, resultKey)
+        if resultData is not None:
+            maxShareDict, recordSink, self.peakMonthIndex = resultData
+            self._reportErrorSink(recordSink)
+            return maxShareDict
+
+        # the errors are recorded as errorSink would keep them, to be stored
+        # along with the results. Printed errors are all recorded.
+        errorSink = self.errorSink
+        self.errorSink = CsvErrorSink(resultKey[-1])
+        try:
+            maxShareDict = self._findMaxShareDict()
+        finally:
+            recordSink = self.errorSink
+            self.errorSink = errorSink
+            self._reportErrorSink(recordSink)
+
+        self.resultCache.store(self.csvPath, resultKey,
+                               (maxShareDict, recordSink, self.peakMonthIndex))
+        return maxShareDict
+
+
+    def _reportErrorSink(self, recordSink):
+        """
+        Report the errors of recordSink, merged into errorSink if it is set,
+        printed otherwise.
+        """
+
+        if self.errorSink is None:
+            self._reportErrorRecords(recordSink.getRecords())
+        else:
+            self.errorSink.mergeSink(recordSink)
+
+
+    def _getResultKey(self):
+        """
+        Return the options the results of the CSV file depend on, as part of
+        the key of the result cache. The last one is the number of errors
+        recorded in detail, None if they are all recorded.
+        """
+
+        aggregatorNames = tuple(aggregatorClass.name for aggregatorClass in self.aggregators or ())
+        maxRecords = None if self.errorSink is None else self.errorSink.maxRecords
+        return (self.engine, self.reader, self.topCount, self.tieLimit, self.priceDecimals,
+                self.layout, self.trusted, aggregatorNames, self.groupByYear, self.indexPeaks,
+                maxRecords)
+
+
+    def _findMaxShareDict(self):
+        """
+        Process the CSV file with the function for its layout, its format and the
+        selected engine, and finalize the max share values of the companies.
+        See _processCsvFile.
+        """
+
+        if self.layout == LONG_LAYOUT:
+            maxShareDict = self._processCsvFileLong()
+        elif isSharesStore(self.csvPath):
+            maxShareDict = self._processSharesStore()
+        elif self.statePath is not None:
+            maxShareDict = self._processCsvFileIncremental()
+        elif self.cache is not None:
+            maxShareDict = self._processCsvFileCached()
+        elif self.engine == NUMPY_ENGINE:
+            maxShareDict = self._processCsvFileNumpy()
+        elif self.engine == CHUNKED_ENGINE:
+            maxShareDict = self._processCsvFileChunked()
+        elif self.engine == SHARDED_ENGINE:
+            maxShareDict = self._processCsvFileSharded()
+        else:
+            maxShareDict = self._processCsvFilePython()
+
+        startTime = time.time()
+        peakMonthIndex = None
+        if self.indexPeaks:
+            peakMonthIndex = PeakMonthIndex(maxShareDict.keys())
+        for companyIndex, companyObject in enumerate(maxShareDict.values()):
+            companyObject.finalizeTopShares()
+            if peakMonthIndex is not None:
+                timeKeys, shareValues = companyObject.getTopShares()
+                peakMonthIndex.addCompanyPeaks(companyIndex, timeKeys, shareValues,
+                                               companyObject.droppedTies)
+        self.peakMonthIndex = peakMonthIndex
+        if self.stats is not None:
+            self._addPhaseTime(FINALIZE_PHASE, startTime)
+            self.stats.countTies(maxShareDict, self.topCount)
+        return maxShareDict
+
+
+    def _addPhaseTime(self, phase, startTime):
+        """
+        Add the wall time since startTime to the phase if stats is set.
+        """
+
+        if self.stats is not None:
+            self.stats.addPhaseTime(phase, time.time() - startTime)
+
+
+    def _processCsvFilePython(self):
+        """
+        Process the CSV one cell at a time in pure python and return a dictionary
+        with company name as keys and Company objects as values.
+        
+        :parameters:
+            None
+
+        :returns:
+            maxShareDict: `dict`
+                dictionary with company name as keys and Company() objects as values.
+
+        :raises:
+            Exception: `CsvError`
+                if CSV header data is insufficient/invalid
+                OR
+                if company names in the header data are not unique.
+            
+        """
+
+        #csvFile shoud support iterator protocol hence get a file object.
+        csvFile = openCsvFile(self.csvPath)
+        try:
+            headerList, maxShareDict = self._readCsvHeader(csvFile)
+            csvReader = self._getRowReader(csvFile, csvFile.tell())
+            self._processCsvRows(csvReader, headerList, maxShareDict)
+        finally:
+            # close the file, also when a trusted feed aborts in the middle.
+            csvFile.close()
+                
+        return maxShareDict
+
+
+    def _processCsvFileLong(self):
+        """
+        Process a CSV file of the long layout, a row per company and month, and
+        return a dictionary with company name as keys and Company objects as
+        values, in the order the companies first appear.
+        The cache, the incremental state and the parallel engines do not apply.
+
+        :parameters:
+            None
+
+        :returns:
+            maxShareDict: `dict`
+                dictionary with company name as keys and Company() objects as values.
+
+        :raises:
+            Exception: `CsvError`
+                if CSV header data is not Year,Month,Company,Price.
+
+        """
+
+        csvFile = openCsvFile(self.csvPath)
+        try:
+            headerList, maxShareDict = self._readCsvHeader(csvFile)
+            csvReader = self._getRowReader(csvFile, csvFile.tell())
+            self._processLongRows(csvReader, headerList, maxShareDict)
+        finally:
+            csvFile.close()
+        return maxShareDict
+
+
+    def _processLongRows(self, csvReader, headerList, maxShareDict):
+        """
+        Validate the rows of the long layout from csvReader and update the max
+        share values of their companies in a hash of Company objects, adding
+        the companies as they appear.
+        A row for a company and month already seen is ignored and reported. To
+        find them, the time keys of every company are kept.
+
+        :parameters:
+            csvReader: `iterator`
+                iterator over the rows of the long layout.
+
+            headerList: `list`
+                list of strings representing the CSV header row.
+
+            maxShareDict: `dict`
+                ordered dictionary of the Company() objects to update.
+
+        :returns:
+            None
+
+        :raises:
+            None
+
+        """
+
+        topCount = self.topCount
+        timeKeysDict = {}
+        startTime = time.time()
+
+        acceptedCount = 0
+        invalidCount = 0
+        for rowCount, row, timeKey in self._getRowValidator(headerList).iterRows(csvReader):
+            companyName = row[COMPANY_COLUMN].strip()
+            if not companyName:
+                self._reportRowError(MISSING_COMPANY_ERROR, rowCount, row)
+                continue
+
+            companyObject = maxShareDict.get(companyName)
+            if companyObject is None:
+                companyObject = maxShareDict[companyName] = self._newCompany()
+                timeKeysDict[companyName] = set()
+            timeKeys = timeKeysDict[companyName]
+            if timeKey in timeKeys:
+                self._reportRowError(DUPLICATE_MONTH_ERROR, rowCount, row)
+                continue
+            timeKeys.add(timeKey)
+            acceptedCount+= 1
+
+            shareValue = self._getShareValue(rowCount, PRICE_COLUMN, row)
+            if shareValue is None:
+                invalidCount+= 1
+                continue
+            companyObject.update(timeKey, shareValue)
+
+        if self.stats is not None:
+            self._addPhaseTime(ROWS_PHASE, startTime)
+            self.stats.rowsAccepted+= acceptedCount
+            self.stats.cellsParsed+= acceptedCount
+            self.stats.invalidCells+= invalidCount
+
+
+    def _processCsvRows(self, csvReader, headerList, maxShareDict, rowCount=0):
+        """
+        Validate the share rows from csvReader and update the Company objects
+        in maxShareDict one cell at a time.
+
+        :parameters:
+            csvReader: `iterator`
+                iterator over the share rows as lists of strings.
+
+            headerList: `list`
+                list of strings representing a row of CSV header data.
+
+            maxShareDict: `dict`
+                dictionary with company name as keys and Company() objects as values.
+
+            rowCount: `int`
+                number of share rows before the first row of csvReader.
+                Keeps the row numbers in the error messages global to the file.
+
+        :returns:
+            rowCount: `int`
+                number of the last processed share row.
+
+        :raises:
+            None
+
+        """
+
+        if self.stats is not None:
+            return self._processCsvRowsTimed(csvReader, headerList, maxShareDict, rowCount)
+
+        companyList = maxShareDict.values()
+        rowValidator = self._getRowValidator(headerList)
+        # the month of every row is packed once for all its companies.
+        for rowCount, row, timeKey in rowValidator.iterRows(csvReader, rowCount):
+            for index, companyObject in enumerate(companyList):
+                sharesIndex = index+2
+                shareValue = self._getShareValue(rowCount, sharesIndex, row)
+                if shareValue is None:
+                    continue
+                
+                # companyObject is object of class Company
+                companyObject.update(timeKey, shareValue)
+
+        return rowValidator.rowCount
+
+
+    def _processCsvRowsTimed(self, csvReader, headerList, maxShareDict, rowCount=0):
+        """
+        Same as _processCsvRows, but the validation of every row, the parsing of
+        its cells and the update of the companies are timed separately and
+        counted in stats.
+        """
+
+        stats = self.stats
+        companyList = maxShareDict.values()
+        columnRange = range(FIRST_COMPANY_COLUMN, len(headerList))
+        validationSeconds = parsingSeconds = trackingSeconds = 0.0
+        rowValidator = self._getRowValidator(headerList)
+
+        # the rows are checked a batch at a time, so the validation time of a
+        # batch includes the reporting of the errors of its ignored rows.
+        rowIterator = rowValidator.iterRows(csvReader, rowCount)
+        while True:
+            startTime = time.time()
+            try:
+                rowCount, row, timeKey = rowIterator.next()
+            except StopIteration:
+                validationSeconds+= time.time() - startTime
+                break
+            parsingTime = time.time()
+            validationSeconds+= parsingTime - startTime
+
+            shareValues = [self._getShareValue(rowCount, sharesIndex, row)
+                           for sharesIndex in columnRange]
+            trackingTime = time.time()
+            parsingSeconds+= trackingTime - parsingTime
+
+            stats.rowsAccepted+= 1
+            stats.cellsParsed+= len(shareValues)
+            for companyObject, shareValue in zip(companyList, shareValues):
+                if shareValue is None:
+                    stats.invalidCells+= 1
+                    continue
+                if companyObject.topCount == 1 and shareValue == companyObject.maxShareValue:
+                    stats.tieAppends+= 1
+                companyObject.update(timeKey, shareValue)
+            trackingSeconds+= time.time() - trackingTime
+
+        stats.addPhaseTime(VALIDATION_PHASE, validationSeconds)
+        stats.addPhaseTime(PARSING_PHASE, parsingSeconds)
+        stats.addPhaseTime(TRACKING_PHASE, trackingSeconds)
+        return rowValidator.rowCount
+
+
+    def _processCsvFileChunked(self):
+        """
+        Split the share rows of the CSV into byte ranges aligned to line boundaries
+        and process every range in a separate worker process. The partial Company
+        states are merged in file order so that ties and their chronological order
+        are the same as with the python engine. The workers number the rows of
+        their range from 1 and record their errors in a sink, so the file is read
+        once: the rows of a range are renumbered while merging, with the row
+        counts of the ranges before it.
+        Assumes that no quoted field of the CSV spans more than one line.
+        A compressed CSV cannot be split in byte ranges and is processed with
+        the python engine.
+
+        :parameters:
+            None
+
+        :returns:
+            maxShareDict: `dict`
+                dictionary with company name as keys and Company() objects as values.
+
+        :raises:
+            Exception: `CsvError`
+                if CSV header data is insufficient/invalid
+                OR
+                if company names in the header data are not unique.
+
+        """
+
+        if getCompression(self.csvPath) is not None:
+            return self._processCsvFilePython()
+
+        csvFile = open(self.csvPath, 'rb')
+        try:
+            headerList, maxShareDict = self._readCsvHeader(csvFile)
+            chunkList = self._getChunkOffsets(csvFile, csvFile.tell(), self._getWorkerCount())
+        finally:
+            csvFile.close()
+
+        if len(chunkList) < 2:
+            return self._processCsvFilePython()
+
+        startTime = time.time()
+        pool = multiprocessing.Pool(len(chunkList))
+        try:
+            # without errorSink, every error of a chunk is recorded, to be
+            # printed once its rows are renumbered.
+            taskList = [(self.csvPath, self.reader, self.topCount, self.tieLimit,
+                         self.priceDecimals, self.companyAggregators, self.trusted, headerList,
+                         start, end, self._getWorkerSink() or CsvErrorSink(None),
+                         self._getWorkerStats())
+                        for start, end in chunkList]
+            chunkResults = pool.map(_processCsvChunk, taskList)
+        finally:
+            pool.close()
+            pool.join()
+        self._addPhaseTime(WORKERS_PHASE, startTime)
+
+        companyList = maxShareDict.values()
+        firstRow = 0
+        for topSharesList, aggregatorLists, rowCount, errorSink, stats in chunkResults:
+            if self.errorSink is not None:
+                self.errorSink.mergeSink(errorSink, firstRow)
+            else:
+                for reasonCode, rowIndex, columnIndex, value in errorSink.getRecords():
+                    self._reportCsvError(formatCsvError(reasonCode, rowIndex + firstRow,
+                                                        columnIndex, value))
+            firstRow+= rowCount
+            if stats is not None:
+                self.stats.mergeStats(stats)
+            for companyObject, topShares, aggregators in zip(
+                    companyList, topSharesList, aggregatorLists):
+                companyObject.mergeTopShares(*topShares)
+                companyObject.mergeAggregators(aggregators)
+
+        return maxShareDict
+
+
+    def _processCsvFileSharded(self):
+        """
+        Split the company columns of the CSV header into contiguous shards and
+        process every shard in a separate worker process over the same file.
+        The Company objects are assembled in header order and the error messages
+        are printed in the same order as with the python engine.
+        Scales with the number of companies rather than the number of rows.
+
+        :parameters:
+            None
+
+        :returns:
+            maxShareDict: `dict`
+                dictionary with company name as keys and Company() objects as values.
+
+        :raises:
+            Exception: `CsvError`
+                if CSV header data is insufficient/invalid
+                OR
+                if company names in the header data are not unique.
+
+        """
+
+        csvFile = openCsvFile(self.csvPath)
+        try:
+            headerList, maxShareDict = self._readCsvHeader(csvFile)
+        finally:
+            csvFile.close()
+
+        companyCount = len(maxShareDict)
+        shardCount = min(self._getWorkerCount(), companyCount)
+        if shardCount < 2:
+            return self._processCsvFilePython()
+
+        taskList = []
+        for shardIndex in range(shardCount):
+            firstColumn = FIRST_COMPANY_COLUMN + companyCount * shardIndex // shardCount
+            endColumn = FIRST_COMPANY_COLUMN + companyCount * (shardIndex + 1) // shardCount
+            taskList.append((self.csvPath, self.reader, self.topCount, self.tieLimit,
+                             self.priceDecimals, self.companyAggregators, self.trusted,
+                             headerList, firstColumn,
+                             endColumn, shardIndex, self._getWorkerSink(),
+                             self._getWorkerStats()))
+
+        startTime = time.time()
+        pool = multiprocessing.Pool(shardCount)
+        try:
+            shardResults = pool.map(_processCsvShard, taskList)
+        finally:
+            pool.close()
+            pool.join()
+        self._addPhaseTime(WORKERS_PHASE, startTime)
+
+        # the shards hold the companies in header order.
+        companyList = maxShareDict.values()
+        errorList = []
+        companyIndex = 0
+        for topSharesList, aggregatorLists, shardErrorList, errorSink, stats in shardResults:
+            for topShares, aggregators in zip(topSharesList, aggregatorLists):
+                companyList[companyIndex].mergeTopShares(*topShares)
+                companyList[companyIndex].mergeAggregators(aggregators)
+                companyIndex+= 1
+            errorList.extend(shardErrorList)
+            if errorSink is not None:
+                self.errorSink.mergeSink(errorSink)
+            if stats is not None:
+                self.stats.mergeStats(stats)
+
+        # errors are sorted by row, then by shard, which is the column order.
+        errorList.sort(key=lambda errorInfo: errorInfo[:2])
+        for rowCount, shardIndex, errorMessages in errorList:
+            for errorMessage in errorMessages:
+                self._reportCsvError(errorMessage)
+
+        return maxShareDict
+
+
+    def _getChunkOffsets(self, csvFile, dataStart, chunkCount):
+        """
+        Split the bytes of csvFile from dataStart to the end of file in
+        chunkCount ranges starting at line boundaries.
+        Ranges smaller than MIN_CHUNK_SIZE are not split further.
+
+        :parameters:
+            csvFile: `file`
+                file object of the CSV file opened in binary mode.
+
+            dataStart: `int`
+                offset of the first share row.
+
+            chunkCount: `int`
+                maximum number of ranges.
+
+        :returns:
+            chunkList: `list`
+                list of (start, end) byte offsets.
+
+        :raises:
+            None
+
+        """
+
+        fileSize = os.fstat(csvFile.fileno()).st_size
+        dataSize = fileSize - dataStart
+        chunkCount = max(1, min(chunkCount, dataSize // max(1, MIN_CHUNK_SIZE)))
+
+        offsetList = [dataStart]
+        for chunkIndex in range(1, chunkCount):
+            # moving one byte back makes a target at a line start stay there.
+            csvFile.seek(dataStart + dataSize * chunkIndex // chunkCount - 1)
+            csvFile.readline()
+            offset = csvFile.tell()
+            if offset > offsetList[-1] and offset < fileSize:
+                offsetList.append(offset)
+        offsetList.append(fileSize)
+
+        return zip(offsetList[:-1], offsetList[1:])
+
+
+    def _getWorkerCount(self):
+        """
+        Return the number of worker processes to use.
+        Defaults to the number of CPUs if workers is not set.
+        """
+
+        if self.workers:
+            return self.workers
+        return multiprocessing.cpu_count()
+
+
+    def _getWorkerSink(self):
+        """
+        Return an empty CsvErrorSink with the caps of errorSink for a worker
+        process, None if errorSink is not set.
+        """
+
+        if self.errorSink is None:
+            return None
+        return CsvErrorSink(self.errorSink.maxRecords)
+
+
+    def _getWorkerStats(self):
+        """
+        Return an empty ProcessingStats for a worker process, None if stats is
+        not set. The callback is only called in the main process.
+        """
+
+        if self.stats is None:
+            return None
+        return ProcessingStats()
+
+
+    def _processCsvFileNumpy(self):
+        """
+        Process the CSV into a 2-D integer matrix (rows = months, columns = companies)
+        and find the max share value and all tied (year, month) rows of every company
+        with vectorized column reductions.
+        Gives the same maxShareDict as the python engine.
+        
+        :parameters:
+            None
+
+        :returns:
+            maxShareDict: `dict`
+                dictionary with company name as keys and Company() objects as values.
+
+        :raises:
+            Exception: `CsvError`
+                if CSV header data is insufficient/invalid
+                OR
+                if company names in the header data are not unique.
+            
+        """
+
+        csvFile = openCsvFile(self.csvPath)
+        try:
+            headerList, maxShareDict = self._readCsvHeader(csvFile)
+            csvReader = self._getRowReader(csvFile, csvFile.tell())
+            timeKeys, valueList, validList = self._parseShareMatrix(csvReader, headerList)
+        finally:
+            csvFile.close()
+
+        startTime = time.time()
+        self._findMaxSharesNumpy(maxShareDict, timeKeys, valueList, validList)
+        self._updateMatrixAggregators(maxShareDict, timeKeys, valueList, validList)
+        self._addPhaseTime(TRACKING_PHASE, startTime)
+        return maxShareDict
+
+
+    def _processCsvFileIncremental(self):
+        """
+        Resume processing of the CSV from the state saved in statePath by the last
+        run, so that only the rows appended since then are read, then save the new
+        state. A full rebuild is done if there is no usable state, if the header
+        changed or if the CSV was rewritten rather than appended to.
+        A last line without line ending is processed but not saved in the state,
+        as it may still be incomplete.
+
+        :parameters:
+            None
+
+        :returns:
+            maxShareDict: `dict`
+                dictionary with company name as keys and Company() objects as values.
+
+        :raises:
+            Exception: `CsvError`
+                if CSV header data is insufficient/invalid
+                OR
+                if company names in the header data are not unique.
+                OR
+                if the CSV file is compressed or other statistics or the yearly
+                peaks are requested.
+
+        """
+
+        if getCompression(self.csvPath) is not None:
+            raise CsvError("Incremental processing is not supported for compressed CSV files.")
+        if self.companyAggregators:
+            raise CsvError("Incremental processing is not supported with share statistics "
+                           "or yearly peaks.")
+
+        csvFile = open(self.csvPath, 'rb')
+        try:
+            headerList, maxShareDict = self._readCsvHeader(csvFile)
+            dataStart = csvFile.tell()
+            fileSize = os.fstat(csvFile.fileno()).st_size
+
+            offset = dataStart
+            rowCount = 0
+            state = self._loadIncrementalState(csvFile, headerList, fileSize)
+            if state is not None:
+                offset, rowCount, topSharesList = state
+                for companyObject, topShares in zip(maxShareDict.values(), topSharesList):
+                    companyObject.mergeTopShares(*topShares)
+            self.resumeOffset = offset
+
+            lineEnd = self._findLastLineEnd(csvFile, offset, fileSize)
+            csvReader = self._getRowReader(csvFile, offset, lineEnd)
+            rowCount = self._processCsvRows(csvReader, headerList, maxShareDict, rowCount)
+            self._saveIncrementalState(csvFile, headerList, lineEnd, rowCount, maxShareDict)
+
+            if lineEnd < fileSize:
+                csvReader = self._getRowReader(csvFile, lineEnd, fileSize)
+                self._processCsvRows(csvReader, headerList, maxShareDict, rowCount)
+        finally:
+            csvFile.close()
+        return maxShareDict
+
+
+    def _loadIncrementalState(self, csvFile, headerList, fileSize):
+        """
+        Load the state saved by the last incremental run if it is still usable
+        for the CSV file.
+
+        :parameters:
+            csvFile: `file`
+                file object of the CSV file opened in binary mode.
+
+            headerList: `list`
+                list of strings representing a row of CSV header data.
+
+            fileSize: `int`
+                current size of the CSV file.
+
+        :returns:
+            state: `tuple`
+                (offset, rowCount, topSharesList) or None if the state file is
+                missing or invalid, the CSV path, header, topCount or priceDecimals
+                changed, or the bytes before the saved offset are not the same anymore.
+
+        :raises:
+            None
+
+        """
+
+        try:
+            stateFile = open(self.statePath, 'rb')
+        except IOError:
+            return None
+
+        try:
+            (version, csvPath, stateHeaderList, topCount, tieLimit, priceDecimals, offset,
+             rowCount, tailBytes, packedSharesList) = marshal.loads(stateFile.read())
+        except (ValueError, EOFError, TypeError):
+            return None
+        finally:
+            stateFile.close()
+
+        if (version != STATE_FORMAT_VERSION or csvPath != os.path.realpath(self.csvPath)
+            or stateHeaderList != headerList or topCount != self.topCount
+            or tieLimit != self.tieLimit or priceDecimals != self.priceDecimals or offset > fileSize):
+            return None
+
+        csvFile.seek(offset - len(tailBytes))
+        if csvFile.read(len(tailBytes)) != tailBytes:
+            return None
+
+        topSharesList = []
+        for timeKeyBytes, shareValues, droppedTies in packedSharesList:
+            timeKeys = array.array(STORE_TIME_TYPECODE)
+            timeKeys.fromstring(timeKeyBytes)
+            topSharesList.append((timeKeys, shareValues, droppedTies))
+        return offset, rowCount, topSharesList
+
+
+    def _saveIncrementalState(self, csvFile, headerList, offset, rowCount, maxShareDict):
+        """
+        Save the per company max share info, with the time keys packed as bytes,
+        and the offset and row count where processing stopped to statePath. The bytes just before the offset are
+        saved too, to detect a rewritten CSV file.
+
+        :parameters:
+            csvFile: `file`
+                file object of the CSV file opened in binary mode.
+
+            headerList: `list`
+                list of strings representing a row of CSV header data.
+
+            offset: `int`
+                offset of the first share row not processed yet.
+
+            rowCount: `int`
+                number of share rows processed.
+
+            maxShareDict: `dict`
+                dictionary with company name as keys and Company() objects as values.
+
+        :returns:
+            None
+
+        :raises:
+            None
+
+        """
+
+        tailStart = max(0, offset - STATE_TAIL_SIZE)
+        csvFile.seek(tailStart)
+        tailBytes = csvFile.read(offset - tailStart)
+
+        packedSharesList = []
+        for companyObject in maxShareDict.values():
+            timeKeys, shareValues = companyObject.getTopShares()
+            packedSharesList.append((timeKeys.tostring(), shareValues,
+                                     companyObject.droppedTies))
+        stateData = marshal.dumps((STATE_FORMAT_VERSION, os.path.realpath(self.csvPath),
+                                   headerList, self.topCount, self.tieLimit,
+                                   self.priceDecimals, offset, rowCount, tailBytes,
+                                   packedSharesList), 2)
+
+        stateFile = open(self.statePath, 'wb')
+        stateFile.write(stateData)
+        stateFile.close()
+
+
+    def _findLastLineEnd(self, csvFile, start, end):
+        """
+        Return the offset just after the last line ending between start and end,
+        or start if there is none.
+
+        :parameters:
+            csvFile: `file`
+                file object of the CSV file opened in binary mode.
+
+            start: `int`
+                offset where the search stops.
+
+            end: `int`
+                offset where the search starts, searching backwards.
+
+        :returns:
+            offset: `int`
+                offset of the first byte after the last line ending.
+
+        :raises:
+            None
+
+        """
+
+        blockEnd = end
+        while blockEnd > start:
+            blockStart = max(start, blockEnd - LINE_SEARCH_BLOCK_SIZE)
+            csvFile.seek(blockStart)
+            lineEnd = csvFile.read(blockEnd - blockStart).rfind('\n')
+            if lineEnd >= 0:
+                return blockStart + lineEnd + 1
+            blockEnd = blockStart
+        return start
+
+
+    def _processCsvFileCached(self):
+        """
+        Load the parsed share matrix of the CSV from the cache, or parse the CSV
+        and store its share matrix in the cache, then find the max share values.
+        The error messages of the ignored rows and cells are stored with the
+        matrix and printed again on every run.
+        The max share values are found with numpy reductions for the numpy
+        engine and in pure python otherwise.
+
+        :parameters:
+            None
+
+        :returns:
+            maxShareDict: `dict`
+                dictionary with company name as keys and Company() objects as values.
+
+        :raises:
+            Exception: `CsvError`
+                if CSV header data is insufficient/invalid
+                OR
+                if company names in the header data are not unique.
+
+        """
+
+        maxShareDict, timeKeys, valueList, validList = self.loadShareMatrix()
+        startTime = time.time()
+        if self.engine == NUMPY_ENGINE:
+            self._findMaxSharesNumpy(maxShareDict, timeKeys, valueList, validList)
+        else:
+            self._findMaxSharesPython(maxShareDict, timeKeys, valueList, validList)
+        self._updateMatrixAggregators(maxShareDict, timeKeys, valueList, validList)
+        self._addPhaseTime(TRACKING_PHASE, startTime)
+        return maxShareDict
+
+
+    def _processSharesStore(self):
+        """
+        Find the max share values in a shares store compiled by compileSharesStore.
+        The store is memory mapped and scanned one company column at a time, with
+        numpy reductions over the mapped columns for the numpy engine and in pure
+        python otherwise. The errors found when the store was compiled are
+        reported again. The cache and the incremental state are not used.
+
+        :parameters:
+            None
+
+        :returns:
+            maxShareDict: `dict`
+                dictionary with company name as keys and Company() objects as values.
+
+        :raises:
+            Exception: `CsvError`
+                if the store cannot be read or its header data is invalid
+                OR
+                if the store was compiled with another number of decimal places.
+
+        """
+
+        startTime = time.time()
+        sharesStore = self._openSharesStore()
+        maxShareDict = self._buildMaxShareDict(sharesStore.headerList)
+        timeKeys = sharesStore.getTimeKeys()
+        self._reportErrorRecords(sharesStore.errorList)
+        if self.stats is not None:
+            self._addPhaseTime(MATRIX_PHASE, startTime)
+            self.stats.bytesRead+= sharesStore.storeSize
+            self.stats.rowsAccepted+= sharesStore.rowCount
+            self.stats.cellsParsed+= sharesStore.rowCount * sharesStore.companyCount
+            self.stats.invalidCells+= sharesStore.invalidCount
+            for errorRecord in sharesStore.errorList:
+                if errorRecord[0] != INVALID_SHARE_ERROR:
+                    self.stats.rejectRow(errorRecord[0])
+
+        startTime = time.time()
+        if self.engine == NUMPY_ENGINE and sharesStore.rowCount:
+            # the mapped memory stays alive as long as the matrix views use it.
+            shareMatrix, validMatrix = sharesStore.getShareMatrix()
+            self._findMaxSharesNumpy(maxShareDict, timeKeys, shareMatrix, validMatrix)
+        else:
+            self._findMaxSharesColumns(maxShareDict, timeKeys, sharesStore)
+        if self.companyAggregators:
+            for companyIndex, companyObject in enumerate(maxShareDict.values()):
+                validFlags = sharesStore.getValidFlags(companyIndex)
+                companyObject.updateAggregators(
+                    list(itertools.compress(timeKeys, validFlags)),
+                    list(itertools.compress(sharesStore.getValues(companyIndex), validFlags)))
+        if self.engine != NUMPY_ENGINE or not sharesStore.rowCount:
+            sharesStore.close()
+        self._addPhaseTime(TRACKING_PHASE, startTime)
+        return maxShareDict
+
+
+    def _openSharesStore(self):
+        """
+        Open the shares store of csvPath and check its number of decimal places.
+        """
+
+        try:
+            sharesStore = SharesStore(self.csvPath)
+        except IOError, e:
+            raise CsvError("Could not read shares store: %s \n\t%s" %(self.csvPath, e))
+        if sharesStore.priceDecimals != self.priceDecimals:
+            sharesStore.close()
+            raise CsvError("Shares store: %s was compiled with %s decimal places, not %s."
+                           %(self.csvPath, sharesStore.priceDecimals, self.priceDecimals))
+        return sharesStore
+
+
+    def loadShareMatrix(self):
+        """
+        Parse the share rows of the CSV into a flat, row major, matrix of share
+        values (rows = months, columns = companies). If cache is set, the matrix
+        is loaded from the cache, or stored in it after parsing along with the
+        records of the errors of the ignored rows and cells. The errors are
+        reported in both cases.
+
+        :parameters:
+            None
+
+        :returns:
+            (maxShareDict, timeKeys, valueList, validList): `tuple`
+                dictionary with company name as keys and Company() objects as values,
+                int32 array with the time key of every accepted row, the share values
+                of the accepted rows and a flag per share value, False for invalid
+                cells.
+
+        :raises:
+            Exception: `CsvError`
+                if CSV header data is insufficient/invalid
+                OR
+                if company names in the header data are not unique.
+
+        """
+
+        startTime = time.time()
+        if isSharesStore(self.csvPath):
+            sharesStore = self._openSharesStore()
+            maxShareDict = self._buildMaxShareDict(sharesStore.headerList)
+            valueList, validList = sharesStore.getShareMatrixLists()
+            timeKeys = sharesStore.getTimeKeys()
+            self._addPhaseTime(MATRIX_PHASE, startTime)
+            self._reportErrorRecords(sharesStore.errorList)
+            sharesStore.close()
+            return maxShareDict, timeKeys, valueList, validList
+
+        parsedData = None
+        if self.cache is not None:
+            parsedData = self.cache.load(self.csvPath, self.priceDecimals, self.trusted)
+
+        errorList = []
+        if parsedData is None:
+            csvFile = openCsvFile(self.csvPath)
+            errorSink = self.errorSink
+            try:
+                headerList, maxShareDict = self._readCsvHeader(csvFile)
+                csvReader = self._getRowReader(csvFile, csvFile.tell())
+                if self.cache is not None:
+                    # every error is recorded to be stored along with the matrix.
+                    self.errorSink = CsvErrorSink(None)
+                timeKeys, valueList, validList = self._parseShareMatrix(csvReader, headerList)
+                if self.cache is not None:
+                    errorList = self.errorSink.getRecords()
+            finally:
+                self.errorSink = errorSink
+                csvFile.close()
+            if self.cache is not None:
+                self.cache.store(self.csvPath, (headerList, timeKeys, valueList, validList,
+                                                errorList), self.priceDecimals, self.trusted)
+        else:
+            headerList, timeKeys, valueList, validList, errorList = parsedData
+            maxShareDict = self._buildMaxShareDict(headerList)
+            if self.stats is not None:
+                self._addPhaseTime(MATRIX_PHASE, startTime)
+                self.stats.countShareMatrix(timeKeys, validList)
+                for errorRecord in errorList:
+                    if errorRecord[0] != INVALID_SHARE_ERROR:
+                        self.stats.rejectRow(errorRecord[0])
+
+        self._reportErrorRecords(errorList)
+        return maxShareDict, timeKeys, valueList, validList
+
+
+    def _reportErrorRecords(self, errorList):
+        """
+        Report the (reasonCode, rowIndex, columnIndex, value) records of errors
+        found by an earlier parse of the CSV file, to errorSink if it is set.
+        """
+
+        for errorRecord in errorList:
+            if self.errorSink is None:
+                self._reportCsvError(formatCsvError(*errorRecord))
+            else:
+                self.errorSink.addError(*errorRecord)
+
+
+    def _parseShareMatrix(self, csvReader, headerList):
+        """
+        Validate the share rows from csvReader and convert them into a flat,
+        row major, matrix of share values (rows = months, columns = companies).
+
+        :parameters:
+            csvReader: `iterator`
+                iterator over the share rows.
+
+            headerList: `list`
+                list of strings representing a row of CSV header data.
+
+        :returns:
+            (timeKeys, valueList, validList): `tuple`
+                int32 array with the time key of every accepted row, as found by
+                the RowValidator, the share values of the accepted rows and a flag
+                per share value, False for invalid cells.
+
+        :raises:
+            None
+
+        """
+
+        companyCount = len(headerList) - FIRST_COMPANY_COLUMN
+
+        # invalid cells get a value lower than the initial share value so that
+        # they can never become a max value. validList marks them anyway.
+        invalidValue = INITIAL_SHARE_VALUE - 1
+        validRow = [True] * companyCount
+        priceDecimals = self.priceDecimals
+
+        timeKeys = array.array(STORE_TIME_TYPECODE)
+        valueList = []
+        validList = []
+        startTime = time.time()
+
+        for rowCount, row, timeKey in self._getRowValidator(headerList).iterRows(csvReader):
+            # convert the whole row in one go. Only fall back to the cell by cell
+            # conversion to report the invalid cells of the row.
+            try:
+                if priceDecimals:
+                    valueList.extend([parseShareValue(value, priceDecimals)
+                                      for value in row[FIRST_COMPANY_COLUMN:]])
+                else:
+                    valueList.extend([int(value) for value in row[FIRST_COMPANY_COLUMN:]])
+                validList.extend(validRow)
+            except ValueError:
+                for sharesIndex in range(FIRST_COMPANY_COLUMN, companyCount+FIRST_COMPANY_COLUMN):
+                    shareValue = self._getShareValue(rowCount, sharesIndex, row)
+                    if shareValue is None:
+                        valueList.append(invalidValue)
+                        validList.append(False)
+                    else:
+                        valueList.append(shareValue)
+                        validList.append(True)
+
+            timeKeys.append(timeKey)
+
+        if self.stats is not None:
+            self._addPhaseTime(MATRIX_PHASE, startTime)
+            self.stats.countShareMatrix(timeKeys, validList)
+        return timeKeys, valueList, validList
+
+
+    def _findMaxSharesNumpy(self, maxShareDict, timeKeys, valueList, validList):
+        """
+        Find the max share value and the tied rows of every company of the share
+        matrix with vectorized column reductions and update maxShareDict.
+
+        :parameters:
+            maxShareDict: `dict`
+                dictionary with company name as keys and Company() objects as values.
+
+            timeKeys: `array`
+                time key of every row of the share matrix.
+
+            valueList, validList: `sequence`
+                share matrix as returned by _parseShareMatrix.
+
+        :returns:
+            None
+
+        :raises:
+            None
+
+        """
+
+        if not timeKeys:
+            return
+
+        # share values beyond 64 bit integers fall back to python objects.
+        try:
+            shareMatrix = numpy.asarray(valueList, dtype=numpy.int64)
+        except OverflowError:
+            shareMatrix = numpy.array(valueList, dtype=object)
+        shareMatrix = shareMatrix.reshape(len(timeKeys), len(maxShareDict))
+        validMatrix = numpy.asarray(validList, dtype=bool).reshape(shareMatrix.shape)
+
+        if self.topCount > 1:
+            if shareMatrix.dtype == object:
+                self._findMaxSharesPython(maxShareDict, timeKeys, valueList, validList)
+            else:
+                self._findTopSharesNumpy(maxShareDict, timeKeys, shareMatrix, validMatrix)
+            return
+
+        maxValues = shareMatrix.max(axis=0)
+        tieMatrix = (shareMatrix == maxValues) & validMatrix
+
+        # transposing keeps the tied rows grouped by company and in file order,
+        # and their time keys are gathered in one go.
+        tieColumns, tieRows = numpy.nonzero(tieMatrix.T)
+        tieKeys = numpy.frombuffer(timeKeys, dtype=numpy.int32)[tieRows]
+        companyStarts = numpy.searchsorted(tieColumns, numpy.arange(len(maxShareDict) + 1))
+
+        for companyIndex, companyObject in enumerate(maxShareDict.values()):
+            maxValue = maxValues[companyIndex]
+            if maxValue < INITIAL_SHARE_VALUE:
+                continue
+            companyTieKeys = tieKeys[companyStarts[companyIndex]:companyStarts[companyIndex+1]]
+            companyObject.mergeTopShares(companyTieKeys.tolist(),
+                                         [int(maxValue)] * len(companyTieKeys))
+
+
+    def _findTopSharesNumpy(self, maxShareDict, timeKeys, shareMatrix, validMatrix):
+        """
+        Find the topCount highest months of every company of the share matrix,
+        with the months tied with the lowest of them. The threshold value of every
+        company is found with a vectorized partial sort of the columns, then only
+        the months over the threshold are pushed to the Company() objects.
+        The initial tuple ranks like a share value as it does in Company().
+
+        :parameters:
+            maxShareDict: `dict`
+                dictionary with company name as keys and Company() objects as values.
+
+            timeKeys: `array`
+                time key of every row of the share matrix.
+
+            shareMatrix: `numpy.ndarray`
+                int64 share values, rows = months, columns = companies.
+
+            validMatrix: `numpy.ndarray`
+                False for the invalid cells of shareMatrix.
 
+        :returns:
+            None
+
+        :raises:
+            None
 
-class Company():
-    """
-    class to store per company max share value info
-    """
-    def __init__(self):
         """
-        initialize maxShareList to store only max value tuples.
-        Using list of tuples as companies can maxShareValue for more than one month.
-        maxShareList = [(Year, Month, maxShareValue),]
-        eg. maxShareList = [('2013', 'Jan', '2000'),]
+
+        # the first row holds the initial share value of every company.
+        rowCount, companyCount = shareMatrix.shape
+        initialRow = numpy.full((1, companyCount), INITIAL_SHARE_VALUE, dtype=numpy.int64)
+        shareMatrix = numpy.vstack((initialRow, shareMatrix))
+        validMatrix = numpy.vstack((numpy.ones((1, companyCount), dtype=bool), validMatrix))
+
+        # with invalid cells at the lowest int64, the topCount-th highest value is
+        # a valid value whenever a column has at least topCount valid values.
+        # Otherwise all the valid values are kept.
+        lowestValue = numpy.iinfo(numpy.int64).min
+        filledMatrix = numpy.where(validMatrix, shareMatrix, lowestValue)
+        kthIndex = max(0, rowCount + 1 - self.topCount)
+        thresholds = numpy.partition(filledMatrix, kthIndex, axis=0)[kthIndex]
+        thresholds[validMatrix.sum(axis=0) <= self.topCount] = lowestValue
+        topMatrix = (filledMatrix >= thresholds) & validMatrix
+
+        topColumns, topRows = numpy.nonzero(topMatrix.T)
+        topDict = collections.defaultdict(list)
+        for companyIndex, rowIndex in zip(topColumns.tolist(), topRows.tolist()):
+            topDict[companyIndex].append(rowIndex)
+
+        # the Company() objects already hold the initial share value.
+        for companyIndex, companyObject in enumerate(maxShareDict.values()):
+            for rowIndex in topDict[companyIndex]:
+                if rowIndex:
+                    companyObject.updateMaxShareKey(timeKeys[rowIndex-1],
+                                                    int(shareMatrix[rowIndex, companyIndex]))
+
+
+    def _updateMatrixAggregators(self, maxShareDict, timeKeys, valueList, validList):
+        """
+        Update the aggregators of the other statistics of every company with the
+        valid share values of its column of the share matrix.
 
         :parameters:
-            None
+            maxShareDict: `dict`
+                dictionary with company name as keys and Company() objects as values.
+
+            timeKeys: `array`
+                time key of every row of the share matrix.
+
+            valueList, validList: `sequence`
+                share matrix as returned by _parseShareMatrix.
 
         :returns:
             None
 
         :raises:
             None
-            
+
         """
 
-        # initialising share value with a very small negative number.
-        # in normal circumstances, we do not expect the share values
-        # to reach this low. This logic could be improved but currently assuming.
-   
-        # list of tuples for max share info, (year, month, share_value)
-        self.maxShareList = [('NA', 'NA', -999999),]
+        if not self.companyAggregators:
+            return
 
+        companyCount = len(maxShareDict)
+        for companyIndex, companyObject in enumerate(maxShareDict.values()):
+            validFlags = validList[companyIndex::companyCount]
+            companyObject.updateAggregators(
+                list(itertools.compress(timeKeys, validFlags)),
+                list(itertools.compress(valueList[companyIndex::companyCount], validFlags)))
 
-class CsvError(Exception):
-    """
-    custom exception to raise if CSV file cannot be accessed
-    or is not readable or if it contains invalid data.
-    """
-    #using the default definition of the Exception class
-    pass
-    
 
-class SharesInfo():
-    """
-    class to process the CSV file.
-    Assuming that the user initialises the class with csv file path
-    """
-    def __init__(self, csvPath=None):
+    def _findMaxSharesPython(self, maxShareDict, timeKeys, valueList, validList):
         """
-        Initialize cvsPath with the string passed by the user while
-        instantiating the this class.
+        Find the max share value and the tied rows of every company of the share
+        matrix one cell at a time and update maxShareDict.
 
         :parameters:
-            csvPath: `string`
-                filepath passed by the user while instantiating the this class.
+            maxShareDict: `dict`
+                dictionary with company name as keys and Company() objects as values.
+
+            timeKeys: `array`
+                time key of every row of the share matrix.
+
+            valueList, validList: `sequence`
+                share matrix as returned by _parseShareMatrix.
 
         :returns:
             None
 
         :raises:
             None
-            
+
         """
-        self.csvPath = csvPath
 
+        companyList = maxShareDict.values()
+        cellIndex = 0
+        for timeKey in timeKeys:
+            for companyObject in companyList:
+                if validList[cellIndex]:
+                    companyObject.updateMaxShareKey(timeKey, valueList[cellIndex])
+                cellIndex+= 1
 
-    def processCsvFile(self):
+
+    def _findMaxSharesColumns(self, maxShareDict, timeKeys, sharesStore):
         """
-        This is main function that processes the CSV, parses data and displays results.
+        Find the max, or top, share values of every company of a shares store
+        one column at a time in pure python and update maxShareDict.
 
         :parameters:
-            None
+            maxShareDict: `dict`
+                dictionary with company name as keys and Company() objects as values.
+
+            timeKeys: `array`
+                time key of every row of the store.
+
+            sharesStore: `SharesStore`
+                opened shares store.
 
         :returns:
             None
 
         :raises:
             None
-            
+
         """
-        
-        #check if the csv file exists and is readable and is not None
-        try:
-            self.checkCsvPath(self.csvPath)
-        except CsvError, e:
-            print "\nInvalid CSV file path: %s \n\t%s"%(self.csvPath, e)
-            print "Processing Aborted!"
-            return
-        
-        # process CSV file and collect max shares info.
-        try:
-            self.maxShareDict = self._processCsvFile()
-        except CsvError, e:
-            print "\nInvalid data in CSV file: %s \n\t%s"%(self.csvPath, e)
-            print "Processing Aborted!"
-            return
-        
-        # print self.maxShareDict
-        if self.maxShareDict:
-            self.displayResults()
 
+        rowIndexes = range(sharesStore.rowCount)
+        for companyIndex, companyObject in enumerate(maxShareDict.values()):
+            valueList = sharesStore.getValues(companyIndex)
+            validRows = list(itertools.compress(rowIndexes,
+                                                sharesStore.getValidFlags(companyIndex)))
 
-    def _processCsvFile(self):
+            if self.topCount > 1:
+                for rowIndex in validRows:
+                    companyObject.updateMaxShareKey(timeKeys[rowIndex], valueList[rowIndex])
+                continue
+
+            if not validRows:
+                continue
+            maxValue = max([valueList[rowIndex] for rowIndex in validRows])
+            if maxValue < INITIAL_SHARE_VALUE:
+                continue
+            tieKeys = [timeKeys[rowIndex] for rowIndex in validRows
+                       if valueList[rowIndex] == maxValue]
+            companyObject.mergeTopShares(tieKeys, [maxValue] * len(tieKeys))
+
+
+    def _readCsvHeader(self, csvFile):
         """
-        This is the internal function that processes the CSV and returns a dictionary
-        with company name as keys and Company objects as values.
-        
+        Read and validate the CSV header row and build the dictionary with
+        company name as keys and Company objects as values.
+        csvFile is left at the first share row, or closed if the header is invalid.
+
         :parameters:
-            None
+            csvFile: `file`
+                file object of the CSV file positioned at the header row.
 
         :returns:
-            maxShareDict: `dict`
-                dictionary with company name as keys and Company() objects as values.
-                maxSharesDict = {
-                                  'Company A' : Company(),
-                                  'Company B' : Company()
-                                }
+            (headerList, maxShareDict): `tuple`
+                list of header strings and the ordered dictionary of Company() objects.
 
         :raises:
             Exception: `CsvError`
                 if CSV header data is insufficient/invalid
                 OR
                 if company names in the header data are not unique.
-                
-            
+
         """
 
-        #csvFile shoud support iterator protocol hence get a file object.
-        csvFile = open(self.csvPath, 'rb')
-        csvReader = csv.reader(csvFile, delimiter=',')
-        headerList = csvReader.next()
+        startTime = time.time()
+        headerLine = csvFile.readline()
+        headerList = csv.reader([headerLine], delimiter=',').next()
 
         try:
-            self.validateCsvHeaderRow(headerList)
+            maxShareDict = self._buildMaxShareDict(headerList)
         except CsvError, e:
             csvFile.close()
             raise CsvError(e.message)
 
+        if self.stats is not None:
+            self._addPhaseTime(HEADER_PHASE, startTime)
+            self.stats.bytesRead+= len(headerLine)
+        return headerList, maxShareDict
+
+
+    def _buildMaxShareDict(self, headerList):
+        """
+        Validate the CSV header row and build the dictionary with company name
+        as keys and Company objects as values. The dictionary is empty for the
+        long layout, whose companies are added as they appear in the rows.
+
+        :parameters:
+            headerList: `list`
+                list of strings representing a row of CSV header data.
+
+        :returns:
+            maxShareDict: `dict`
+                ordered dictionary with company name as keys and Company() objects as values.
+
+        :raises:
+            Exception: `CsvError`
+                if CSV header data is insufficient/invalid
+                OR
+                if company names in the header data are not unique.
+
+        """
+
+        if self.layout == LONG_LAYOUT:
+            self.validateLongHeaderRow(headerList)
+            return collections.OrderedDict()
+
+        self.validateCsvHeaderRow(headerList)
+
         # Using ordered dict here to keep track of company name and corresponding
         # max shares data. This is a python 2.7 property.
         maxShareDict = collections.OrderedDict()
 
         for companyIndex in range(2, len(headerList)):
             companyName = headerList[companyIndex].strip()
+            self.checkUniqueCompanyNames(companyIndex, companyName, maxShareDict)
+            maxShareDict[companyName] = self._newCompany()
+
+        return maxShareDict
+
+
+    def _newCompany(self):
+        """
+        Return the Company() object of a company, an AggregatedCompany() if other
+        statistics are requested.
+        """
+
+        if self.companyAggregators:
+            return AggregatedCompany(self.topCount, self.companyAggregators, self.tieLimit)
+        return Company(self.topCount, self.tieLimit)
+
+
+    def _getRowReader(self, csvFile, start, end=None):
+        """
+        Return an iterator over the share rows of csvFile for the selected reader.
+        The rows of a DecompressedFile() are read sequentially with csv.reader,
+        from its current line to the end, whatever the reader.
+
+        :parameters:
+            csvFile: `file`
+                file object of the CSV file opened in binary mode, or a
+                DecompressedFile() of a compressed CSV file.
+
+            start: `int`
+                offset of the first share row to read.
+
+            end: `int`
+                offset where reading stops. Defaults to the end of file.
+
+        :returns:
+            `iterator`
+                iterator over the rows. Rows are lists of strings for CSV_READER
+                and MappedRow() objects for MMAP_READER.
+
+        :raises:
+            None
+
+        """
+
+        if isinstance(csvFile, DecompressedFile):
+            if self.stats is not None:
+                return csv.reader(_iterCountedLines(csvFile, self.stats), delimiter=',')
+            return csv.reader(csvFile, delimiter=',')
+
+        if self.stats is not None:
+            if end is None:
+                self.stats.bytesRead+= os.fstat(csvFile.fileno()).st_size - start
+            else:
+                self.stats.bytesRead+= end - start
+
+        if self.reader == MMAP_READER:
+            return _iterMappedRows(csvFile, start, end)
+
+        csvFile.seek(start)
+        if end is None:
+            return csv.reader(csvFile, delimiter=',')
+        return csv.reader(_iterChunkLines(csvFile, start, end), delimiter=',')
+
+
+    def _getRowValidator(self, headerList):
+        """
+        Return the RowValidator() of the share rows of a header, compiled on the
+        first call and kept with its caches for the next batches of rows.
+        """
+
+        if self.rowValidator is None or self.rowValidator.columnCount != len(headerList):
+            self.rowValidator = RowValidator(headerList, self._reportRowError, self.trusted)
+        return self.rowValidator
+
+
+    def _reportRowError(self, errorCode, rowIndex, rowList):
+        """
+        Count the ignored row in stats and report its error, recorded in errorSink
+        if it is set and as a message otherwise.
+        """
+
+        columnIndex = NO_COLUMN
+        value = ''
+        if errorCode in (INVALID_YEAR_ERROR, OLD_YEAR_ERROR):
+            columnIndex = YEAR_COLUMN
+            value = rowList[YEAR_COLUMN]
+        elif errorCode == INVALID_MONTH_ERROR:
+            columnIndex = MONTH_COLUMN
+            value = rowList[MONTH_COLUMN]
+        elif errorCode in (MISSING_COMPANY_ERROR, DUPLICATE_MONTH_ERROR):
+            columnIndex = COMPANY_COLUMN
+            value = rowList[COMPANY_COLUMN].strip()
+
+        if self.stats is not None:
+            self.stats.rejectRow(errorCode)
+        if self.errorSink is None:
+            self._reportCsvError(formatCsvError(errorCode, rowIndex, columnIndex, value))
+        else:
+            self.errorSink.addError(errorCode, rowIndex, columnIndex, value)
+
+
+    def _getShareValue(self, rowIndex, columnIndex, rowList):
+        """
+        Return the integer share value of a cell, or None after reporting the
+        error if the cell is invalid. With errorSink set, only the reason of the
+        error is recorded.
+        """
 
+        if self.errorSink is None:
             try:
-                self.checkUniqueCompanyNames(companyIndex, companyName, maxShareDict)
+                return self.getIntegerShareValueFromString(rowIndex, columnIndex, rowList)
             except CsvError, e:
-                csvFile.close()
-                raise CsvError(e.message)
-            
-            maxShareDict[companyName] = Company()
-       
-        rowCount = 0
-        for row in csvReader:
-            rowCount+= 1
-            try:
-                self.checkMissingSharesData(rowCount, row, headerList)
-                self.checkExtraSharesData(rowCount, row, headerList)
-                self.verifyYearValue(rowCount, row[YEAR_COLUMN])
-            except CsvError,e:
-                print "\n%s \n\tPlease Check the CSV file: %s" %(e, self.csvPath)
-                continue
-                
-            for index, key in enumerate(maxShareDict):
-                sharesIndex = index+2
-                try:
-                    shareValue = self.getIntegerShareValueFromString(rowCount, sharesIndex, row)
+                self._reportCsvError(e)
+                return None
 
-                except CsvError, e:
-                    print "\n%s \n\tPlease Check the CSV file: %s" %(e, self.csvPath)
-                    continue
-                
-                # companyObject is object of class Company
-                companyObject = maxShareDict[key]
-                if any(companyObject.maxShareList):
-                    newShareInfoTuple = (row[YEAR_COLUMN],row[MONTH_COLUMN], shareValue)
-                    for shareInfoTuple in companyObject.maxShareList:
-                        if shareValue > shareInfoTuple[2]:
-                            companyObject.maxShareList = [newShareInfoTuple]
-                            break
-                            
-                        elif shareValue == shareInfoTuple[2]:
-                            companyObject.maxShareList.append(newShareInfoTuple)
-                            break
-                        
-                        else:
-                            continue
-                else:
-                    companyObject.maxShareList.append(newShareInfoTuple) 
+        try:
+            return parseShareValue(rowList[columnIndex], self.priceDecimals)
+        except ValueError:
+            self.errorSink.addError(INVALID_SHARE_ERROR, rowIndex, columnIndex,
+                                    rowList[columnIndex].strip())
+            return None
 
-        # close the file
-        csvFile.close()
-                
-        return maxShareDict
+
+    def _reportCsvError(self, error):
+        """
+        Print the error of an ignored row or cell. If errorMessages is a list,
+        the error text is collected there instead, eg. in worker processes,
+        and reported later.
+
+        :parameters:
+            error: `CsvError` or `string`
+                error raised while checking the row or cell, or its text.
+
+        :returns:
+            None
+
+        :raises:
+            None
+
+        """
+
+        if self.errorMessages is None:
+            self._printCsvError(error)
+        else:
+            self.errorMessages.append(str(error))
+
+
+    def _printCsvError(self, error):
+        """
+        Print the error of an ignored row or cell along with the CSV file path.
+        """
+
+        print CSV_ERROR_FORMAT %(error, self.csvPath)
 
     
     def displayResults(self):
@@ -221,20 +4364,169 @@ class SharesInfo():
         Prints, for each Company years and months in which the share price was highest.
         """
         
-        print "\n\nHighest share value details for companies:"
+        shareHeader = SHARE_HEADER
+        if self.topCount > 1:
+            print "\n\nTop %s share value details for companies:" %self.topCount
+            shareHeader = TOP_SHARE_HEADER
+        else:
+            print "\n\nHighest share value details for companies:"
         print "===========================================\n"
 
         print "%20s %10s %10s %20s"%(COMPANY_HEADER, YEAR_HEADER, MONTH_HEADER,
-                                  SHARE_HEADER)
+                                  shareHeader)
         for companyName, companyObject in self.maxShareDict.items():
             print "\n"
             for index, shareInfoTuple in enumerate(companyObject.maxShareList):
+                shareValue = shareInfoTuple[2]
+                if self.priceDecimals and shareInfoTuple != INITIAL_SHARE_TUPLE:
+                    shareValue = formatShareValue(shareValue, self.priceDecimals)
                 if not index:
                     print("%20s %10s %10s %20s"%(companyName, shareInfoTuple[0],
-                                                shareInfoTuple[1], shareInfoTuple[2]))
+                                                shareInfoTuple[1], shareValue))
                 else:
                     print(" %30s %10s %20s"%(shareInfoTuple[0],
-                                                shareInfoTuple[1], shareInfoTuple[2]))
+                                                shareInfoTuple[1], shareValue))
+                # the dropped tied months lie between the first and last kept ones.
+                if companyObject.droppedTies and index == self.tieLimit - 1:
+                    print(" %30s %d more tied months"%("...", companyObject.droppedTies))
+
+        if self.aggregators:
+            self.displayStatistics()
+        if self.groupByYear:
+            self.displayYearlyPeaks()
+        if self.indexPeaks:
+            self.displayPeakMonths()
+
+
+    def displayStatistics(self):
+        """
+        Display the other statistics of every company, a column per statistic
+        in the order they were requested.
+        """
+
+        print "\n\nShare statistics for companies:"
+        print "===========================================\n"
+
+        print " ".join(["%20s" %COMPANY_HEADER] +
+                       ["%20s" %aggregatorClass.name.upper() for aggregatorClass in self.aggregators])
+        for companyName, companyObject in self.maxShareDict.items():
+            # the yearly peaks aggregator, if any, comes after the statistics.
+            print " ".join(["%20s" %companyName] +
+                           ["%20s" %aggregator.formatResult(self.priceDecimals)
+                            for aggregator in companyObject.aggregators[:len(self.aggregators)]])
+
+
+    def displayYearlyPeaks(self):
+        """
+        Display the peak share value of every company in every year, with the
+        months tied at the peak.
+        """
+
+        print "\n\nHighest share value details for companies by year:"
+        print "===========================================\n"
+
+        print "%20s %10s %10s %20s"%(COMPANY_HEADER, YEAR_HEADER, MONTH_HEADER, SHARE_HEADER)
+        lastCompanyName = None
+        for companyName, year, monthNames, shareValue in self.getYearlyPeaks().iterPeaks():
+            if self.priceDecimals:
+                shareValue = formatShareValue(shareValue, self.priceDecimals)
+            for monthName in monthNames:
+                if companyName != lastCompanyName:
+                    print "\n"
+                    print "%20s %10s %10s %20s"%(companyName, year, monthName, shareValue)
+                    lastCompanyName = companyName
+                else:
+                    print " %30s %10s %20s"%(year, monthName, shareValue)
+
+
+    def displayPeakMonths(self):
+        """
+        Display the histogram of the number of companies peaking in every month,
+        followed by the PEAK_CLUSTER_REPORT_SIZE largest clusters of peak months.
+        """
+
+        peakMonthIndex = self.getPeakMonthIndex()
+        companyCount = len(peakMonthIndex.companyNames)
+        histogram = peakMonthIndex.getHistogram()
+
+        print "\n\nPeak months of the companies:"
+        print "===========================================\n"
+
+        print "%10s %10s %10s"%(YEAR_HEADER, MONTH_HEADER, COMPANIES_HEADER)
+        maxPeakCount = max([peakCount for year, month, peakCount in histogram] or [0])
+        for year, month, peakCount in histogram:
+            barWidth = max(1, peakCount * PEAK_HISTOGRAM_WIDTH // maxPeakCount)
+            print "%10s %10s %10s %s"%(year, month, peakCount, '#' * barWidth)
+        if peakMonthIndex.droppedPeaks:
+            print "\n%s tied months dropped by the tied months limit are not counted." \
+                %peakMonthIndex.droppedPeaks
+
+        print "\n\nPeak month clusters:"
+        print "===========================================\n"
+
+        print "%20s %20s %10s %15s"%(FIRST_MONTH_HEADER, LAST_MONTH_HEADER, COMPANIES_HEADER,
+                                     PERCENT_HEADER)
+        for firstYear, firstMonth, lastYear, lastMonth, peakCount in \
+                peakMonthIndex.getClusters()[:PEAK_CLUSTER_REPORT_SIZE]:
+            print "%20s %20s %10s %14.1f%%"%("%s %s" %(firstYear, firstMonth),
+                                             "%s %s" %(lastYear, lastMonth), peakCount,
+                                             100.0 * peakCount / companyCount)
+
+
+    def getPeakMonthIndex(self):
+        """
+        Return the inverted index of the months of the max share values of the
+        companies, built as they are finalized when indexPeaks is set.
+
+        :parameters:
+            None
+
+        :returns:
+            peakMonthIndex: `PeakMonthIndex`
+                index of the companies peaking in every month, the companies in
+                maxShareDict order.
+
+        :raises:
+            Exception: `CsvError`
+                if the index was not requested or the CSV file is not processed yet.
+
+        """
+
+        if not self.indexPeaks or self.peakMonthIndex is None:
+            raise CsvError("Peak months are only indexed by processing the CSV file with "
+                           "indexPeaks set.")
+        return self.peakMonthIndex
+
+
+    def getYearlyPeaks(self):
+        """
+        Return the peak share value of every company in every year, found along
+        with the max share values when groupByYear is set.
+
+        :parameters:
+            None
+
+        :returns:
+            yearlyPeakTable: `YearlyPeakTable`
+                companies x years table of the yearly peaks, the companies in
+                maxShareDict order and the years with a valid share value.
+
+        :raises:
+            Exception: `CsvError`
+                if the yearly peaks were not requested or the CSV file is not
+                processed yet.
+
+        """
+
+        if not self.groupByYear or self.maxShareDict is None:
+            raise CsvError("Yearly peaks are only found by processing the CSV file with "
+                           "groupByYear set.")
+
+        # the yearly peaks aggregator is the last one of every company.
+        yearlyPeakTable = YearlyPeakTable(self.maxShareDict.keys())
+        for companyIndex, companyObject in enumerate(self.maxShareDict.values()):
+            yearlyPeakTable.setCompanyPeaks(companyIndex, companyObject.aggregators[-1])
+        return yearlyPeakTable
 
 
 
@@ -266,13 +4558,11 @@ class SharesInfo():
         """
 
         try:
-            shareValue = int(rowList[columnIndex].strip())
+            shareValue = parseShareValue(rowList[columnIndex].strip(), self.priceDecimals)
 
         except ValueError:
-            errorMessage = "\nInvalid string value at row:%s,cloumn:%s -> '%s'"%(rowIndex,
-                                                 columnIndex, rowList[columnIndex].strip())
-            errorMessage+= "\nCould not convert the string into a number."
-            raise CsvError(errorMessage)
+            raise CsvError(formatCsvError(INVALID_SHARE_ERROR, rowIndex, columnIndex,
+                                          rowList[columnIndex].strip()))
         
         except Exception, e:
             errorMessage = "Error while processing row:%s,cloumn:%s -> '%s'.\n\t%s"%(rowIndex,
@@ -305,16 +4595,15 @@ class SharesInfo():
                 if string year value could not be converted to an integer.
                 OR
                 if the year is older that MIN_YEAR ie. 1990 
+                OR
+                if the year is beyond MAX_YEAR, the last year of the time keys.
             
         """
 
         try:
             yearValue = int(year.strip())
         except ValueError:
-            errorMessage = "\nInvalid string value at row:%s,cloumn:%s -> '%s'"%(rowIndex,
-                                                 YEAR_COLUMN, year)
-            errorMessage+= "\nCould not convert the string into a number."
-            raise CsvError(errorMessage)
+            raise CsvError(formatCsvError(INVALID_YEAR_ERROR, rowIndex, YEAR_COLUMN, year))
         
         except Exception, e:
             errorMessage = "Error while processing row:%s,cloumn:%s -> '%s'.\n\t%s"%(rowIndex,
@@ -322,14 +4611,42 @@ class SharesInfo():
             raise CsvError(errorMessage)
 
         if yearValue < MIN_YEAR:
-            errorMessage = "\nInvalid string value at row:%s,cloumn:%s -> '%s'"%(rowIndex,
-                                                 YEAR_COLUMN, year)
-            errorMessage+= "\nThe tool only considers data from Year:%s"%MIN_YEAR
-            raise CsvError(errorMessage)
+            raise CsvError(formatCsvError(OLD_YEAR_ERROR, rowIndex, YEAR_COLUMN, year))
+
+        if yearValue > MAX_YEAR:
+            raise CsvError(formatCsvError(INVALID_YEAR_ERROR, rowIndex, YEAR_COLUMN, year))
 
         return True    
 
 
+    def verifyMonthValue(self, rowIndex, month):
+        """
+        This function takes in the rowIndex and a string month and checks that
+        it is a month name or number.
+
+        :parameters:
+            rowIndex: `int`
+                index of the row for logging purpose.
+
+            month: `string`
+                string value representing a month. eg. 'Jan', 'January' or '1'.
+
+        :returns:
+            `True`: `bool`
+                if the string value is a known month.
+
+        :raises:
+            Exception: `CsvError`
+                if the string month value is not a month name or number.
+
+        """
+
+        if _getMonthIndex(month) is None:
+            raise CsvError(formatCsvError(INVALID_MONTH_ERROR, rowIndex, MONTH_COLUMN, month))
+
+        return True
+
+
     def checkMissingSharesData(self, rowIndex, rowList, headerList):
         """
         This function takes in the rowIndex, columnIndex and shares and header list
@@ -360,9 +4677,7 @@ class SharesInfo():
         """
 
         if len(rowList) < len(headerList):
-            errorMessage= "Error while processing row:%s. Insufficient share values data." \
-                                                              "\n\tIgnoring this row."%rowIndex
-            raise CsvError(errorMessage)
+            raise CsvError(formatCsvError(MISSING_SHARES_ERROR, rowIndex))
         return True
 
 
@@ -396,9 +4711,7 @@ class SharesInfo():
         """
 
         if len(rowList) > len(headerList):
-            errorMessage= "Error while processing row:%s. Unexpected extra share value data."\
-                                                              "\n\tIgnoring this row."%rowIndex
-            raise CsvError(errorMessage)
+            raise CsvError(formatCsvError(EXTRA_SHARES_ERROR, rowIndex))
         return True
 
 
@@ -486,7 +4799,250 @@ class SharesInfo():
 
         return True
 
+
+    def validateLongHeaderRow(self, headerList):
+        """
+        This function validates the header row of the long layout.
+        The header has to be Year,Month,Company,Price in Lower, Upper or Mixed
+        case letters.
+
+        :parameters:
+            headerList: `list`
+                list of strings representing a row of CSV header data.
+
+        :returns:
+            `True`: `bool`
+                if the header row is valid.
+
+        :raises:
+            Exception: `CsvError`
+                if the header row is not Year,Month,Company,Price.
+
+        """
+
+        if tuple(header.strip().upper() for header in headerList) != LONG_HEADER:
+            raise CsvError("Header of the long layout to be 'Year,Month,Company,Price' in Lower, "
+                           "Upper or Mixed case letters. CSV file has '%s'."
+                           %",".join(header.strip() for header in headerList))
+        return True
+
     
+    def checkEngine(self, engine=None):
+        """
+        This function checks if the processing engine is supported and usable.
+
+        :parameters:
+            engine: `string`
+                name of the engine. One of ENGINES.
+
+        :returns:
+            `True`: `bool`
+                if the engine can be used.
+
+        :raises:
+            Exception: `CsvError`
+                if the engine is unknown.
+                OR
+                if the engine needs numpy and numpy is not installed.
+
+        """
+
+        if engine not in ENGINES:
+            raise CsvError("Unknown engine: %s. Expected one of %s." %(engine,
+                                                                       ", ".join(ENGINES)))
+        if engine == NUMPY_ENGINE and numpy is None:
+            raise CsvError("Engine: %s requires numpy which is not installed." %engine)
+        return True
+
+
+    def checkOptionConflicts(self, engine=PYTHON_ENGINE, cache=None, statePath=None,
+                             layout=WIDE_LAYOUT):
+        """
+        This function checks that the options selecting how the CSV file is
+        processed can be used together. The long layout is always processed
+        with the python engine, without cache or incremental state, the
+        incremental state with the python engine only and without cache, and
+        the cache with the python or the numpy engine.
+
+        :parameters:
+            engine: `string`
+                name of the engine. One of ENGINES.
+
+            cache: `shares_cache.ParsedDataCache`
+                on-disk cache of the parsed share matrix, or None.
+
+            statePath: `string`
+                file of the incremental state, or None.
+
+            layout: `string`
+                name of the layout. One of LAYOUTS.
+
+        :returns:
+            `True`: `bool`
+                if the options can be used together.
+
+        :raises:
+            Exception: `CsvError`
+                if the long layout is used with another engine than the python
+                engine, a cache or an incremental state
+                OR
+                if the incremental state is used with another engine than the
+                python engine or with a cache
+                OR
+                if the cache is used with a parallel engine.
+
+        """
+
+        if layout == LONG_LAYOUT:
+            if engine != PYTHON_ENGINE:
+                raise CsvError("Engine: %s cannot be used with the long layout, it is always "
+                               "processed with the %s engine." %(engine, PYTHON_ENGINE))
+            if cache is not None or statePath is not None:
+                raise CsvError("The cache and incremental processing cannot be used with "
+                               "the long layout.")
+        if statePath is not None:
+            if engine != PYTHON_ENGINE:
+                raise CsvError("Engine: %s cannot be used with incremental processing, the "
+                               "appended rows are processed with the %s engine."
+                               %(engine, PYTHON_ENGINE))
+            if cache is not None:
+                raise CsvError("The cache cannot be used with incremental processing.")
+        if cache is not None and engine not in (PYTHON_ENGINE, NUMPY_ENGINE):
+            raise CsvError("Engine: %s cannot be used with the cache, the cached share "
+                           "matrix is processed with the %s or %s engine."
+                           %(engine, PYTHON_ENGINE, NUMPY_ENGINE))
+        return True
+
+
+    def checkReader(self, reader=None):
+        """
+        This function checks if the reader of the share rows is supported.
+
+        :parameters:
+            reader: `string`
+                name of the reader. One of READERS.
+
+        :returns:
+            `True`: `bool`
+                if the reader can be used.
+
+        :raises:
+            Exception: `CsvError`
+                if the reader is unknown.
+
+        """
+
+        if reader not in READERS:
+            raise CsvError("Unknown reader: %s. Expected one of %s." %(reader,
+                                                                       ", ".join(READERS)))
+        return True
+
+
+    def checkLayout(self, layout=None):
+        """
+        This function checks if the layout of the CSV file is supported.
+
+        :parameters:
+            layout: `string`
+                name of the layout. One of LAYOUTS.
+
+        :returns:
+            `True`: `bool`
+                if the layout can be used.
+
+        :raises:
+            Exception: `CsvError`
+                if the layout is unknown.
+
+        """
+
+        if layout not in LAYOUTS:
+            raise CsvError("Unknown layout: %s. Expected one of %s." %(layout,
+                                                                       ", ".join(LAYOUTS)))
+        return True
+
+
+    def checkTopCount(self, topCount=None):
+        """
+        This function checks if the number of top months per company is valid.
+
+        :parameters:
+            topCount: `int`
+                number of highest months to keep per company.
+
+        :returns:
+            `True`: `bool`
+                if topCount is a positive integer.
+
+        :raises:
+            Exception: `CsvError`
+                if topCount is not an integer or is less than 1.
+
+        """
+
+        if not isinstance(topCount, (int, long)) or isinstance(topCount, bool) or topCount < 1:
+            raise CsvError("Number of top months: %s is not a positive integer." %topCount)
+        return True
+
+
+    def checkTieLimit(self, tieLimit=None, topCount=1):
+        """
+        This function checks if the number of first and last tied months kept
+        per company is valid.
+
+        :parameters:
+            tieLimit: `int`
+                number of first and of last tied months to keep, None for all.
+
+            topCount: `int`
+                number of highest months kept per company.
+
+        :returns:
+            `True`: `bool`
+                if tieLimit is None or a positive integer with topCount = 1.
+
+        :raises:
+            Exception: `CsvError`
+                if tieLimit is not an integer or is less than 1.
+                OR
+                if tieLimit is set with topCount > 1.
+
+        """
+
+        if tieLimit is None:
+            return True
+        if not isinstance(tieLimit, (int, long)) or isinstance(tieLimit, bool) or tieLimit < 1:
+            raise CsvError("Number of tied months: %s is not a positive integer." %tieLimit)
+        if topCount != 1:
+            raise CsvError("Number of tied months is only supported with a single top month.")
+        return True
+
+
+    def checkPriceDecimals(self, priceDecimals=None):
+        """
+        This function checks if the number of decimal places of the share prices is valid.
+
+        :parameters:
+            priceDecimals: `int`
+                number of decimal places of the share prices.
+
+        :returns:
+            `True`: `bool`
+                if priceDecimals is an integer from 0 to MAX_PRICE_DECIMALS.
+
+        :raises:
+            Exception: `CsvError`
+                if priceDecimals is not an integer or is out of range.
+
+        """
+
+        if (not isinstance(priceDecimals, (int, long)) or isinstance(priceDecimals, bool)
+            or priceDecimals < 0 or priceDecimals > MAX_PRICE_DECIMALS):
+            raise CsvError("Number of decimal places: %s is not an integer from 0 to %s."
+                           %(priceDecimals, MAX_PRICE_DECIMALS))
+        return True
+
+
     def checkCsvPath(self, csvPath=None):
         """
         This function checks if the CSV file is a valid file.
@@ -511,6 +5067,8 @@ class SharesInfo():
                 if the file is a directory.
                 OR
                 if the the file is not readable.
+                OR
+                if the file is xz compressed and lzma is not installed.
             
         """
         
@@ -530,8 +5088,340 @@ class SharesInfo():
                 raise CsvError("path: %s is a directory." %csvPath)
             if not os.access(csvPath, os.R_OK):
                 raise CsvError("file: %s is not readable." %csvPath)
+            if getCompression(csvPath) == XZ_COMPRESSION and lzma is None:
+                raise CsvError("file: %s is xz compressed and lzma is not installed." %csvPath)
         except Exception, e:
             raise CsvError(e.message)
 
         return True
-   
+
+
+def _iterChunkLines(csvFile, start, end):
+    """
+    Yield the lines of csvFile from the start offset up to the end offset.
+    """
+
+    csvFile.seek(start)
+    position = start
+    while position < end:
+        line = csvFile.readline()
+        if not line:
+            break
+        position+= len(line)
+        yield line
+
+
+def _getMaskMonths(monthMask):
+    """
+    Return the short names of the months of a month mask, in chronological order.
+    """
+
+    return [monthName for monthIndex, monthName in enumerate(MONTH_NAMES)
+            if monthMask & (1 << monthIndex)]
+
+
+def _getMonthIndex(month):
+    """
+    Return the month index, 0 for January, of a month name or number as in
+    the CSV file, None if the month is unknown.
+    """
+
+    monthIndex = MONTH_INDEX_DICT.get(month)
+    if monthIndex is None:
+        monthIndex = MONTH_INDEX_DICT.get(month.strip().lower())
+    if monthIndex is None:
+        monthIndex = _parseMonthLabel(month)
+    return monthIndex
+
+
+def _parseMonthLabel(month):
+    """
+    Return the month index of a less usual spelling of a month, in any case and
+    with a trailing dot: a month number with leading zeros, eg. '007', or the
+    start of a full month name of at least MIN_MONTH_PREFIX letters, eg. 'Sept'.
+    None if the label does not name a month.
+    """
+
+    label = month.strip().lower().rstrip('.').strip()
+    if label.isdigit():
+        monthNumber = int(label)
+        if 1 <= monthNumber <= len(MONTH_NAMES):
+            return monthNumber - 1
+        return None
+
+    if len(label) >= MIN_MONTH_PREFIX and label.isalpha():
+        for monthIndex, monthName in enumerate(FULL_MONTH_NAMES):
+            if monthName.lower().startswith(label):
+                return monthIndex
+    return None
+
+
+def _alignStoreOffset(offset):
+    """
+    Return the first offset from offset that is a multiple of STORE_ALIGNMENT.
+    """
+
+    return (offset + STORE_ALIGNMENT - 1) // STORE_ALIGNMENT * STORE_ALIGNMENT
+
+
+def _packValidFlags(validFlags):
+    """
+    Return the validity bitmap of the flags of a company column, the first row
+    in the highest bit of the first byte. Only the invalid cells, usually few,
+    are visited.
+    """
+
+    rowCount = len(validFlags)
+    bitmap = bytearray('\xff' * ((rowCount + 7) // 8))
+    if rowCount % 8:
+        bitmap[-1] = (0xff << (8 - rowCount % 8)) & 0xff
+    for rowIndex in itertools.compress(xrange(rowCount), [not valid for valid in validFlags]):
+        bitmap[rowIndex >> 3]&= ~(0x80 >> (rowIndex & 7)) & 0xff
+    return str(bitmap)
+
+
+def _iterCountedLines(csvFile, stats):
+    """
+    Yield the lines of csvFile and add their size to stats.bytesRead.
+    """
+
+    for line in csvFile:
+        stats.bytesRead+= len(line)
+        yield line
+
+
+def _iterGzipBlocks(rawFile):
+    """
+    Yield the decompressed blocks of a gzip file. Concatenated members are read
+    one after the other, and a truncated or corrupted file raises an error.
+    """
+
+    gzipFile = gzip.GzipFile(fileobj=rawFile, mode='rb')
+    while True:
+        block = gzipFile.read(DECOMPRESS_BLOCK_SIZE)
+        if not block:
+            break
+        yield block
+
+
+def _iterStreamBlocks(rawFile, decompressorClass):
+    """
+    Yield the decompressed blocks of a bz2 or xz file with a new decompressor
+    for every concatenated stream. Raise CsvError if the last stream has no
+    end, ie. the file is truncated.
+    """
+
+    decompressor = decompressorClass()
+    dataRead = False
+    while True:
+        data = rawFile.read(DECOMPRESS_BLOCK_SIZE)
+        if not data:
+            if dataRead and not _isStreamEnded(decompressor):
+                raise CsvError("The last compressed stream ends before its end of stream "
+                               "marker.")
+            break
+        dataRead = True
+        while data:
+            try:
+                block = decompressor.decompress(data)
+            except EOFError:
+                # the stream ended with the previous data, a new one starts.
+                decompressor = decompressorClass()
+                continue
+            if block:
+                yield block
+            data = decompressor.unused_data
+            if data:
+                decompressor = decompressorClass()
+
+
+def _isStreamEnded(decompressor):
+    """
+    Return True if a bz2 or xz decompressor reached the end of its stream. The
+    python 2 bz2 decompressor has no eof attribute, but raises EOFError once
+    its stream ended.
+    """
+
+    if hasattr(decompressor, 'eof'):
+        return decompressor.eof
+    try:
+        decompressor.decompress('')
+    except EOFError:
+        return True
+    return False
+
+
+def _iterMappedRows(csvFile, start, end=None):
+    """
+    Memory map csvFile and yield a MappedRow() for every line from the start offset
+    up to the end offset. Line and field boundaries are found directly in the
+    mapped buffer. A trailing carriage return is not part of the last field.
+    The map is closed when the last row using it is released rather than at the
+    end of the file, since the rows of a batch are used after the end is reached.
+
+    :parameters:
+        csvFile: `file`
+            file object of the CSV file opened in binary mode.
+
+        start: `int`
+            offset of the first line.
+
+        end: `int`
+            offset where reading stops. Defaults to the end of file.
+
+    """
+
+    fileSize = os.fstat(csvFile.fileno()).st_size
+    if end is None:
+        end = fileSize
+    if start >= end:
+        return
+
+    shareMap = mmap.mmap(csvFile.fileno(), 0, access=mmap.ACCESS_READ)
+    find = shareMap.find
+    position = start
+    while position < end:
+        lineEnd = find('\n', position, end)
+        if lineEnd < 0:
+            lineEnd = end
+        nextPosition = lineEnd + 1
+        if lineEnd > position and shareMap[lineEnd-1] == '\r':
+            lineEnd-= 1
+
+        # like csv.reader, an empty line is a row without fields.
+        fieldOffsets = []
+        if lineEnd > position:
+            fieldStart = position
+            while True:
+                fieldOffsets.append(fieldStart)
+                fieldEnd = find(',', fieldStart, lineEnd)
+                if fieldEnd < 0:
+                    break
+                fieldStart = fieldEnd + 1
+            fieldOffsets.append(lineEnd + 1)
+        else:
+            fieldOffsets.append(lineEnd + 1)
+
+        yield MappedRow(shareMap, fieldOffsets)
+        position = nextPosition
+
+
+def _processCsvChunk(chunkInfo):
+    """
+    Worker function for the chunked engine. Processes the share rows in a byte
+    range with the python engine.
+
+    :parameters:
+        chunkInfo: `tuple`
+            (csvPath, reader, topCount, tieLimit, priceDecimals, aggregators, trusted,
+            headerList, start, end, errorSink, stats) where errorSink is an empty
+            CsvErrorSink and stats an empty ProcessingStats or None.
+
+    :returns:
+        (topSharesList, aggregatorLists, rowCount, errorSink, stats): `tuple`
+            (timeKeys, shareValues, droppedTies) of Company.getTopShares and the
+            aggregators of the other statistics for every company in header order,
+            the number of share rows of the byte range, errorSink with the errors
+            of the ignored rows and cells, their rows numbered from 1 at the
+            start of the byte range, and the stats of the byte range.
+
+    """
+
+    (csvPath, reader, topCount, tieLimit, priceDecimals, aggregators, trusted, headerList,
+     start, end, errorSink, stats) = chunkInfo
+    sharesInfo = SharesInfo(csvPath, reader=reader, topCount=topCount, errorSink=errorSink,
+                            stats=stats, priceDecimals=priceDecimals, aggregators=aggregators,
+                            trusted=trusted, tieLimit=tieLimit)
+
+    maxShareDict = collections.OrderedDict()
+    for companyIndex in range(FIRST_COMPANY_COLUMN, len(headerList)):
+        maxShareDict[companyIndex] = sharesInfo._newCompany()
+
+    csvFile = open(csvPath, 'rb')
+    try:
+        csvReader = sharesInfo._getRowReader(csvFile, start, end)
+        rowCount = sharesInfo._processCsvRows(csvReader, headerList, maxShareDict)
+    finally:
+        csvFile.close()
+
+    topSharesList = [companyObject.getTopShares() + (companyObject.droppedTies,)
+                     for companyObject in maxShareDict.values()]
+    aggregatorLists = [companyObject.aggregators for companyObject in maxShareDict.values()]
+    return topSharesList, aggregatorLists, rowCount, errorSink, stats
+
+
+def _processCsvShard(shardInfo):
+    """
+    Worker function for the sharded engine. Processes the company columns
+    from firstColumn up to endColumn over all the share rows.
+    Row errors are only reported by the first shard.
+
+    :parameters:
+        shardInfo: `tuple`
+            (csvPath, reader, topCount, tieLimit, priceDecimals, aggregators, trusted,
+            headerList, firstColumn, endColumn, shardIndex, errorSink, stats) where errorSink is an empty CsvErrorSink or None and
+            stats an empty ProcessingStats or None.
+
+    :returns:
+        (topSharesList, aggregatorLists, errorList, errorSink, stats): `tuple`
+            (timeKeys, shareValues, droppedTies) of Company.getTopShares and the
+            aggregators of the other statistics for every company of the shard in header order, a list
+            of (rowCount, shardIndex, errorMessages) for the rows with errors,
+            errorSink and stats. The errors are recorded in errorSink instead if
+            it is set. The rows are only counted by the first shard.
+
+    """
+
+    (csvPath, reader, topCount, tieLimit, priceDecimals, aggregators, trusted, headerList,
+     firstColumn, endColumn, shardIndex, errorSink, stats) = shardInfo
+    sharesInfo = SharesInfo(csvPath, reader=reader, topCount=topCount, errorSink=errorSink,
+                            stats=stats, priceDecimals=priceDecimals, aggregators=aggregators,
+                            trusted=trusted, tieLimit=tieLimit)
+    sharesInfo.errorMessages = []
+
+    # the other shards check the rows with a sink that only counts their errors.
+    rowChecker = sharesInfo
+    if shardIndex:
+        rowChecker = SharesInfo(csvPath, errorSink=CsvErrorSink(0), trusted=trusted)
+    companyList = [sharesInfo._newCompany() for sharesIndex in range(firstColumn, endColumn)]
+    errorList = []
+
+    csvFile = openCsvFile(csvPath)
+    try:
+        csvFile.readline()
+        csvReader = sharesInfo._getRowReader(csvFile, csvFile.tell())
+
+        startTime = time.time()
+        acceptedCount = 0
+        invalidCount = 0
+        # the messages of the rows ignored before a processed row go with its own.
+        rowValidator = rowChecker._getRowValidator(headerList)
+        for rowCount, row, timeKey in rowValidator.iterRows(csvReader):
+            acceptedCount+= 1
+            for sharesIndex, companyObject in enumerate(companyList, firstColumn):
+                shareValue = sharesInfo._getShareValue(rowCount, sharesIndex, row)
+                if shareValue is not None:
+                    companyObject.update(timeKey, shareValue)
+                else:
+                    invalidCount+= 1
+
+            if sharesInfo.errorMessages:
+                errorList.append((rowCount, shardIndex, sharesInfo.errorMessages))
+                sharesInfo.errorMessages = []
+    finally:
+        csvFile.close()
+
+    if sharesInfo.errorMessages:
+        errorList.append((rowValidator.rowCount, shardIndex, sharesInfo.errorMessages))
+
+    if stats is not None:
+        sharesInfo._addPhaseTime(ROWS_PHASE, startTime)
+        if not shardIndex:
+            stats.rowsAccepted+= acceptedCount
+        stats.cellsParsed+= acceptedCount * len(companyList)
+        stats.invalidCells+= invalidCount
+
+    topSharesList = [companyObject.getTopShares() + (companyObject.droppedTies,)
+                     for companyObject in companyList]
+    aggregatorLists = [companyObject.aggregators for companyObject in companyList]
+    return topSharesList, aggregatorLists, errorList, errorSink, stats
@@ -6,14 +6,115 @@ import csv
 import copy
 import unittest
 import tempfile
+import struct
+import StringIO
+import gzip
+import bz2
+import itertools
+
+#import company_shares module to change its constants in tests
+import company_shares
 
 #import classes from company_shares module
 from company_shares import Company
 from company_shares import SharesInfo
 from company_shares import CsvError
 from company_shares import MIN_YEAR
+from company_shares import MAX_YEAR
 from company_shares import YEAR_COLUMN
 from company_shares import MONTH_COLUMN
+from company_shares import NUMPY_ENGINE
+from company_shares import CHUNKED_ENGINE
+from company_shares import SHARDED_ENGINE
+from company_shares import ENGINES
+from company_shares import MMAP_READER
+from company_shares import MappedRow
+from company_shares import PYTHON_ENGINE
+from company_shares import MONTH_NAMES
+from company_shares import CSV_ERROR_FORMAT
+from company_shares import CsvErrorSink
+from company_shares import INVALID_SHARE_ERROR
+from company_shares import ProcessingStats
+from company_shares import PHASES
+from company_shares import parseShareValue
+from company_shares import formatShareValue
+from company_shares import getCompression
+from company_shares import GZIP_COMPRESSION
+from company_shares import BZIP2_COMPRESSION
+from company_shares import XZ_COMPRESSION
+from company_shares import lzma
+from company_shares import compileSharesStore
+from company_shares import SharesStore
+from company_shares import STORE_EXTENSION
+from company_shares import LONG_LAYOUT
+from company_shares import WIDE_LAYOUT
+from company_shares import DUPLICATE_MONTH_ERROR
+from company_shares import MISSING_COMPANY_ERROR
+from company_shares import INVALID_MONTH_ERROR
+from company_shares import NO_TIME_KEY
+from company_shares import getTimeKey
+from company_shares import formatTimeKey
+from company_shares import RESULT_ITEM
+from company_shares import INITIAL_SHARE_TUPLE
+from company_shares import ERROR_ITEM
+from company_shares import YearlyPeakAggregator
+from company_shares import RowValidator
+from company_shares import PeakMonthIndex
+from company_shares import MISSING_SHARES_ERROR
+from company_shares import EXTRA_SHARES_ERROR
+from company_shares import INVALID_YEAR_ERROR
+from company_shares import OLD_YEAR_ERROR
+from company_shares import numpy
+
+# test CSV file shipped with the tool
+TEST_CSV_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'test_data.csv')
+
+# CSV data with ties, invalid cells and a company without any valid share value
+TIES_CSV_LINES = ['Year,Month,Company A,Company B,Company C,Company D',
+                  '1990,Jan,10,-999999,x,5',
+                  '1990,Feb,30,-999999,y,5',
+                  '1991,Mar,30,-1000000,z,7',
+                  '1991,Apr,abc,-999999,,7',
+                  '1992,May,30,-999999,w,6']
+
+# CSV data with decimal share prices, ties and invalid cells
+DECIMAL_CSV_LINES = ['Year,Month,Company A,Company B,Company C',
+                     '1990,Jan,123.45,10,-1.5',
+                     '1990,Feb,123.4,10.00,-0.50',
+                     '1991,Mar,123.45,9.999,-.5',
+                     '1991,Apr,12,x,-1']
+
+
+def writeTempCsv(lines):
+    """
+    write the lines to a temporary CSV file and return its path.
+    """
+    fileHandle, filePath = tempfile.mkstemp(prefix='share_test', suffix='.csv')
+    os.write(fileHandle, '\n'.join(lines) + '\n')
+    os.close(fileHandle)
+    return filePath
+
+
+def captureOutput(function, *args):
+    """
+    call the function and return its result along with everything it printed.
+    """
+    stdout = sys.stdout
+    sys.stdout = StringIO.StringIO()
+    try:
+        result = function(*args)
+        return result, sys.stdout.getvalue()
+    finally:
+        sys.stdout = stdout
+
+
+def getMaxShareLists(maxShareDict):
+    """
+    return a list of (company name, maxShareList) from maxShareDict.
+    """
+    return [(companyName, companyObject.maxShareList)
+            for companyName, companyObject in maxShareDict.items()]
+
 
 class TestCompanyShares(unittest.TestCase):
     """
@@ -338,5 +439,1188 @@ class TestCompanyShares(unittest.TestCase):
                     columnIndex, self.correctSharesList), shareValue)
         
 
+class TestSharesInfoEngines(unittest.TestCase):
+    """
+    Class for testcases for the processing engines of SharesInfo
+    """
+
+    def setUp(self):
+        self.tiesCsvPath = writeTempCsv(TIES_CSV_LINES)
+
+    def tearDown(self):
+        os.remove(self.tiesCsvPath)
+
+    # test SharesInfo.checkEngine with an unknown engine.
+    def testCheckEngineWithUnknownEngine(self):
+
+        self.assertRaises(CsvError, SharesInfo().checkEngine, 'unknown')
+
+
+    # test that SharesInfo rejects the options that cannot be used together.
+    def testCheckOptionConflicts(self):
+
+        cache = object()
+        for options in ({'engine': SHARDED_ENGINE, 'layout': LONG_LAYOUT},
+                        {'cache': cache, 'layout': LONG_LAYOUT},
+                        {'statePath': 'state', 'layout': LONG_LAYOUT},
+                        {'engine': NUMPY_ENGINE, 'statePath': 'state'},
+                        {'cache': cache, 'statePath': 'state'},
+                        {'engine': CHUNKED_ENGINE, 'cache': cache}):
+            self.assertRaises(CsvError, SharesInfo, TEST_CSV_PATH, **options)
+        for options in ({'layout': LONG_LAYOUT}, {'engine': NUMPY_ENGINE, 'cache': cache},
+                        {'statePath': 'state'}, {'engine': SHARDED_ENGINE}):
+            self.assertTrue(SharesInfo(TEST_CSV_PATH, **options).checkOptionConflicts(**options))
+
+
+    # test SharesInfo._processCsvFile with the python engine on data with ties
+    # and invalid cells.
+    def testPythonEngineWithTies(self):
+
+        maxShareDict = SharesInfo(self.tiesCsvPath)._processCsvFile()
+        self.assertEqual(getMaxShareLists(maxShareDict),
+                         [('Company A', [('1990', 'Feb', 30), ('1991', 'Mar', 30),
+                                         ('1992', 'May', 30)]),
+                          ('Company B', [('NA', 'NA', -999999), ('1990', 'Jan', -999999),
+                                         ('1990', 'Feb', -999999), ('1991', 'Apr', -999999),
+                                         ('1992', 'May', -999999)]),
+                          ('Company C', [('NA', 'NA', -999999)]),
+                          ('Company D', [('1991', 'Mar', 7), ('1991', 'Apr', 7)])])
+
+
+    # test that the numpy engine gives the same results as the python engine.
+    @unittest.skipIf(numpy is None, 'numpy is not installed')
+    def testNumpyEngineMatchesPythonEngine(self):
+
+        for csvPath in (self.tiesCsvPath, TEST_CSV_PATH):
+            expected = SharesInfo(csvPath, PYTHON_ENGINE)._processCsvFile()
+            result = SharesInfo(csvPath, NUMPY_ENGINE)._processCsvFile()
+            self.assertEqual(getMaxShareLists(result), getMaxShareLists(expected))
+
+
+    # test that the chunked engine gives the same results and the same error
+    # messages, row numbers included, as the python engine.
+    def testChunkedEngineMatchesPythonEngine(self):
+
+        minChunkSize = company_shares.MIN_CHUNK_SIZE
+        company_shares.MIN_CHUNK_SIZE = 1
+        try:
+            for csvPath in (self.tiesCsvPath, TEST_CSV_PATH):
+                expected, expectedOutput = captureOutput(
+                    SharesInfo(csvPath, PYTHON_ENGINE)._processCsvFile)
+                result, output = captureOutput(
+                    SharesInfo(csvPath, CHUNKED_ENGINE, workers=3)._processCsvFile)
+                self.assertEqual(getMaxShareLists(result), getMaxShareLists(expected))
+                self.assertEqual(output, expectedOutput)
+        finally:
+            company_shares.MIN_CHUNK_SIZE = minChunkSize
+
+
+    # test that the sharded engine gives the same results and the same error
+    # messages, in the same order, as the python engine.
+    def testShardedEngineMatchesPythonEngine(self):
+
+        for csvPath in (self.tiesCsvPath, TEST_CSV_PATH):
+            expected, expectedOutput = captureOutput(
+                SharesInfo(csvPath, PYTHON_ENGINE)._processCsvFile)
+            result, output = captureOutput(
+                SharesInfo(csvPath, SHARDED_ENGINE, workers=3)._processCsvFile)
+            self.assertEqual(getMaxShareLists(result), getMaxShareLists(expected))
+            self.assertEqual(output, expectedOutput)
+
+
+    # test that the mmap reader gives the same results and error messages as
+    # the csv reader with every engine, also with windows line endings.
+    def testMmapReaderMatchesCsvReader(self):
+
+        crlfCsvPath = writeTempCsv(['\r\n'.join(TIES_CSV_LINES)])
+        engineList = [engine for engine in ENGINES if numpy or engine != NUMPY_ENGINE]
+        try:
+            for csvPath in (self.tiesCsvPath, crlfCsvPath, TEST_CSV_PATH):
+                expected, expectedOutput = captureOutput(
+                    SharesInfo(csvPath, PYTHON_ENGINE)._processCsvFile)
+                for engine in engineList:
+                    sharesInfo = SharesInfo(csvPath, engine, workers=2, reader=MMAP_READER)
+                    result, output = captureOutput(sharesInfo._processCsvFile)
+                    self.assertEqual(getMaxShareLists(result), getMaxShareLists(expected))
+                    self.assertEqual(output, expectedOutput)
+        finally:
+            os.remove(crlfCsvPath)
+
+
+    # test MappedRow behaves like the list of fields of the row.
+    def testMappedRowFields(self):
+
+        line = '1990,Jan,10,,20'
+        fieldOffsets = [0, 5, 9, 12, 13, len(line) + 1]
+        mappedRow = MappedRow(line, fieldOffsets)
+        self.assertEqual(len(mappedRow), 5)
+        self.assertEqual(mappedRow[:], line.split(','))
+        self.assertEqual(mappedRow[-1], '20')
+        self.assertRaises(IndexError, mappedRow.__getitem__, 5)
+
+
+    # test Company.mergeCompany keeps ties in order and ignores lower values.
+    def testCompanyMergeCompany(self):
+
+        company = Company()
+        for year, month, shareValue in [('1990', 'Jan', 5), ('1990', 'Feb', 9)]:
+            company.updateMaxShare(year, month, shareValue)
+        otherCompany = Company()
+        otherCompany.updateMaxShare('1991', 'Jan', 9)
+        lowerCompany = Company()
+        lowerCompany.updateMaxShare('1992', 'Jan', 7)
+
+        company.mergeCompany(otherCompany)
+        company.mergeCompany(lowerCompany)
+        company.mergeCompany(Company())
+        company.finalizeTopShares()
+        self.assertEqual(company.maxShareList, [('1990', 'Feb', 9), ('1991', 'Jan', 9)])
+
+
+class TestSharesInfoTopShares(unittest.TestCase):
+    """
+    Class for testcases for the top months mode of SharesInfo
+    """
+
+    def setUp(self):
+        self.tiesCsvPath = writeTempCsv(TIES_CSV_LINES)
+
+    def tearDown(self):
+        os.remove(self.tiesCsvPath)
+
+    # test SharesInfo.checkTopCount with invalid values.
+    def testCheckTopCountWithInvalidValues(self):
+
+        for topCount in (0, -1, 1.5, '2', None):
+            self.assertRaises(CsvError, SharesInfo().checkTopCount, topCount)
+
+
+    # test Company with topCount = 2 ranks the months and keeps the months tied
+    # with the lowest of the top months.
+    def testCompanyTopShares(self):
+
+        company = Company(2)
+        for year, month, shareValue in [('1990', 'Jan', 5), ('1990', 'Feb', 9),
+                                        ('1990', 'Mar', 3), ('1990', 'Apr', 5),
+                                        ('1990', 'May', 1)]:
+            company.updateMaxShare(year, month, shareValue)
+        company.finalizeTopShares()
+        self.assertEqual(company.maxShareList, [('1990', 'Feb', 9), ('1990', 'Jan', 5),
+                                                ('1990', 'Apr', 5)])
+
+
+    # test that every engine gives the same ranked lists for topCount = 3.
+    def testTopSharesWithAllEngines(self):
+
+        expected = captureOutput(SharesInfo(self.tiesCsvPath, topCount=3)._processCsvFile)[0]
+        self.assertEqual(expected['Company A'].maxShareList,
+                         [('1990', 'Feb', 30), ('1991', 'Mar', 30), ('1992', 'May', 30)])
+        self.assertEqual(expected['Company D'].maxShareList,
+                         [('1991', 'Mar', 7), ('1991', 'Apr', 7), ('1992', 'May', 6)])
+
+        engineList = [engine for engine in ENGINES if numpy or engine != NUMPY_ENGINE]
+        for engine in engineList:
+            sharesInfo = SharesInfo(self.tiesCsvPath, engine, workers=2, topCount=3)
+            result = captureOutput(sharesInfo._processCsvFile)[0]
+            self.assertEqual(getMaxShareLists(result), getMaxShareLists(expected))
+
+
+class TestSharesInfoIncremental(unittest.TestCase):
+    """
+    Class for testcases for the incremental processing of SharesInfo
+    """
+
+    def setUp(self):
+        self.csvPath = writeTempCsv(TIES_CSV_LINES)
+        self.statePath = tempfile.mktemp(prefix='share_test', suffix='.state')
+
+    def tearDown(self):
+        os.remove(self.csvPath)
+        if os.path.exists(self.statePath):
+            os.remove(self.statePath)
+
+    def appendToCsv(self, data):
+        csvFile = open(self.csvPath, 'ab')
+        csvFile.write(data)
+        csvFile.close()
+
+    def processIncremental(self):
+        sharesInfo = SharesInfo(self.csvPath, statePath=self.statePath)
+        result, output = captureOutput(sharesInfo._processCsvFile)
+        return sharesInfo, result, output
+
+    # test that an incremental run after an append only reads the new rows
+    # and gives the same results as a full run.
+    def testIncrementalRunAfterAppend(self):
+
+        self.processIncremental()
+        fileSize = os.path.getsize(self.csvPath)
+        self.appendToCsv('1993,Jun,30,5,1,bad\n')
+
+        sharesInfo, result, output = self.processIncremental()
+        expected = captureOutput(SharesInfo(self.csvPath)._processCsvFile)[0]
+        self.assertEqual(sharesInfo.resumeOffset, fileSize)
+        self.assertEqual(getMaxShareLists(result), getMaxShareLists(expected))
+        self.assertTrue('row:6,cloumn:5' in output)
+        self.assertFalse('row:1,' in output)
+
+
+    # test that a changed header forces a full rebuild.
+    def testIncrementalRunAfterHeaderChange(self):
+
+        self.processIncremental()
+        csvLines = list(TIES_CSV_LINES)
+        csvLines[0] = csvLines[0].replace('Company D', 'Company E')
+        csvFile = open(self.csvPath, 'wb')
+        csvFile.write('\n'.join(csvLines) + '\n')
+        csvFile.close()
+
+        sharesInfo, result, output = self.processIncremental()
+        self.assertEqual(sharesInfo.resumeOffset, len(csvLines[0]) + 1)
+        self.assertEqual(result.keys()[-1], 'Company E')
+
+
+    # test that a last line without line ending is not counted twice once
+    # it is completed.
+    def testIncrementalRunWithIncompleteLastLine(self):
+
+        self.appendToCsv('1993,Jun,40,1,1,')
+        self.processIncremental()
+        self.appendToCsv('1\n')
+
+        result = self.processIncremental()[1]
+        expected = captureOutput(SharesInfo(self.csvPath)._processCsvFile)[0]
+        self.assertEqual(getMaxShareLists(result), getMaxShareLists(expected))
+
+
+class TestSharesInfoErrorSink(unittest.TestCase):
+    """
+    Class for testcases for the error sink of SharesInfo
+    """
+
+    def setUp(self):
+        self.tiesCsvPath = writeTempCsv(TIES_CSV_LINES)
+
+    def tearDown(self):
+        os.remove(self.tiesCsvPath)
+
+    # test that the sink records the same errors as the printed messages,
+    # with every engine, and that nothing is printed.
+    def testErrorSinkMatchesPrintedErrors(self):
+
+        for csvPath in (self.tiesCsvPath, TEST_CSV_PATH):
+            expected, expectedOutput = captureOutput(SharesInfo(csvPath)._processCsvFile)
+            for engine in ENGINES:
+                if engine == NUMPY_ENGINE and numpy is None:
+                    continue
+                errorSink = CsvErrorSink()
+                sharesInfo = SharesInfo(csvPath, engine, workers=3, errorSink=errorSink)
+                result, output = captureOutput(sharesInfo._processCsvFile)
+                self.assertEqual(getMaxShareLists(result), getMaxShareLists(expected))
+                self.assertEqual(output, '')
+                messages = [CSV_ERROR_FORMAT %(errorMessage, csvPath) + '\n'
+                            for errorMessage in errorSink.iterMessages()]
+                self.assertEqual(''.join(messages), expectedOutput)
+
+
+    # test that only the first maxRecords errors are recorded but all are counted.
+    def testErrorSinkWithMaxRecords(self):
+
+        errorSink = CsvErrorSink(2)
+        SharesInfo(self.tiesCsvPath, SHARDED_ENGINE, workers=2,
+                   errorSink=errorSink)._processCsvFile()
+        self.assertEqual(errorSink.errorCount, 6)
+        self.assertEqual(errorSink.getRecords(), [(INVALID_SHARE_ERROR, 1, 4, 'x'),
+                                                  (INVALID_SHARE_ERROR, 2, 4, 'y')])
+
+
+    # test CsvErrorSink.getSummary groups the errors by type and company.
+    def testErrorSinkSummary(self):
+
+        errorSink = CsvErrorSink(0)
+        SharesInfo(TEST_CSV_PATH, errorSink=errorSink)._processCsvFile()
+        self.assertEqual(errorSink.getSummary(['Company A', 'Company B', 'Company C',
+                                               'Company D']),
+                         [('missing share values', 1, []),
+                          ('extra share values', 1, []),
+                          ('invalid year', 1, []),
+                          ('year before %s' %MIN_YEAR, 1, []),
+                          ('invalid share value', 4, [('Company A', 1), ('Company B', 1),
+                                                      ('Company C', 1), ('Company D', 1)])])
+
+
+class TestSharesInfoStats(unittest.TestCase):
+    """
+    Class for testcases for the processing stats of SharesInfo
+    """
+
+    # test the counters of ProcessingStats with the python and sharded engines.
+    def testProcessingStatsCounters(self):
+
+        # every shard reads the share rows of the whole file.
+        fileSize = os.path.getsize(TEST_CSV_PATH)
+        headerSize = len(open(TEST_CSV_PATH, 'rb').readline())
+        for engine, bytesRead in ((PYTHON_ENGINE, fileSize),
+                                  (SHARDED_ENGINE, 2 * fileSize - headerSize)):
+            stats = ProcessingStats()
+            captureOutput(SharesInfo(TEST_CSV_PATH, engine, workers=2,
+                                     stats=stats)._processCsvFile)
+            self.assertEqual(stats.bytesRead, bytesRead)
+            self.assertEqual(stats.rowsAccepted, 4)
+            self.assertEqual(stats.getRejectedRowCount(), 4)
+            self.assertEqual((stats.cellsParsed, stats.invalidCells), (16, 4))
+            self.assertEqual((stats.tieMonths, stats.maxTieMonths), (6, 2))
+
+
+    # test that processCsvFile calls the callback at the end of every phase.
+    def testProcessingStatsCallback(self):
+
+        phaseList = []
+        stats = ProcessingStats(lambda phase, seconds, stats: phaseList.append(phase))
+        captureOutput(SharesInfo(TEST_CSV_PATH, stats=stats).processCsvFile)
+        self.assertEqual(phaseList, ['checks', 'header', 'validation', 'parsing', 'tracking',
+                                     'finalize', 'display'])
+        self.assertEqual(sorted(stats.phaseSeconds), sorted(phaseList))
+        self.assertTrue(set(phaseList) <= set(PHASES))
+
+
+class TestSharesInfoDecimals(unittest.TestCase):
+    """
+    Class for testcases for the decimal share prices of SharesInfo
+    """
+
+    def setUp(self):
+        self.decimalCsvPath = writeTempCsv(DECIMAL_CSV_LINES)
+
+    def tearDown(self):
+        os.remove(self.decimalCsvPath)
+
+    # test parseShareValue and formatShareValue with valid and invalid values.
+    def testParseAndFormatShareValue(self):
+
+        for value, shareValue in (('123.45', 12345), ('12', 1200), ('.5', 50),
+                                  ('-1.5', -150), ('0.07', 7), ('-0.07', -7)):
+            self.assertEqual(parseShareValue(value, 2), shareValue)
+            self.assertEqual(parseShareValue(formatShareValue(shareValue, 2), 2), shareValue)
+        self.assertEqual(formatShareValue(-7, 2), '-0.07')
+        self.assertEqual(parseShareValue('42'), 42)
+        for value in ('1.234', '.', '', '1.x', '1,5'):
+            self.assertRaises(ValueError, parseShareValue, value, 2)
+
+
+    # test SharesInfo.checkPriceDecimals with invalid values.
+    def testCheckPriceDecimalsWithInvalidValues(self):
+
+        for priceDecimals in (-1, company_shares.MAX_PRICE_DECIMALS + 1, '2', None):
+            self.assertRaises(CsvError, SharesInfo().checkPriceDecimals, priceDecimals)
+
+
+    # test that every engine finds the same decimal ties and errors, and that
+    # the results are displayed with the decimal places.
+    def testDecimalSharesWithAllEngines(self):
+
+        expected, expectedOutput = captureOutput(
+            SharesInfo(self.decimalCsvPath, priceDecimals=2)._processCsvFile)
+        self.assertEqual(getMaxShareLists(expected),
+                         [('Company A', [('1990', 'Jan', 12345), ('1991', 'Mar', 12345)]),
+                          ('Company B', [('1990', 'Jan', 1000), ('1990', 'Feb', 1000)]),
+                          ('Company C', [('1990', 'Feb', -50), ('1991', 'Mar', -50)])])
+        self.assertEqual(expectedOutput.count('Invalid string value'), 2)
+
+        engineList = [engine for engine in ENGINES if engine != NUMPY_ENGINE or numpy]
+        for engine in engineList:
+            result, output = captureOutput(SharesInfo(self.decimalCsvPath, engine, workers=2,
+                                                      priceDecimals=2)._processCsvFile)
+            self.assertEqual(getMaxShareLists(result), getMaxShareLists(expected))
+            self.assertEqual(output, expectedOutput)
+
+        sharesInfo = SharesInfo(self.decimalCsvPath, priceDecimals=2)
+        sharesInfo.maxShareDict = expected
+        output = captureOutput(sharesInfo.displayResults)[1]
+        self.assertTrue('123.45' in output)
+        self.assertTrue('-0.50' in output)
+
+
+class TestSharesInfoCompression(unittest.TestCase):
+    """
+    Class for testcases for the compressed CSV files of SharesInfo
+    """
+
+    def setUp(self):
+        self.tiesCsvPath = writeTempCsv(TIES_CSV_LINES)
+        self.csvData = open(self.tiesCsvPath, 'rb').read()
+        self.filePaths = [self.tiesCsvPath]
+
+    def tearDown(self):
+        for filePath in self.filePaths:
+            os.remove(filePath)
+
+    def writeTempFile(self, data, suffix):
+        fileHandle, filePath = tempfile.mkstemp(prefix='share_test', suffix=suffix)
+        os.write(fileHandle, data)
+        os.close(fileHandle)
+        self.filePaths.append(filePath)
+        return filePath
+
+    def writeGzipFile(self, data):
+        gzipData = StringIO.StringIO()
+        gzipFile = gzip.GzipFile(fileobj=gzipData, mode='wb')
+        gzipFile.write(data)
+        gzipFile.close()
+        return self.writeTempFile(gzipData.getvalue(), '.csv.gz')
+
+    # test getCompression with the file extensions and the magic bytes.
+    def testGetCompression(self):
+
+        self.assertEqual(getCompression(self.tiesCsvPath), None)
+        self.assertEqual(getCompression(self.writeGzipFile(self.csvData)), GZIP_COMPRESSION)
+        self.assertEqual(getCompression(self.writeTempFile(bz2.compress(self.csvData), '.dat')),
+                         BZIP2_COMPRESSION)
+        self.assertEqual(getCompression(self.writeTempFile('\xfd7zXZ\x00', '')),
+                         XZ_COMPRESSION)
+        if lzma is None:
+            self.assertRaises(CsvError, SharesInfo().checkCsvPath, self.filePaths[-1])
+
+
+    # test that every engine and reader gives the same results and error messages
+    # for a gzip file and a bz2 file of two streams as for the plain CSV.
+    def testCompressedCsvMatchesPlainCsv(self):
+
+        expected, expectedOutput = captureOutput(SharesInfo(self.tiesCsvPath)._processCsvFile)
+        bz2Data = bz2.compress(self.csvData[:40]) + bz2.compress(self.csvData[40:])
+        for csvPath in (self.writeGzipFile(self.csvData), self.writeTempFile(bz2Data, '')):
+            for engine in ENGINES:
+                if engine == NUMPY_ENGINE and numpy is None:
+                    continue
+                result, output = captureOutput(SharesInfo(csvPath, engine, workers=2,
+                                                          reader=MMAP_READER)._processCsvFile)
+                self.assertEqual(getMaxShareLists(result), getMaxShareLists(expected))
+                self.assertEqual(output, expectedOutput.replace(self.tiesCsvPath, csvPath))
+
+
+    # test that a truncated gzip file, a truncated multi-block bz2 file and
+    # incremental processing of a compressed file raise CsvError.
+    def testCompressedCsvErrors(self):
+
+        csvPath = self.writeGzipFile(self.csvData)
+        self.assertRaises(CsvError, SharesInfo(csvPath, statePath=csvPath + '.state')._processCsvFile)
+        truncatedPath = self.writeTempFile(open(csvPath, 'rb').read()[:-10], '.gz')
+        self.assertRaises(CsvError, captureOutput, SharesInfo(truncatedPath)._processCsvFile)
+
+        # 100k blocks of rows with different values, the last row holding the max.
+        csvLines = ['Year,Month,Company A,Company B']
+        csvLines.extend('%s,%s,%s,%s' %(1990 + rowIndex % 30, MONTH_NAMES[rowIndex % 12],
+                                         rowIndex * 7919 % 999983, rowIndex * 104729 % 999979)
+                        for rowIndex in range(40000))
+        csvLines.append('2019,Dec,99999999,99999999')
+        bz2Data = bz2.compress('\n'.join(csvLines) + '\n', 1)
+        bz2Path = self.writeTempFile(bz2Data, '.csv.bz2')
+        result = SharesInfo(bz2Path, errorSink=CsvErrorSink())._processCsvFile()
+        self.assertEqual(result['Company A'].maxShareValue, 99999999)
+        truncatedPath = self.writeTempFile(bz2Data[:-2000], '.csv.bz2')
+        for engine in (PYTHON_ENGINE, CHUNKED_ENGINE):
+            sharesInfo = SharesInfo(truncatedPath, engine, errorSink=CsvErrorSink())
+            self.assertRaises(CsvError, sharesInfo._processCsvFile)
+
+
+class TestSharesInfoStore(unittest.TestCase):
+    """
+    Class for testcases for the binary shares stores of SharesInfo
+    """
+
+    def setUp(self):
+        self.tiesCsvPath = writeTempCsv(TIES_CSV_LINES)
+        self.storePath = self.tiesCsvPath + STORE_EXTENSION
+
+    def tearDown(self):
+        for filePath in (self.tiesCsvPath, self.storePath):
+            if os.path.exists(filePath):
+                os.remove(filePath)
+
+    # test the columns of a compiled store, with the months of the time keys.
+    def testCompileSharesStore(self):
+
+        csvPath = writeTempCsv(['Year,Month,Company A,Company B', ' 1990,January,5,x',
+                                '1991,Foo,7,3', '1992,Mar,7,abc', '1993,4,8,2'])
+        try:
+            sharesStore = SharesStore(compileSharesStore(csvPath, self.storePath))
+        finally:
+            os.remove(csvPath)
+        self.assertEqual(sharesStore.getCompanyNames(), ['Company A', 'Company B'])
+        self.assertEqual(list(sharesStore.getTimeKeys()), [1990 * 12, 1992 * 12 + 2,
+                                                           1993 * 12 + 3])
+        self.assertEqual(map(formatTimeKey, sharesStore.getTimeKeys()),
+                         [('1990', 'Jan'), ('1992', 'Mar'), ('1993', 'Apr')])
+        self.assertEqual(list(sharesStore.getValues(0)), [5, 7, 8])
+        self.assertEqual(sharesStore.getValidFlags(1), [False, False, True])
+        self.assertEqual(len(sharesStore.errorList), 3)
+        sharesStore.close()
+
+
+    # test that the store gives the same results and error messages as the CSV
+    # file with every engine and number of top months.
+    def testSharesStoreMatchesCsv(self):
+
+        compileSharesStore(self.tiesCsvPath)
+        for topCount in (1, 2):
+            expected, expectedOutput = captureOutput(
+                SharesInfo(self.tiesCsvPath, topCount=topCount)._processCsvFile)
+            for engine in ENGINES:
+                if engine == NUMPY_ENGINE and numpy is None:
+                    continue
+                result, output = captureOutput(SharesInfo(self.storePath, engine,
+                                                          topCount=topCount)._processCsvFile)
+                self.assertEqual(getMaxShareLists(result), getMaxShareLists(expected))
+                self.assertEqual(output, expectedOutput.replace(self.tiesCsvPath,
+                                                                self.storePath))
+
+
+    # test that an invalid store and a store with other decimal places raise CsvError.
+    def testSharesStoreErrors(self):
+
+        compileSharesStore(self.tiesCsvPath)
+        self.assertRaises(CsvError, SharesInfo(self.storePath, priceDecimals=2)._processCsvFile)
+        storeFile = open(self.storePath, 'r+b')
+        storeFile.truncate(os.path.getsize(self.storePath) - 1)
+        storeFile.close()
+        self.assertRaises(CsvError, SharesInfo(self.storePath)._processCsvFile)
+        storeFile = open(self.storePath, 'wb')
+        storeFile.write('\n'.join(TIES_CSV_LINES))
+        storeFile.close()
+        self.assertRaises(CsvError, SharesInfo(self.storePath).loadShareMatrix)
+
+
+    # test that the share values are stored as little endian 64 bit integers,
+    # read as lists where the arrays are narrower, and that a store with values
+    # of another size raises CsvError.
+    def testSharesStoreValueLayout(self):
+
+        csvPath = writeTempCsv(['Year,Month,Company A,Company B', '1990,Jan,5000000000,-7',
+                                '1990,Feb,-5000000000,x'])
+        try:
+            compileSharesStore(csvPath, self.storePath)
+        finally:
+            os.remove(csvPath)
+
+        sharesStore = SharesStore(self.storePath)
+        start = sharesStore.valueOffset
+        self.assertEqual(struct.unpack('<2q', sharesStore.storeMap[start:start + 16]),
+                         (5000000000, -5000000000))
+        self.assertEqual(list(sharesStore.getValues(0)), [5000000000, -5000000000])
+        shareArrayTypecode = company_shares.SHARE_ARRAY_TYPECODE
+        company_shares.SHARE_ARRAY_TYPECODE = 'i'
+        try:
+            self.assertEqual(sharesStore.getValues(0), [5000000000, -5000000000])
+            self.assertEqual(list(sharesStore.getShareMatrixLists()[0][:3]),
+                             [5000000000, -7, -5000000000])
+        finally:
+            company_shares.SHARE_ARRAY_TYPECODE = shareArrayTypecode
+        sharesStore.close()
+
+        storeValueSize = company_shares.STORE_VALUE_SIZE
+        company_shares.STORE_VALUE_SIZE = 4
+        try:
+            self.assertRaises(CsvError, SharesStore, self.storePath)
+        finally:
+            company_shares.STORE_VALUE_SIZE = storeValueSize
+
+
+class TestSharesInfoLongLayout(unittest.TestCase):
+    """
+    Class for testcases for the long layout of SharesInfo
+    """
+
+    def setUp(self):
+        # the rows of TIES_CSV_LINES, one per company and month, companies interleaved.
+        headerList = TIES_CSV_LINES[0].split(',')
+        longLines = ['Year,Month,Company,Price']
+        for line in TIES_CSV_LINES[1:]:
+            rowList = line.split(',')
+            for companyName, shareValue in zip(headerList[2:], rowList[2:]):
+                longLines.append(','.join(rowList[:2] + [companyName, shareValue]))
+        self.longCsvPath = writeTempCsv(longLines)
+
+    def tearDown(self):
+        os.remove(self.longCsvPath)
+
+    # test that the long layout gives the same results as the wide layout.
+    def testLongLayoutMatchesWideLayout(self):
+
+        tiesCsvPath = writeTempCsv(TIES_CSV_LINES)
+        try:
+            for topCount in (1, 2):
+                expected = SharesInfo(tiesCsvPath, topCount=topCount, errorSink=CsvErrorSink()
+                                      )._processCsvFile()
+                for reader in (MMAP_READER, 'csv'):
+                    result = SharesInfo(self.longCsvPath, reader=reader, topCount=topCount,
+                                        errorSink=CsvErrorSink(),
+                                        layout=LONG_LAYOUT)._processCsvFile()
+                    self.assertEqual(getMaxShareLists(result), getMaxShareLists(expected))
+        finally:
+            os.remove(tiesCsvPath)
+
+
+    # test the duplicate company month and missing company errors of the long layout.
+    def testLongLayoutRowErrors(self):
+
+        csvPath = writeTempCsv(['Year,Month,Company,Price', '1990,Jan,A,10', '1990,Jan,B,7',
+                                '1990,January,A,20', '1990,Feb,,5', '1991,1,A,20', '1991,Mar,A,x'])
+        try:
+            errorSink = CsvErrorSink()
+            result = SharesInfo(csvPath, errorSink=errorSink,
+                                layout=LONG_LAYOUT)._processCsvFile()
+        finally:
+            os.remove(csvPath)
+        self.assertEqual(getMaxShareLists(result), [('A', [('1991', 'Jan', 20)]),
+                                                     ('B', [('1990', 'Jan', 7)])])
+        self.assertEqual(errorSink.getRecords(), [(DUPLICATE_MONTH_ERROR, 3, 2, 'A'),
+                                                  (MISSING_COMPANY_ERROR, 4, 2, ''),
+                                                  (INVALID_SHARE_ERROR, 6, 3, 'x')])
+        self.assertEqual([companyCounts for errorName, errorCount, companyCounts
+                          in errorSink.getSummary([])], [[], [], []])
+
+
+    # test SharesInfo.validateLongHeaderRow and checkLayout with invalid values.
+    def testLongLayoutWithInvalidHeader(self):
+
+        sharesInfo = SharesInfo()
+        self.assertTrue(sharesInfo.validateLongHeaderRow(['year', ' Month', 'COMPANY', 'Price']))
+        for headerList in (['Year', 'Month', 'Company'], ['Year', 'Month', 'Price', 'Company'],
+                           ['Year', 'Month', 'Company', 'Price', 'Volume']):
+            self.assertRaises(CsvError, sharesInfo.validateLongHeaderRow, headerList)
+        self.assertRaises(CsvError, sharesInfo.checkLayout, 'tall')
+        self.assertRaises(CsvError, SharesInfo(TEST_CSV_PATH, layout=LONG_LAYOUT)._processCsvFile)
+
+
+class TestSharesInfoTimeKeys(unittest.TestCase):
+    """
+    Class for testcases for the packed time keys of the months
+    """
+
+    # test getTimeKey and formatTimeKey, and the packed months of a Company.
+    def testTimeKeys(self):
+
+        self.assertEqual(getTimeKey('2001', 'Mar'), 2001 * 12 + 2)
+        self.assertEqual(getTimeKey(' 2001', ' march '), getTimeKey(2001, '03'))
+        self.assertRaises(CsvError, getTimeKey, '1e9', 'Mar')
+        self.assertRaises(CsvError, getTimeKey, 10 ** 9, 'Mar')
+        self.assertEqual(formatTimeKey(getTimeKey(2001, 'MARCH')), ('2001', 'Mar'))
+        self.assertEqual(formatTimeKey(NO_TIME_KEY), ('NA', 'NA'))
+
+        company = Company()
+        for year, month, shareValue in [('1990', 'Jan', 9), ('1990', 'February', 5),
+                                        ('1991', '12', 9)]:
+            company.updateMaxShare(year, month, shareValue)
+        timeKeys, shareValues = company.getTopShares()
+        self.assertEqual(list(timeKeys), [1990 * 12, 1991 * 12 + 11])
+        self.assertEqual(shareValues, [9, 9])
+        company.finalizeTopShares()
+        self.assertEqual(company.maxShareList, [('1990', 'Jan', 9), ('1991', 'Dec', 9)])
+
+
+    # test that the rows with a less usual spelling of a month are kept, that
+    # the rows without a month are ignored and that the month names are
+    # normalized with every engine.
+    def testInvalidMonthRows(self):
+
+        csvPath = writeTempCsv(['Year,Month,Company A,Company B', '1990,january,5,3',
+                                '1990,Foo,9,9', '1991,02,5,1', '1991, Mar ,4,3',
+                                '1991,Sept.,2,3', '1991,DECEMBER,1,1'])
+        try:
+            for engine in ENGINES:
+                if engine == NUMPY_ENGINE and numpy is None:
+                    continue
+                errorSink = CsvErrorSink()
+                result = SharesInfo(csvPath, engine, workers=2,
+                                    errorSink=errorSink)._processCsvFile()
+                self.assertEqual(getMaxShareLists(result),
+                                 [('Company A', [('1990', 'Jan', 5), ('1991', 'Feb', 5)]),
+                                  ('Company B', [('1990', 'Jan', 3), ('1991', 'Mar', 3),
+                                                 ('1991', 'Sep', 3)])])
+                self.assertEqual(errorSink.getRecords(),
+                                 [(INVALID_MONTH_ERROR, 2, MONTH_COLUMN, 'Foo')])
+        finally:
+            os.remove(csvPath)
+
+
+    # test that a row whose month label names no month is ignored and reported,
+    # where the original tool kept the raw label as the month of the row, and
+    # that it cannot be part of a trusted feed.
+    def testUnknownMonthLabelsAreRejected(self):
+
+        csvPath = writeTempCsv(['Year,Month,Company A', '1990,Q1,9', '1990,13,8',
+                                '1990,Mar,5', '1990,Smarch,7'])
+        try:
+            errorSink = CsvErrorSink()
+            result = SharesInfo(csvPath, errorSink=errorSink)._processCsvFile()
+            self.assertEqual(result['Company A'].maxShareList, [('1990', 'Mar', 5)])
+            self.assertEqual(errorSink.getRecords(),
+                             [(INVALID_MONTH_ERROR, 1, MONTH_COLUMN, 'Q1'),
+                              (INVALID_MONTH_ERROR, 2, MONTH_COLUMN, '13'),
+                              (INVALID_MONTH_ERROR, 4, MONTH_COLUMN, 'Smarch')])
+
+            output = captureOutput(SharesInfo(csvPath)._processCsvFile)[1]
+            self.assertTrue("-> 'Smarch'\nExpected a month name or number." in output)
+            self.assertRaises(CsvError, SharesInfo(csvPath, trusted=True)._processCsvFile)
+        finally:
+            os.remove(csvPath)
+
+
+    # test SharesInfo.verifyMonthValue with valid and invalid months.
+    def testVerifyMonthValue(self):
+
+        sharesInfo = SharesInfo()
+        for month in ('Jan', 'january', ' DEC', '7', '07', '007', 'Sept', 'JAN.', 'Febr'):
+            self.assertTrue(sharesInfo.verifyMonthValue(3, month))
+        for month in ('Foo', '13', '0', '', 'Ma', 'Janx', '.'):
+            self.assertRaises(CsvError, sharesInfo.verifyMonthValue, 3, month)
+
+
+class TestSharesInfoIterResults(unittest.TestCase):
+    """
+    Class for testcases for SharesInfo.iterResults
+    """
+
+    def setUp(self):
+        self.tiesCsvPath = writeTempCsv(TIES_CSV_LINES)
+
+    def tearDown(self):
+        os.remove(self.tiesCsvPath)
+
+    def getItems(self, itemType, items):
+        return [item for eachType, item in items if eachType == itemType]
+
+    # test that iterResults yields the results and errors of _processCsvFile
+    # with every engine and number of top months, without printing anything.
+    def testIterResultsMatchesProcessCsvFile(self):
+
+        for topCount in (1, 2):
+            errorSink = CsvErrorSink()
+            expected = SharesInfo(self.tiesCsvPath, topCount=topCount,
+                                  errorSink=errorSink)._processCsvFile()
+            expectedResults = [(companyName, [shareInfoTuple for shareInfoTuple
+                                              in companyObject.maxShareList
+                                              if shareInfoTuple != INITIAL_SHARE_TUPLE])
+                               for companyName, companyObject in expected.items()]
+            for engine in ENGINES:
+                if engine == NUMPY_ENGINE and numpy is None:
+                    continue
+                items, output = captureOutput(list, SharesInfo(
+                    self.tiesCsvPath, engine, workers=2, topCount=topCount).iterResults())
+                self.assertEqual(output, '')
+                self.assertEqual(self.getItems(RESULT_ITEM, items), expectedResults)
+                self.assertEqual(sorted(self.getItems(ERROR_ITEM, items)),
+                                 sorted(errorSink.getRecords()))
+                self.assertEqual(set(itemType for itemType, item in items[-4:]),
+                                 set([RESULT_ITEM]))
+
+
+    # test a company subset: only its results and cell errors are yielded, and
+    # the peak months of every company are indexed with indexPeaks.
+    def testIterResultsWithCompanySubset(self):
+
+        for engine, indexPeaks in itertools.product((PYTHON_ENGINE, CHUNKED_ENGINE),
+                                                    (False, True)):
+            errorSink = CsvErrorSink()
+            sharesInfo = SharesInfo(self.tiesCsvPath, engine, errorSink=errorSink,
+                                    indexPeaks=indexPeaks)
+            items = list(sharesInfo.iterResults(['Company D', 'Company A']))
+            self.assertEqual(self.getItems(RESULT_ITEM, items),
+                             [('Company D', [('1991', 'Mar', 7), ('1991', 'Apr', 7)]),
+                              ('Company A', [('1990', 'Feb', 30), ('1991', 'Mar', 30),
+                                             ('1992', 'May', 30)])])
+            self.assertEqual(self.getItems(ERROR_ITEM, items),
+                             [(INVALID_SHARE_ERROR, 4, 2, 'abc')])
+            self.assertEqual(errorSink.getRecords(), [(INVALID_SHARE_ERROR, 4, 2, 'abc')])
+            if indexPeaks:
+                self.assertEqual(sharesInfo.getPeakMonthIndex().getHistogram(),
+                                 [('1990', 'Jan', 1), ('1990', 'Feb', 2), ('1991', 'Mar', 2),
+                                  ('1991', 'Apr', 2), ('1992', 'May', 2)])
+
+        results = SharesInfo(self.tiesCsvPath).iterResults(['Company E'])
+        self.assertRaises(CsvError, list, results)
+
+
+    # test that the python engine streams the errors of the rows read so far
+    # and that the file is closed when the caller stops iterating.
+    def testIterResultsEarlyTermination(self):
+
+        csvPath = writeTempCsv(['Year,Month,Company A'] + ['1990,Jan,x'] * 10 +
+                               ['1990,Feb,%s' %shareValue for shareValue in range(5000)])
+        try:
+            sharesInfo = SharesInfo(csvPath)
+            results = sharesInfo.iterResults(withErrors=True)
+            firstItems = [results.next() for index in range(3)]
+            self.assertEqual(firstItems, [(ERROR_ITEM, (INVALID_SHARE_ERROR, rowIndex, 2, 'x'))
+                                          for rowIndex in (1, 2, 3)])
+            results.close()
+            self.assertEqual(sharesInfo.errorSink, None)
+
+            self.assertEqual(list(SharesInfo(csvPath).iterResults(withErrors=False)),
+                             [(RESULT_ITEM, ('Company A', [('1990', 'Feb', 4999)]))])
+        finally:
+            os.remove(csvPath)
+
+
+    # test the peakList of the results, Company.getResult, and that no error is
+    # recorded when they are neither yielded nor kept in errorSink.
+    def testIterResultsPeakList(self):
+
+        addErrorList = []
+        addError = CsvErrorSink.addError
+        def recordAddError(errorSink, *errorRecord):
+            addErrorList.append(errorSink.maxRecords)
+            addError(errorSink, *errorRecord)
+
+        CsvErrorSink.addError = recordAddError
+        try:
+            for engine in (PYTHON_ENGINE, NUMPY_ENGINE):
+                if engine == NUMPY_ENGINE and numpy is None:
+                    continue
+                del addErrorList[:]
+                items = list(SharesInfo(self.tiesCsvPath, engine, tieLimit=1
+                                        ).iterResults(withErrors=False))
+                self.assertEqual(set(addErrorList), set([0]))
+                peakList = dict(self.getItems(RESULT_ITEM, items))['Company A']
+                self.assertEqual(peakList, [('1990', 'Feb', 30), ('1992', 'May', 30)])
+                for year, month, shareValue in peakList:
+                    self.assertTrue(isinstance(year, str) and month in MONTH_NAMES)
+                    self.assertTrue(isinstance(shareValue, int))
+        finally:
+            CsvErrorSink.addError = addError
+
+        sharesInfo = SharesInfo(self.tiesCsvPath, tieLimit=1)
+        companyObject = captureOutput(sharesInfo._processCsvFile)[0]['Company A']
+        self.assertEqual(companyObject.getResult(), peakList)
+
+
+class TestSharesInfoYearlyPeaks(unittest.TestCase):
+    """
+    Class for testcases for the yearly peaks of SharesInfo
+    """
+
+    def setUp(self):
+        self.tiesCsvPath = writeTempCsv(TIES_CSV_LINES)
+
+    def tearDown(self):
+        os.remove(self.tiesCsvPath)
+
+    # test that every engine finds the same yearly peaks and that they are displayed.
+    def testYearlyPeaksOfEveryEngine(self):
+
+        expectedPeaks = [('Company A', 1990, ['Feb'], 30), ('Company A', 1991, ['Mar'], 30),
+                         ('Company A', 1992, ['May'], 30),
+                         ('Company B', 1990, ['Jan', 'Feb'], -999999),
+                         ('Company B', 1991, ['Apr'], -999999),
+                         ('Company B', 1992, ['May'], -999999),
+                         ('Company D', 1990, ['Jan', 'Feb'], 5),
+                         ('Company D', 1991, ['Mar', 'Apr'], 7), ('Company D', 1992, ['May'], 6)]
+        for engine in ENGINES:
+            if engine == NUMPY_ENGINE and numpy is None:
+                continue
+            sharesInfo = SharesInfo(self.tiesCsvPath, engine, workers=2, topCount=2,
+                                    errorSink=CsvErrorSink(), groupByYear=True)
+            sharesInfo.maxShareDict = sharesInfo._processCsvFile()
+            yearlyPeakTable = sharesInfo.getYearlyPeaks()
+            self.assertEqual(list(yearlyPeakTable.iterPeaks()), expectedPeaks)
+            self.assertEqual(yearlyPeakTable.getYears(), [1990, 1991, 1992])
+
+        self.assertEqual(yearlyPeakTable.getPeak('Company D', 1991), (7, ['Mar', 'Apr']))
+        self.assertEqual(yearlyPeakTable.getPeak('Company C', 1991), None)
+        self.assertEqual(yearlyPeakTable.getPeak('Company A', 1989), None)
+        self.assertRaises(CsvError, yearlyPeakTable.getPeak, 'Company E', 1991)
+
+        output = captureOutput(SharesInfo(self.tiesCsvPath, errorSink=CsvErrorSink(),
+                                          groupByYear=True).processCsvFile)[1]
+        self.assertTrue('Highest share value details for companies by year:' in output)
+        self.assertRaises(CsvError, SharesInfo(self.tiesCsvPath).getYearlyPeaks)
+
+
+    # test the yearly peaks of years out of order, with ties, merged from two parts.
+    def testYearlyPeakAggregatorMerge(self):
+
+        shareList = [('1995', 'Mar', 4), ('1993', 'Jan', 2), ('1995', 'Jan', 4),
+                     ('1993', 'Dec', 1), ('1997', 'Jun', -5), ('1995', 'Feb', 3)]
+        expected = YearlyPeakAggregator()
+        for year, month, shareValue in shareList:
+            expected.update(getTimeKey(year, month), shareValue)
+        self.assertEqual(expected.getResult(), [('1993', 'Jan', 2), ('1995', 'Jan', 4),
+                                                ('1995', 'Mar', 4), ('1997', 'Jun', -5)])
+        self.assertEqual(expected.getYearPeak(1996), None)
+
+        for splitIndex in range(len(shareList) + 1):
+            aggregator = YearlyPeakAggregator()
+            otherAggregator = YearlyPeakAggregator()
+            for year, month, shareValue in shareList[:splitIndex]:
+                aggregator.update(getTimeKey(year, month), shareValue)
+            for year, month, shareValue in shareList[splitIndex:]:
+                otherAggregator.update(getTimeKey(year, month), shareValue)
+            aggregator.merge(otherAggregator)
+            self.assertEqual(aggregator.getResult(), expected.getResult())
+
+        # share values wider than 64 bits and a year far from the others.
+        csvPath = writeTempCsv(['Year,Month,Company A,Company B',
+                                '1990,Jan,99999999999999999999,5',
+                                '1991,Mar,7,-99999999999999999999',
+                                '%s,Dec,8,9' %MAX_YEAR])
+        sharesInfo = SharesInfo(csvPath, errorSink=CsvErrorSink(), groupByYear=True)
+        sharesInfo.maxShareDict = sharesInfo._processCsvFile()
+        os.remove(csvPath)
+        yearlyPeakTable = sharesInfo.getYearlyPeaks()
+        self.assertEqual(yearlyPeakTable.getYears(), [1990, 1991, MAX_YEAR])
+        self.assertEqual(yearlyPeakTable.getPeak('Company A', 1990),
+                         (99999999999999999999, ['Jan']))
+        self.assertEqual(yearlyPeakTable.getPeak('Company B', 1991),
+                         (-99999999999999999999, ['Mar']))
+        self.assertEqual(yearlyPeakTable.getPeak('Company B', MAX_YEAR), (9, ['Dec']))
+        self.assertEqual(yearlyPeakTable.getPeak('Company B', 2000), None)
+
+
+
+class TestSharesInfoTieLimit(unittest.TestCase):
+    """
+    Class for testcases for the limited number of tied months of SharesInfo
+    """
+
+    def setUp(self):
+        # Company A is tied every month, Company B every other month after a
+        # lower start, and Company C has a single max month.
+        csvLines = ['Year,Month,Company A,Company B,Company C']
+        for monthIndex in range(30):
+            csvLines.append('%s,%s,7,%s,%s' %(1990 + monthIndex // 12, monthIndex % 12 + 1,
+                                             5 if monthIndex % 2 else 4, monthIndex))
+        self.csvPath = writeTempCsv(csvLines)
+        self.statePath = tempfile.mktemp(prefix='share_test', suffix='.state')
+
+    def tearDown(self):
+        os.remove(self.csvPath)
+        if os.path.exists(self.statePath):
+            os.remove(self.statePath)
+
+    # test the kept and dropped tied months of a Company, merged from two parts,
+    # and SharesInfo.checkTieLimit with invalid values.
+    def testCompanyTieLimit(self):
+
+        timeKeys = range(getTimeKey('1990', 'Jan'), getTimeKey('1990', 'Jan') + 12)
+        expected = Company(1, 2)
+        for timeKey in timeKeys:
+            expected.updateMaxShareKey(timeKey, 3)
+        expected.finalizeTopShares()
+        self.assertEqual(expected.maxShareList, [('1990', 'Jan', 3), ('1990', 'Feb', 3),
+                                                 ('1990', 'Nov', 3), ('1990', 'Dec', 3)])
+        self.assertEqual(expected.droppedTies, 8)
+
+        for splitIndex in range(len(timeKeys) + 1):
+            company = Company(1, 2)
+            otherCompany = Company(1, 2)
+            for timeKey in timeKeys[:splitIndex]:
+                company.updateMaxShareKey(timeKey, 3)
+            for timeKey in timeKeys[splitIndex:]:
+                otherCompany.updateMaxShareKey(timeKey, 3)
+            company.mergeCompany(otherCompany)
+            company.finalizeTopShares()
+            self.assertEqual((company.maxShareList, company.droppedTies),
+                             (expected.maxShareList, expected.droppedTies))
+
+        for tieLimit in (0, -1, 1.5, '2', True):
+            self.assertRaises(CsvError, SharesInfo().checkTieLimit, tieLimit)
+        self.assertRaises(CsvError, SharesInfo().checkTieLimit, 2, 3)
+        self.assertTrue(SharesInfo().checkTieLimit(None, 3))
+
+
+    # test that every engine and the incremental mode keep the same tied months
+    # and count the same dropped ones, and that they are displayed.
+    def testTieLimitWithEveryEngine(self):
+
+        expected = SharesInfo(self.csvPath, tieLimit=3)._processCsvFile()
+        self.assertEqual(expected['Company A'].maxShareList,
+                         [('1990', 'Jan', 7), ('1990', 'Feb', 7), ('1990', 'Mar', 7),
+                          ('1992', 'Apr', 7), ('1992', 'May', 7), ('1992', 'Jun', 7)])
+        self.assertEqual([companyObject.droppedTies for companyObject in expected.values()],
+                         [24, 9, 0])
+
+        engineList = [engine for engine in ENGINES if numpy or engine != NUMPY_ENGINE]
+        for engine in engineList:
+            result = SharesInfo(self.csvPath, engine, workers=3, tieLimit=3)._processCsvFile()
+            self.assertEqual([(companyObject.maxShareList, companyObject.droppedTies)
+                              for companyObject in result.values()],
+                             [(companyObject.maxShareList, companyObject.droppedTies)
+                              for companyObject in expected.values()], engine)
+
+        result = SharesInfo(self.csvPath, statePath=self.statePath, tieLimit=3)._processCsvFile()
+        self.assertEqual(getMaxShareLists(result), getMaxShareLists(expected))
+        self.assertRaises(CsvError, SharesInfo(self.csvPath, topCount=2,
+                                               tieLimit=3)._processCsvFile)
+
+        output = captureOutput(SharesInfo(self.csvPath, tieLimit=3).processCsvFile)[1]
+        self.assertTrue('... 24 more tied months' in output)
+        self.assertTrue('... 9 more tied months' in output)
+
+
+class TestSharesInfoPeakMonths(unittest.TestCase):
+    """
+    Class for testcases for the peak months index of SharesInfo
+    """
+
+    def setUp(self):
+        self.tiesCsvPath = writeTempCsv(TIES_CSV_LINES)
+
+    def tearDown(self):
+        os.remove(self.tiesCsvPath)
+
+    # test that every engine indexes the same peak months, and their histogram,
+    # clusters and display.
+    def testPeakMonthsOfEveryEngine(self):
+
+        expectedHistogram = [('1990', 'Jan', 1), ('1990', 'Feb', 2), ('1991', 'Mar', 2),
+                             ('1991', 'Apr', 2), ('1992', 'May', 2)]
+        expectedClusters = [('1991', 'Mar', '1991', 'Apr', 3), ('1990', 'Jan', '1990', 'Feb', 2),
+                            ('1992', 'May', '1992', 'May', 2)]
+        engineList = [engine for engine in ENGINES if numpy or engine != NUMPY_ENGINE]
+        for engine in engineList:
+            sharesInfo = SharesInfo(self.tiesCsvPath, engine, workers=2,
+                                    errorSink=CsvErrorSink(), indexPeaks=True)
+            sharesInfo.maxShareDict = sharesInfo._processCsvFile()
+            peakMonthIndex = sharesInfo.getPeakMonthIndex()
+            self.assertEqual(peakMonthIndex.getHistogram(), expectedHistogram, engine)
+            self.assertEqual(peakMonthIndex.getClusters(), expectedClusters, engine)
+
+        self.assertEqual(peakMonthIndex.getCompanies(1991, 'April'), ['Company B', 'Company D'])
+        self.assertEqual(peakMonthIndex.getPeakCount('1990', 1), 1)
+        self.assertEqual(peakMonthIndex.getCompanies(1995, 'Jan'), [])
+        self.assertRaises(CsvError, peakMonthIndex.getPeakCount, 1990, 'Foo')
+        self.assertRaises(CsvError, SharesInfo(self.tiesCsvPath).getPeakMonthIndex)
+
+        output = captureOutput(SharesInfo(self.tiesCsvPath, errorSink=CsvErrorSink(),
+                                          indexPeaks=True).processCsvFile)[1]
+        self.assertTrue('Peak months of the companies:' in output)
+        self.assertTrue('75.0%' in output)
+
+
+    # test that only the months tied at the max value are indexed, once per
+    # company, and the clusters of a wider gap.
+    def testPeakMonthIndex(self):
+
+        peakMonthIndex = PeakMonthIndex(['Company A', 'Company B'])
+        janKey = getTimeKey(2000, 'Jan')
+        peakMonthIndex.addCompanyPeaks(0, [janKey, janKey, janKey + 3, janKey + 1], [9, 9, 9, 8])
+        peakMonthIndex.addCompanyPeaks(1, [NO_TIME_KEY], [INITIAL_SHARE_TUPLE[2]])
+        peakMonthIndex.addCompanyPeaks(1, [janKey + 3, janKey + 12], [4, 4], 5)
+        self.assertEqual(peakMonthIndex.getHistogram(), [('2000', 'Jan', 1), ('2000', 'Apr', 2),
+                                                         ('2001', 'Jan', 1)])
+        self.assertEqual(peakMonthIndex.droppedPeaks, 5)
+        self.assertEqual(peakMonthIndex.getClusters(), [('2000', 'Apr', '2000', 'Apr', 2),
+                                                        ('2000', 'Jan', '2000', 'Jan', 1),
+                                                        ('2001', 'Jan', '2001', 'Jan', 1)])
+        self.assertEqual(peakMonthIndex.getClusters(2), [('2000', 'Jan', '2000', 'Apr', 2),
+                                                         ('2001', 'Jan', '2001', 'Jan', 1)])
+
+
+class TestRowValidator(unittest.TestCase):
+    """
+    Class for testcases for the RowValidator of the share rows
+    """
+
+    # test the time keys and errors of a batch, and the row numbers of iterRows.
+    def testCheckRows(self):
+
+        rowList = [['1990', 'Jan', '1'], ['1990'], ['1990', 'Feb', '1', '2'],
+                   ['199x', 'Jan', '1'], ['1989', 'Jan', '1'], ['1990', 'Foo', '1'],
+                   [' 1991 ', ' march ', '1'], ['1990', 'Jan', '1']]
+        rowValidator = RowValidator(['Year', 'Month', 'Company A'], None)
+        timeKeys, rowErrors = rowValidator.checkRows(rowList)
+        self.assertEqual(timeKeys, [getTimeKey('1990', 'Jan'), NO_TIME_KEY, NO_TIME_KEY,
+                                    NO_TIME_KEY, NO_TIME_KEY, NO_TIME_KEY,
+                                    getTimeKey('1991', 'Mar'), getTimeKey('1990', 'Jan')])
+        self.assertEqual(rowErrors, {1: MISSING_SHARES_ERROR, 2: EXTRA_SHARES_ERROR,
+                                     3: INVALID_YEAR_ERROR, 4: OLD_YEAR_ERROR,
+                                     5: INVALID_MONTH_ERROR})
+
+        errorList = []
+        rowValidator = RowValidator(['Year', 'Month', 'Company A'],
+                                    lambda *errorInfo: errorList.append(errorInfo[:2]))
+        rows = list(rowValidator.iterRows(iter(rowList), 10))
+        self.assertEqual([rowIndex for rowIndex, row, timeKey in rows], [11, 17, 18])
+        self.assertEqual(errorList, [(MISSING_SHARES_ERROR, 12), (EXTRA_SHARES_ERROR, 13),
+                                     (INVALID_YEAR_ERROR, 14), (OLD_YEAR_ERROR, 15),
+                                     (INVALID_MONTH_ERROR, 16)])
+        self.assertEqual(rowValidator.rowCount, 18)
+
+
+    # test that a trusted feed gives the same results without checking its rows,
+    # and that a row that cannot be converted aborts processing.
+    def testTrustedFeed(self):
+
+        csvPath = writeTempCsv([line for line in TIES_CSV_LINES if 'abc' not in line])
+        try:
+            for engine in ENGINES:
+                if engine == NUMPY_ENGINE and numpy is None:
+                    continue
+                expected = SharesInfo(csvPath, engine, errorSink=CsvErrorSink()
+                                      )._processCsvFile()
+                result = SharesInfo(csvPath, engine, errorSink=CsvErrorSink(),
+                                    trusted=True)._processCsvFile()
+                self.assertEqual(getMaxShareLists(result), getMaxShareLists(expected))
+        finally:
+            os.remove(csvPath)
+
+        for badLine in ('1990,Feb,1', '19x0,Feb,1,2,3,4'):
+            csvLines = TIES_CSV_LINES[:2] + [badLine]
+            csvPath = writeTempCsv(csvLines)
+            try:
+                self.assertRaises(CsvError, SharesInfo(csvPath, trusted=True)._processCsvFile)
+            finally:
+                os.remove(csvPath)
+
+        # the file and the decompression thread of a feed aborted in the middle
+        # are closed.
+        openedFiles = []
+        openCsvFile = company_shares.openCsvFile
+        def recordOpenCsvFile(csvPath):
+            openedFiles.append(openCsvFile(csvPath))
+            return openedFiles[-1]
+        company_shares.openCsvFile = recordOpenCsvFile
+        gzipPath = tempfile.mktemp(suffix='.csv.gz')
+        try:
+            for layout, csvLines in ((WIDE_LAYOUT, TIES_CSV_LINES[:2] + ['1990,Feb,1']),
+                                     (LONG_LAYOUT, ['Year,Month,Company,Price',
+                                                    '1990,Jan,Company A,1', '1990,Feb,Company A'])):
+                gzipFile = gzip.open(gzipPath, 'wb')
+                gzipFile.write('\n'.join(csvLines) + '\n')
+                gzipFile.close()
+                sharesInfo = SharesInfo(gzipPath, layout=layout, trusted=True)
+                self.assertRaises(CsvError, sharesInfo._processCsvFile)
+        finally:
+            company_shares.openCsvFile = openCsvFile
+            os.remove(gzipPath)
+        self.assertEqual(len(openedFiles), 2)
+        for csvFile in openedFiles:
+            self.assertTrue(csvFile.closed)
+            self.assertFalse(csvFile.thread.is_alive())
+
+
+    # test that a trusted feed still reports and ignores the rows of the years
+    # before MIN_YEAR.
+    def testTrustedFeedWithOldYear(self):
+
+        csvLines = [line for line in TIES_CSV_LINES if 'abc' not in line]
+        csvPath = writeTempCsv(csvLines[:3] + ['1989,Dec,99,99,99,99'] + csvLines[3:])
+        try:
+            for engine in ENGINES:
+                if engine == NUMPY_ENGINE and numpy is None:
+                    continue
+                expectedSink = CsvErrorSink()
+                expected = SharesInfo(csvPath, engine, errorSink=expectedSink)._processCsvFile()
+                errorSink = CsvErrorSink()
+                result = SharesInfo(csvPath, engine, errorSink=errorSink,
+                                    trusted=True)._processCsvFile()
+                self.assertEqual(getMaxShareLists(result), getMaxShareLists(expected))
+                self.assertEqual(result['Company A'].maxShareValue, 30)
+                self.assertTrue((OLD_YEAR_ERROR, 3, YEAR_COLUMN, '1989') in errorSink.getRecords())
+                self.assertEqual(errorSink.getRecords(), expectedSink.getRecords())
+        finally:
+            os.remove(csvPath)
+
+
 if __name__ == '__main__':
     unittest.main()
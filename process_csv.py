@@ -4,18 +4,182 @@ import sys
 import os
 import csv
 import copy
+import argparse
 
 #import SharesInfo from company_shares module
 from company_shares import SharesInfo
+from company_shares import ENGINES
+from company_shares import READERS
+from company_shares import LAYOUTS
+from company_shares import WIDE_LAYOUT
+from company_shares import PYTHON_ENGINE
+from company_shares import CSV_READER
+from company_shares import CsvError
+from company_shares import STORE_EXTENSION
+from company_shares import compileSharesStore
+from shares_cache import ParsedDataCache
+from shares_cache import DEFAULT_CACHE_DIR
+from shares_cache import ResultCache
+from shares_batch import expandCsvPaths
+from shares_batch import processCsvFiles
+from shares_batch import displayBatchReport
+from shares_output import OUTPUT_FORMATS
+from shares_output import TEXT_FORMAT
+from shares_output import openResultWriter
+from shares_aggregators import AGGREGATORS
+from shares_aggregators import getAggregatorClasses
 
 # constants
 TEST_CSV_PATH = './test_data.csv'
 
+# parsed CSV files are cached on disk with --parse-cache, so repeated menu picks
+# of the same unchanged file are not parsed again, even in a new session.
+PARSED_DATA_CACHE = None
+
+# the results of the files processed from the menu are kept in memory, so a
+# repeated pick of an unchanged file is not processed again at all.
+RESULT_CACHE = ResultCache()
+
 def main():
     """
-    Call SharesInfo methods to process the CSV
+    Call SharesInfo methods to process the CSV.
+    Processes the CSV files passed on the command line as a batch, or shows
+    the menu if there are none.
     """
-    displayMainMenu()
+    global PARSED_DATA_CACHE
+    arguments = parseArguments(sys.argv[1:])
+    if arguments.parseCache:
+        PARSED_DATA_CACHE = ParsedDataCache()
+    if arguments.csvPaths and arguments.compileStores:
+        compileStores(arguments)
+    elif arguments.csvPaths:
+        processBatch(arguments)
+    else:
+        displayMainMenu()
+
+
+def parseArguments(argumentList):
+    """
+    Parse the command line arguments of the non-interactive mode.
+    """
+    parser = argparse.ArgumentParser(description="List for each company the year and month "
+                                     "in which the share price was highest.")
+    parser.add_argument('csvPaths', nargs='*', metavar='CSV',
+                        help="CSV file paths or glob patterns. Shows the menu if none.")
+    parser.add_argument('--processes', type=int, default=None,
+                        help="number of files processed concurrently. Defaults to the CPU count.")
+    parser.add_argument('--engine', choices=ENGINES, default=PYTHON_ENGINE,
+                        help="processing engine of every file.")
+    parser.add_argument('--reader', choices=READERS, default=CSV_READER,
+                        help="reader of the share rows.")
+    parser.add_argument('--layout', choices=LAYOUTS, default=WIDE_LAYOUT,
+                        help="layout of the CSV files: a column per company, or a "
+                        "Year,Month,Company,Price row per company and month.")
+    parser.add_argument('--top', type=int, default=1, dest='topCount',
+                        help="number of highest months per company.")
+    parser.add_argument('--max-ties', type=int, default=None, dest='tieLimit',
+                        help="keep only the first and the last MAX_TIES months tied at the "
+                        "max share value of a company, and count the others.")
+    parser.add_argument('--decimals', type=int, default=0, dest='priceDecimals',
+                        help="decimal places of the share prices, eg. 2 for 123.45.")
+    parser.add_argument('--statistic', action='append', choices=sorted(AGGREGATORS),
+                        default=[], dest='aggregatorNames',
+                        help="other statistic of every company, computed in the same pass "
+                        "as the max share values, in file order. Can be repeated. Not "
+                        "supported with incremental processing.")
+    parser.add_argument('--trusted', action='store_true',
+                        help="the files are trusted feeds, already verified by an earlier "
+                        "run: their rows are not checked, only converted.")
+    parser.add_argument('--by-year', action='store_true', dest='groupByYear',
+                        help="also list for each company the months in which the share "
+                        "price was highest in every year.")
+    parser.add_argument('--peak-months', action='store_true', dest='indexPeaks',
+                        help="also list the number of companies whose share price was "
+                        "highest in every month, and the clusters of these months.")
+    parser.add_argument('--max-errors', type=int, default=None, dest='maxErrors',
+                        help="summarize the errors of every file by type and company, "
+                        "keeping the details of the first MAX_ERRORS.")
+    parser.add_argument('--stats', action='store_true', dest='collectStats',
+                        help="print the time of every processing phase and the row, cell "
+                        "and tie counters of every file.")
+    parser.add_argument('--format', choices=OUTPUT_FORMATS, default=TEXT_FORMAT,
+                        dest='outputFormat',
+                        help="format of the results. csv, jsonl and json are streamed "
+                        "one company at a time and the messages go to stderr.")
+    parser.add_argument('--output', default=None, dest='outputPath',
+                        help="file the csv, jsonl or json results are written to. "
+                        "Defaults to stdout.")
+    parser.add_argument('--compile', action='store_true', dest='compileStores',
+                        help="compile every CSV file into a binary shares store, "
+                        "CSV%s, that can be processed instead of the CSV." %STORE_EXTENSION)
+    parser.add_argument('--parse-cache', action='store_true', dest='parseCache',
+                        help="keep the parsed CSV files picked from the menu in a cache "
+                        "directory of the user, %s." %DEFAULT_CACHE_DIR)
+    return parser.parse_args(argumentList)
+
+
+def processBatch(arguments):
+    """
+    Process the CSV files of the command line concurrently and print the
+    combined report. Exits with status 1 if any file was aborted.
+    """
+    csvPaths = expandCsvPaths(arguments.csvPaths)
+    try:
+        sharesOptions = {'engine': arguments.engine,
+                         'reader': arguments.reader,
+                         'topCount': arguments.topCount,
+                         'priceDecimals': arguments.priceDecimals,
+                         'layout': arguments.layout,
+                         'aggregators': getAggregatorClasses(arguments.aggregatorNames),
+                         'groupByYear': arguments.groupByYear,
+                         'trusted': arguments.trusted,
+                         'tieLimit': arguments.tieLimit,
+                         'indexPeaks': arguments.indexPeaks}
+        resultList, wallSeconds = processCsvFiles(csvPaths, arguments.processes,
+                                                  arguments.maxErrors, arguments.collectStats,
+                                                  **sharesOptions)
+    except CsvError, e:
+        print "\nInvalid batch options: \n\t%s" %e
+        sys.exit(2)
+
+    if arguments.outputFormat == TEXT_FORMAT:
+        displayBatchReport(resultList, wallSeconds)
+    else:
+        try:
+            resultWriter = openResultWriter(arguments.outputFormat, arguments.outputPath)
+        except IOError, e:
+            print "\nCould not open the output file: %s \n\t%s" %(arguments.outputPath, e)
+            sys.exit(2)
+        for result in resultList:
+            result.writeResult(resultWriter)
+        resultWriter.close()
+
+    if [result for result in resultList if result.abortMessage is not None]:
+        sys.exit(1)
+
+
+def compileStores(arguments):
+    """
+    Compile the CSV files of the command line into shares stores next to them.
+    Exits with status 1 if any file could not be compiled.
+    """
+    failed = False
+    for csvPath in expandCsvPaths(arguments.csvPaths):
+        try:
+            storePath = compileSharesStore(csvPath, reader=arguments.reader,
+                                           priceDecimals=arguments.priceDecimals)
+        except CsvError, e:
+            print "\nCould not compile CSV file: %s \n\t%s" %(csvPath, e)
+            failed = True
+        except (IOError, OSError), e:
+            print "\nCould not write the shares store of CSV file: %s \n\t%s" %(csvPath, e)
+            failed = True
+        else:
+            print "Compiled CSV file: %s into shares store: %s" %(csvPath, storePath)
+
+    if failed:
+        sys.exit(1)
+
                   
 def displayMainMenu():
 
@@ -49,7 +213,7 @@ def displayMainMenu():
 
 
 def processCsvDataDisplayResults(filePath):
-    sharesInfo = SharesInfo(filePath)
+    sharesInfo = SharesInfo(filePath, cache=PARSED_DATA_CACHE, resultCache=RESULT_CACHE)
     sharesInfo.processCsvFile()
     displayMainMenu()
     
@@ -0,0 +1,308 @@
+#!/usr/bin/env python
+
+import math
+
+#import classes, functions and constants from company_shares module
+from company_shares import ShareAggregator
+from company_shares import CsvError
+from company_shares import NO_TIME_KEY
+from company_shares import formatShareValue
+from company_shares import formatTimeKey
+
+# CONSTANTS
+# value of a statistic of a company without any valid share value
+NO_RESULT = 'NA'
+
+# decimal places of the mean and standard deviation beyond those of the share prices
+EXTRA_DECIMALS = 2
+
+
+class MinShareAggregator(ShareAggregator):
+    """
+    class to find the lowest share value of a company and its first month in
+    file order. Result: (shareValue, timeKey) or None.
+    """
+    name = 'min'
+
+    def __init__(self):
+        self.minShareValue = None
+        self.timeKey = NO_TIME_KEY
+
+
+    def update(self, timeKey, shareValue):
+        if self.minShareValue is None or shareValue < self.minShareValue:
+            self.minShareValue = shareValue
+            self.timeKey = timeKey
+
+
+    def merge(self, otherAggregator):
+        if otherAggregator.minShareValue is not None:
+            self.update(otherAggregator.timeKey, otherAggregator.minShareValue)
+
+
+    def getResult(self):
+        if self.minShareValue is None:
+            return None
+        return self.minShareValue, self.timeKey
+
+
+    def formatResult(self, priceDecimals=0):
+        if self.minShareValue is None:
+            return NO_RESULT
+        return _formatMonthValue(self.minShareValue, self.timeKey, priceDecimals)
+
+
+class MeanShareAggregator(ShareAggregator):
+    """
+    class to find the mean share value of a company. The count and the sum of
+    the share values are kept as integers, so that merging is exact.
+    Result: the mean as a float, scaled like the share values, or None.
+    """
+    name = 'mean'
+
+    def __init__(self):
+        self.shareCount = 0
+        self.shareTotal = 0
+
+
+    def update(self, timeKey, shareValue):
+        self.shareCount+= 1
+        self.shareTotal+= shareValue
+
+
+    def updateColumn(self, timeKeys, shareValues):
+        self.shareCount+= len(shareValues)
+        self.shareTotal+= sum(shareValues)
+
+
+    def merge(self, otherAggregator):
+        self.shareCount+= otherAggregator.shareCount
+        self.shareTotal+= otherAggregator.shareTotal
+
+
+    def getResult(self):
+        if not self.shareCount:
+            return None
+        return float(self.shareTotal) / self.shareCount
+
+
+    def formatResult(self, priceDecimals=0):
+        return _formatFloatValue(self.getResult(), priceDecimals)
+
+
+class StdShareAggregator(MeanShareAggregator):
+    """
+    class to find the population standard deviation of the share values of a
+    company from the integer count, sum and sum of squares of the share values.
+    Result: the standard deviation as a float, scaled like the share values,
+    or None.
+    """
+    name = 'std'
+
+    def __init__(self):
+        MeanShareAggregator.__init__(self)
+        self.squareTotal = 0
+
+
+    def update(self, timeKey, shareValue):
+        self.shareCount+= 1
+        self.shareTotal+= shareValue
+        self.squareTotal+= shareValue * shareValue
+
+
+    def updateColumn(self, timeKeys, shareValues):
+        MeanShareAggregator.updateColumn(self, timeKeys, shareValues)
+        self.squareTotal+= sum([shareValue * shareValue for shareValue in shareValues])
+
+
+    def merge(self, otherAggregator):
+        MeanShareAggregator.merge(self, otherAggregator)
+        self.squareTotal+= otherAggregator.squareTotal
+
+
+    def getResult(self):
+        if not self.shareCount:
+            return None
+        # the variance numerator is exact with integers, so it is never negative.
+        varianceTotal = self.shareCount * self.squareTotal - self.shareTotal * self.shareTotal
+        return math.sqrt(varianceTotal) / self.shareCount
+
+
+class FirstShareAggregator(ShareAggregator):
+    """
+    class to find the share value of the chronologically first month of a
+    company, the first one in file order if the month is repeated.
+    Result: (shareValue, timeKey) or None.
+    """
+    name = 'first'
+
+    def __init__(self):
+        self.shareValue = None
+        self.timeKey = NO_TIME_KEY
+
+
+    def update(self, timeKey, shareValue):
+        if self.shareValue is None or self._replaces(timeKey):
+            self.shareValue = shareValue
+            self.timeKey = timeKey
+
+
+    def _replaces(self, timeKey):
+        return timeKey < self.timeKey
+
+
+    def merge(self, otherAggregator):
+        if otherAggregator.shareValue is not None:
+            self.update(otherAggregator.timeKey, otherAggregator.shareValue)
+
+
+    def getResult(self):
+        if self.shareValue is None:
+            return None
+        return self.shareValue, self.timeKey
+
+
+    def formatResult(self, priceDecimals=0):
+        if self.shareValue is None:
+            return NO_RESULT
+        return _formatMonthValue(self.shareValue, self.timeKey, priceDecimals)
+
+
+class LastShareAggregator(FirstShareAggregator):
+    """
+    class to find the share value of the chronologically last month of a
+    company, the last one in file order if the month is repeated.
+    Result: (shareValue, timeKey) or None.
+    """
+    name = 'last'
+
+    def _replaces(self, timeKey):
+        return timeKey >= self.timeKey
+
+
+class DrawdownShareAggregator(ShareAggregator):
+    """
+    class to find the maximum drawdown of a company, the largest fall of the
+    share value from a peak to a trough that comes after it in the file. The
+    rows are taken in file order, like every aggregator, and are not sorted by
+    their time keys: the drawdown is the chronological one only if the file is
+    in chronological order. The highest and lowest share values so far are kept
+    too, so that the drawdown across two merged parts of a file is the peak of
+    the first part minus the trough of the second one.
+    Among equal drawdowns, the one with the earliest trough is kept.
+    Result: (drawdown, peakTimeKey, troughTimeKey), (0, NO_TIME_KEY, NO_TIME_KEY)
+    if the share value never falls, or None. Displayed as
+    'value peakYear peakMonth troughYear troughMonth', eg. '5 1990 Feb 1991 Mar'.
+    """
+    name = 'drawdown'
+
+    def __init__(self):
+        self.peakValue = None
+        self.peakKey = NO_TIME_KEY
+        self.troughValue = None
+        self.troughKey = NO_TIME_KEY
+        self.drawdown = (0, NO_TIME_KEY, NO_TIME_KEY)
+
+
+    def update(self, timeKey, shareValue):
+        if self.peakValue is None:
+            self.peakValue = self.troughValue = shareValue
+            self.peakKey = self.troughKey = timeKey
+            return
+
+        if shareValue > self.peakValue:
+            self.peakValue = shareValue
+            self.peakKey = timeKey
+        elif self.peakValue - shareValue > self.drawdown[0]:
+            self.drawdown = (self.peakValue - shareValue, self.peakKey, timeKey)
+        if shareValue < self.troughValue:
+            self.troughValue = shareValue
+            self.troughKey = timeKey
+
+
+    def merge(self, otherAggregator):
+        if otherAggregator.peakValue is None:
+            return
+        if self.peakValue is None:
+            self.__dict__.update(otherAggregator.__dict__)
+            return
+
+        drawdownList = [self.drawdown, otherAggregator.drawdown,
+                        (self.peakValue - otherAggregator.troughValue, self.peakKey,
+                         otherAggregator.troughKey)]
+        self.drawdown = min(drawdownList, key=lambda drawdown: (-drawdown[0], drawdown[2],
+                                                                drawdown[1]))
+        if self.drawdown[0] <= 0:
+            self.drawdown = (0, NO_TIME_KEY, NO_TIME_KEY)
+
+        if otherAggregator.peakValue > self.peakValue:
+            self.peakValue = otherAggregator.peakValue
+            self.peakKey = otherAggregator.peakKey
+        if otherAggregator.troughValue < self.troughValue:
+            self.troughValue = otherAggregator.troughValue
+            self.troughKey = otherAggregator.troughKey
+
+
+    def getResult(self):
+        if self.peakValue is None:
+            return None
+        return self.drawdown
+
+
+    def formatResult(self, priceDecimals=0):
+        if self.peakValue is None:
+            return NO_RESULT
+        drawdown, peakKey, troughKey = self.drawdown
+        return '%s %s %s' %((_formatMonthValue(drawdown, peakKey, priceDecimals),)
+                            + formatTimeKey(troughKey))
+
+
+AGGREGATORS = dict((aggregatorClass.name, aggregatorClass) for aggregatorClass
+                   in (MinShareAggregator, MeanShareAggregator, StdShareAggregator,
+                       FirstShareAggregator, LastShareAggregator, DrawdownShareAggregator))
+
+
+def getAggregatorClasses(aggregatorNames):
+    """
+    Return the aggregator classes of statistic names, to be passed to
+    SharesInfo(csvPath, aggregators=...).
+
+    :parameters:
+        aggregatorNames: `list`
+            names of the statistics, eg. ['min', 'mean'], in display order.
+
+    :returns:
+        aggregatorClasses: `list`
+            ShareAggregator subclasses in aggregatorNames order.
+
+    :raises:
+        Exception: `CsvError`
+            if a statistic is not supported.
+
+    """
+
+    unknownNames = [aggregatorName for aggregatorName in aggregatorNames
+                    if aggregatorName not in AGGREGATORS]
+    if unknownNames:
+        raise CsvError("Statistics: %s are not supported. Supported statistics: %s"
+                       %(', '.join(unknownNames), ', '.join(sorted(AGGREGATORS))))
+    return [AGGREGATORS[aggregatorName] for aggregatorName in aggregatorNames]
+
+
+def _formatMonthValue(shareValue, timeKey, priceDecimals):
+    """
+    Return a share value followed by its year and month, eg. '10 1990 Jan'.
+    """
+
+    return '%s %s %s' %((formatShareValue(shareValue, priceDecimals),) + formatTimeKey(timeKey))
+
+
+def _formatFloatValue(value, priceDecimals):
+    """
+    Return a float scaled like the share values with EXTRA_DECIMALS more
+    decimal places than the share prices.
+    """
+
+    if value is None:
+        return NO_RESULT
+    return '%.*f' %(priceDecimals + EXTRA_DECIMALS, value / 10 ** priceDecimals)
@@ -0,0 +1,118 @@
+#!/usr/bin/env python
+
+import os
+import random
+import tempfile
+import unittest
+
+#import classes, functions and constants from shares_aggregators and company_shares modules
+from shares_aggregators import AGGREGATORS
+from shares_aggregators import getAggregatorClasses
+from company_shares import SharesInfo
+from company_shares import CsvError
+from company_shares import CsvErrorSink
+from company_shares import ENGINES
+from company_shares import NUMPY_ENGINE
+from company_shares import NO_TIME_KEY
+from company_shares import compileSharesStore
+from company_shares import getTimeKey
+from shares_batch import processCsvFiles
+
+from company_shares_test import TIES_CSV_LINES
+from company_shares_test import writeTempCsv
+from company_shares_test import captureOutput
+
+# statistics of the companies of TIES_CSV_LINES
+TIES_STATISTICS = [
+    ('Company A', [('min', (10, getTimeKey('1990', 'Jan'))), ('mean', 25.0),
+                   ('first', (10, getTimeKey('1990', 'Jan'))),
+                   ('last', (30, getTimeKey('1992', 'May'))),
+                   ('drawdown', (0, NO_TIME_KEY, NO_TIME_KEY))]),
+    ('Company B', [('min', (-1000000, getTimeKey('1991', 'Mar'))), ('mean', -999999.2),
+                   ('first', (-999999, getTimeKey('1990', 'Jan'))),
+                   ('last', (-999999, getTimeKey('1992', 'May'))),
+                   ('drawdown', (1, getTimeKey('1990', 'Jan'), getTimeKey('1991', 'Mar')))]),
+    ('Company C', [('min', None), ('mean', None), ('first', None), ('last', None),
+                   ('drawdown', None)]),
+    ('Company D', [('min', (5, getTimeKey('1990', 'Jan'))), ('mean', 6.0),
+                   ('first', (5, getTimeKey('1990', 'Jan'))),
+                   ('last', (6, getTimeKey('1992', 'May'))),
+                   ('drawdown', (1, getTimeKey('1991', 'Mar'), getTimeKey('1992', 'May')))])]
+
+
+def getStatistics(maxShareDict):
+    """
+    return a list of (company name, statistics) from maxShareDict.
+    """
+    return [(companyName, companyObject.getStatistics().items())
+            for companyName, companyObject in maxShareDict.items()]
+
+
+class TestShareAggregators(unittest.TestCase):
+    """
+    Class for testcases for the module shares_aggregators
+    """
+
+    def setUp(self):
+        self.csvPath = writeTempCsv(TIES_CSV_LINES)
+        self.storePath = tempfile.mktemp(prefix='share_test', suffix='.store')
+        self.aggregators = getAggregatorClasses(['min', 'mean', 'first', 'last', 'drawdown'])
+
+    def tearDown(self):
+        for filePath in (self.csvPath, self.storePath):
+            if os.path.exists(filePath):
+                os.remove(filePath)
+
+    # test that every engine and the shares store give the same statistics.
+    def testStatisticsOfEveryEngine(self):
+
+        compileSharesStore(self.csvPath, self.storePath)
+        for csvPath in (self.csvPath, self.storePath):
+            for engine in ENGINES:
+                sharesInfo = SharesInfo(csvPath, engine, topCount=2, errorSink=CsvErrorSink(),
+                                        aggregators=self.aggregators)
+                self.assertEqual(getStatistics(sharesInfo._processCsvFile()), TIES_STATISTICS)
+
+        output = captureOutput(SharesInfo(self.csvPath, aggregators=self.aggregators,
+                                          errorSink=CsvErrorSink()).processCsvFile)[1]
+        self.assertTrue('Share statistics for companies:' in output)
+        self.assertTrue('-999999.20' in output)
+        self.assertTrue('1 1990 Jan 1991 Mar' in output)
+
+
+    # test that merging the aggregators of consecutive parts gives the single pass results.
+    def testMergeMatchesSinglePass(self):
+
+        randomGenerator = random.Random(5)
+        shareList = [(timeKey, randomGenerator.randint(-5, 5)) for timeKey in range(40)]
+        for aggregatorClass in AGGREGATORS.values():
+            expected = aggregatorClass()
+            for timeKey, shareValue in shareList:
+                expected.update(timeKey, shareValue)
+            for splitIndex in range(len(shareList) + 1):
+                aggregator = aggregatorClass()
+                otherAggregator = aggregatorClass()
+                aggregator.updateColumn(*zip(*shareList[:splitIndex]) or ([], []))
+                otherAggregator.updateColumn(*zip(*shareList[splitIndex:]) or ([], []))
+                aggregator.merge(otherAggregator)
+                self.assertEqual(aggregator.getResult(), expected.getResult(),
+                                 (aggregatorClass.name, splitIndex))
+
+
+    # test the unknown statistics, the incremental mode and the statistics of a batch.
+    def testStatisticErrorsAndBatch(self):
+
+        self.assertRaises(CsvError, getAggregatorClasses, ['min', 'median'])
+        sharesInfo = SharesInfo(self.csvPath, statePath=self.storePath,
+                                aggregators=self.aggregators)
+        self.assertRaises(CsvError, sharesInfo._processCsvFile)
+
+        resultList = processCsvFiles([self.csvPath], processes=1, maxErrors=0,
+                                     aggregators=self.aggregators)[0]
+        self.assertEqual(getStatistics(resultList[0].maxShareDict), TIES_STATISTICS)
+        output = captureOutput(resultList[0].displayResult)[1]
+        self.assertTrue('Share statistics for companies:' in output)
+
+
+if __name__ == '__main__':
+    unittest.main()
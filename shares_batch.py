@@ -0,0 +1,351 @@
+#!/usr/bin/env python
+
+import sys
+import glob
+import time
+import multiprocessing
+
+#import classes and constants from company_shares module
+from company_shares import SharesInfo
+from company_shares import CsvError
+from company_shares import CsvErrorSink
+from company_shares import ProcessingStats
+from company_shares import CHECK_PHASE
+from company_shares import DISPLAY_PHASE
+from company_shares import PYTHON_ENGINE
+from company_shares import CHUNKED_ENGINE
+from company_shares import SHARDED_ENGINE
+from company_shares import CSV_ERROR_FORMAT
+
+# CONSTANTS
+FILE_HEADER = "CSV FILE"
+STATUS_HEADER = "STATUS"
+SECONDS_HEADER = "SECONDS"
+STATUS_OK = "OK"
+STATUS_ABORTED = "ABORTED"
+
+# keyword arguments of SharesInfo that can be given to processCsvFiles. The
+# error sink and the stats of every file are set by the batch itself.
+BATCH_OPTIONS = ('engine', 'reader', 'topCount', 'priceDecimals', 'layout', 'aggregators',
+                 'groupByYear', 'trusted', 'tieLimit', 'indexPeaks')
+
+
+class BatchResult():
+    """
+    class to store the result of processing one CSV file of a batch.
+    """
+    def __init__(self, csvPath, sharesOptions=None):
+        """
+        initialize the result of a CSV file.
+
+        :parameters:
+            csvPath: `string`
+                path of the CSV file.
+
+            sharesOptions: `dict`
+                keyword arguments of SharesInfo the file is processed with,
+                eg. {'topCount': 2, 'priceDecimals': 2}. See BATCH_OPTIONS.
+
+        :returns:
+            None
+
+        :raises:
+            None
+
+        """
+
+        self.csvPath = csvPath
+        self.sharesOptions = dict(sharesOptions or {})
+        self.priceDecimals = self.sharesOptions.get('priceDecimals', 0)
+
+        # dictionary with company name as keys and Company() objects as values.
+        # None if processing was aborted.
+        self.maxShareDict = None
+
+        # PeakMonthIndex() of the companies, if indexPeaks is set and the file
+        # was processed.
+        self.peakMonthIndex = None
+
+        # messages of the ignored rows and cells
+        self.errorMessages = []
+
+        # CsvErrorSink() with the errors instead of errorMessages, if one was requested.
+        self.errorSink = None
+
+        # ProcessingStats() of the file, if stats were requested.
+        self.stats = None
+
+        # reason why processing was aborted, None if it was not.
+        self.abortMessage = None
+
+        # wall clock seconds spent on the file
+        self.seconds = 0.0
+
+
+    def displayResult(self):
+        """
+        Print the error messages and the results, or the abort reason, of the
+        CSV file in the same layout as SharesInfo.processCsvFile.
+        """
+
+        print "\n\nResults for CSV file: %s" %self.csvPath
+        print "===========================================\n"
+        for errorMessage in self.errorMessages:
+            print CSV_ERROR_FORMAT %(errorMessage, self.csvPath)
+
+        if self.abortMessage is not None:
+            print "\n%s" %self.abortMessage
+            print "Processing Aborted!"
+            return
+
+        startTime = time.time()
+        sharesInfo = self._getSharesInfo()
+        if self.maxShareDict:
+            sharesInfo.displayResults()
+
+        if self.errorSink is not None:
+            self.errorSink.displaySummary(sharesInfo.getErrorCompanyNames(), self.csvPath)
+
+        if self.stats is not None:
+            self.stats.addPhaseTime(DISPLAY_PHASE, time.time() - startTime)
+            self.stats.displayStats(self.csvPath)
+
+
+    def writeResult(self, resultWriter):
+        """
+        Stream the results of the CSV file to resultWriter. The error messages,
+        error summary and abort reason go to stderr, so that the written results
+        can be piped to other tools.
+
+        :parameters:
+            resultWriter: `shares_output.ResultWriter`
+                writer of the results.
+
+        :returns:
+            None
+
+        :raises:
+            None
+
+        """
+
+        stdout = sys.stdout
+        sys.stdout = sys.stderr
+        try:
+            for errorMessage in self.errorMessages:
+                print CSV_ERROR_FORMAT %(errorMessage, self.csvPath)
+            if self.abortMessage is not None:
+                print "\nInvalid CSV file: %s \n\t%s" %(self.csvPath, self.abortMessage)
+            elif self.errorSink is not None:
+                self.errorSink.displaySummary(self._getSharesInfo().getErrorCompanyNames(),
+                                              self.csvPath)
+        finally:
+            sys.stdout = stdout
+
+        startTime = time.time()
+        if self.maxShareDict:
+            resultWriter.writeResults(self.maxShareDict, self.csvPath, self.priceDecimals)
+
+        if self.stats is not None and self.abortMessage is None:
+            self.stats.addPhaseTime(DISPLAY_PHASE, time.time() - startTime)
+            stdout = sys.stdout
+            sys.stdout = sys.stderr
+            try:
+                self.stats.displayStats(self.csvPath)
+            finally:
+                sys.stdout = stdout
+
+
+    def _getSharesInfo(self):
+        """
+        Return a SharesInfo holding the results of the CSV file, to display them.
+        """
+
+        sharesInfo = SharesInfo(self.csvPath, **self.sharesOptions)
+        sharesInfo.maxShareDict = self.maxShareDict
+        sharesInfo.peakMonthIndex = self.peakMonthIndex
+        return sharesInfo
+
+
+def expandCsvPaths(patternList):
+    """
+    Expand the glob patterns of the list into sorted file paths. A pattern
+    without any match is kept as it is, so that its error is reported.
+
+    :parameters:
+        patternList: `list`
+            file paths or glob patterns, eg. ['prices/*.csv', 'nyse.csv'].
+
+    :returns:
+        csvPaths: `list`
+            file paths in pattern order, without duplicates.
+
+    :raises:
+        None
+
+    """
+
+    csvPaths = []
+    for pattern in patternList:
+        matchList = sorted(glob.glob(pattern)) or [pattern]
+        for csvPath in matchList:
+            if csvPath not in csvPaths:
+                csvPaths.append(csvPath)
+    return csvPaths
+
+
+def processCsvFiles(csvPaths, processes=None, maxErrors=None, collectStats=False,
+                    **sharesOptions):
+    """
+    Process the CSV files concurrently on a pool of worker processes, one
+    SharesInfo per file. An invalid file only aborts its own result.
+
+    :parameters:
+        csvPaths: `list`
+            paths of the CSV files.
+
+        processes: `int`
+            number of worker processes. Defaults to the number of CPUs.
+
+        maxErrors: `int`
+            if set, the errors of every file are collected in a CsvErrorSink
+            keeping the first maxErrors of them in detail, and summarized
+            instead of listed.
+
+        collectStats: `bool`
+            if True, the phase times and counters of every file are collected
+            in a ProcessingStats and displayed with its results.
+
+        sharesOptions: `dict`
+            keyword arguments of SharesInfo every file is processed with, one of
+            BATCH_OPTIONS, eg. engine=NUMPY_ENGINE, topCount=2. They are passed
+            to the worker processes as they are. The engines using their own
+            worker processes cannot be used, as pool workers cannot start
+            processes.
+
+    :returns:
+        (resultList, wallSeconds): `tuple`
+            BatchResult() of every file in csvPaths order and the wall clock
+            seconds of the whole batch.
+
+    :raises:
+        Exception: `CsvError`
+            if an option is not one of BATCH_OPTIONS
+            OR
+            if the engine starts its own worker processes
+            OR
+            if options that cannot be used together are set.
+
+    """
+
+    unknownOptions = sorted(set(sharesOptions) - set(BATCH_OPTIONS))
+    if unknownOptions:
+        raise CsvError("Options: %s cannot be used to process a batch of files. "
+                       "Supported options: %s" %(', '.join(unknownOptions),
+                                                 ', '.join(BATCH_OPTIONS)))
+    engine = sharesOptions.get('engine', PYTHON_ENGINE)
+    if engine in (CHUNKED_ENGINE, SHARDED_ENGINE):
+        raise CsvError("Engine: %s cannot be used to process a batch of files." %engine)
+    # the options that cannot be used together are rejected before any file is read.
+    SharesInfo(**sharesOptions)
+
+    startTime = time.time()
+    taskList = [(csvPath, maxErrors, collectStats, sharesOptions) for csvPath in csvPaths]
+    if not taskList:
+        return [], 0.0
+
+    pool = multiprocessing.Pool(min(processes or multiprocessing.cpu_count(), len(taskList)))
+    try:
+        resultList = pool.map(_processBatchFile, taskList)
+    finally:
+        pool.close()
+        pool.join()
+
+    return resultList, time.time() - startTime
+
+
+def displayBatchReport(resultList, wallSeconds):
+    """
+    Print the combined report of a batch: the results of every file followed
+    by a summary with the status and time of every file and the total times.
+
+    :parameters:
+        resultList: `list`
+            BatchResult() objects as returned by processCsvFiles.
+
+        wallSeconds: `float`
+            wall clock seconds of the whole batch.
+
+    :returns:
+        None
+
+    :raises:
+        None
+
+    """
+
+    for result in resultList:
+        result.displayResult()
+
+    print "\n\nBatch summary:"
+    print "===========================================\n"
+    print "%-50s %10s %12s"%(FILE_HEADER, STATUS_HEADER, SECONDS_HEADER)
+    for result in resultList:
+        status = STATUS_OK if result.abortMessage is None else STATUS_ABORTED
+        print "%-50s %10s %12.3f"%(result.csvPath, status, result.seconds)
+
+    abortedCount = len([result for result in resultList if result.abortMessage is not None])
+    print "\nFiles processed: %s, aborted: %s" %(len(resultList), abortedCount)
+    print "Total time of the files: %.3f seconds" %sum(result.seconds for result in resultList)
+    print "Wall clock time: %.3f seconds" %wallSeconds
+
+
+def _processBatchFile(taskInfo):
+    """
+    Worker function of processCsvFiles. Processes one CSV file and collects the
+    error messages instead of printing them. Any error while processing the
+    file aborts its own result only.
+
+    :parameters:
+        taskInfo: `tuple`
+            (csvPath, maxErrors, collectStats, sharesOptions)
+
+    :returns:
+        result: `BatchResult`
+            result of the CSV file.
+
+    """
+
+    csvPath, maxErrors, collectStats, sharesOptions = taskInfo
+    result = BatchResult(csvPath, sharesOptions)
+    if maxErrors is not None:
+        result.errorSink = CsvErrorSink(maxErrors)
+    if collectStats:
+        result.stats = ProcessingStats()
+    startTime = time.time()
+
+    try:
+        sharesInfo = SharesInfo(csvPath, errorSink=result.errorSink, stats=result.stats,
+                                **sharesOptions)
+        sharesInfo.errorMessages = result.errorMessages
+        try:
+            sharesInfo.checkCsvPath(csvPath)
+        except CsvError, e:
+            raise CsvError("Invalid CSV file path: %s \n\t%s" %(csvPath, e))
+        sharesInfo._addPhaseTime(CHECK_PHASE, startTime)
+        try:
+            result.maxShareDict = sharesInfo._processCsvFile()
+            result.peakMonthIndex = sharesInfo.peakMonthIndex
+        except CsvError, e:
+            raise CsvError("Invalid data in CSV file: %s \n\t%s" %(csvPath, e))
+    except CsvError, e:
+        result.abortMessage = str(e)
+    except (IOError, OSError), e:
+        result.abortMessage = "Could not read CSV file: %s \n\t%s" %(csvPath, e)
+    except Exception, e:
+        result.maxShareDict = None
+        result.abortMessage = "Unexpected error in CSV file: %s \n\t%s: %s" \
+            %(csvPath, e.__class__.__name__, e)
+
+    result.seconds = time.time() - startTime
+    return result
@@ -0,0 +1,99 @@
+#!/usr/bin/env python
+
+import os
+import unittest
+
+#import functions from shares_batch and company_shares modules
+from shares_batch import expandCsvPaths
+from shares_batch import processCsvFiles
+from shares_batch import displayBatchReport
+from shares_batch import _processBatchFile
+from company_shares import SharesInfo
+from company_shares import CsvError
+from company_shares import CHUNKED_ENGINE
+from company_shares import NUMPY_ENGINE
+from company_shares import LONG_LAYOUT
+
+from company_shares_test import TEST_CSV_PATH
+from company_shares_test import TIES_CSV_LINES
+from company_shares_test import writeTempCsv
+from company_shares_test import captureOutput
+from company_shares_test import getMaxShareLists
+
+# header only CSV file shipped with the tool
+INVALID_HEADER_CSV_PATH = os.path.join(os.path.dirname(TEST_CSV_PATH),
+                                       'invalid_header_test_data.csv')
+
+
+class TestSharesBatch(unittest.TestCase):
+    """
+    Class for testcases for the module shares_batch
+    """
+
+    def setUp(self):
+        self.csvPath = writeTempCsv(TIES_CSV_LINES)
+
+    def tearDown(self):
+        os.remove(self.csvPath)
+
+    # test expandCsvPaths with a glob pattern and a path without match.
+    def testExpandCsvPaths(self):
+
+        pattern = os.path.join(os.path.dirname(TEST_CSV_PATH), '*_test_data.csv')
+        csvPaths = expandCsvPaths([pattern, 'missing.csv', INVALID_HEADER_CSV_PATH])
+        self.assertTrue(INVALID_HEADER_CSV_PATH in csvPaths)
+        self.assertEqual(csvPaths.count(INVALID_HEADER_CSV_PATH), 1)
+        self.assertEqual(csvPaths[-1], 'missing.csv')
+
+
+    # test processCsvFiles isolates the errors of every file.
+    def testProcessCsvFilesWithInvalidFiles(self):
+
+        csvPaths = [self.csvPath, 'missing.csv', INVALID_HEADER_CSV_PATH]
+        resultList, wallSeconds = processCsvFiles(csvPaths, processes=2)
+        expected = captureOutput(SharesInfo(self.csvPath)._processCsvFile)[0]
+
+        self.assertEqual([result.csvPath for result in resultList], csvPaths)
+        self.assertEqual(getMaxShareLists(resultList[0].maxShareDict),
+                         getMaxShareLists(expected))
+        self.assertEqual(len(resultList[0].errorMessages), 6)
+        self.assertEqual(resultList[0].abortMessage, None)
+        self.assertTrue('does not exist' in resultList[1].abortMessage)
+        self.assertTrue('Month1' in resultList[2].abortMessage)
+
+        output = captureOutput(displayBatchReport, resultList, wallSeconds)[1]
+        self.assertTrue('Files processed: 3, aborted: 2' in output)
+
+
+    # test processCsvFiles with an engine that starts its own processes, an
+    # unknown option and options that cannot be used together.
+    def testProcessCsvFilesWithChunkedEngine(self):
+
+        self.assertRaises(CsvError, processCsvFiles, [self.csvPath], 1,
+                          engine=CHUNKED_ENGINE)
+        self.assertRaises(CsvError, processCsvFiles, [self.csvPath], 1, errorSink=None)
+        self.assertRaises(CsvError, processCsvFiles, [self.csvPath], 1,
+                          engine=NUMPY_ENGINE, layout=LONG_LAYOUT)
+
+
+    # test _processBatchFile aborts only its own result on an unexpected error.
+    def testProcessBatchFileWithUnexpectedError(self):
+
+        def raiseValueError(sharesInfo):
+            raise ValueError("corrupt store")
+
+        processCsvFile = SharesInfo._processCsvFile
+        SharesInfo._processCsvFile = raiseValueError
+        try:
+            result = _processBatchFile((self.csvPath, None, False, {'topCount': 2}))
+        finally:
+            SharesInfo._processCsvFile = processCsvFile
+
+        self.assertEqual(result.maxShareDict, None)
+        self.assertTrue('ValueError: corrupt store' in result.abortMessage)
+        output = captureOutput(displayBatchReport, [result], 0.0)[1]
+        self.assertTrue('Files processed: 1, aborted: 1' in output)
+
+
+if __name__ == '__main__':
+    unittest.main()
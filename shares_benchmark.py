@@ -0,0 +1,453 @@
+#!/usr/bin/env python
+
+import os
+import sys
+import time
+import json
+import random
+import argparse
+import tempfile
+import multiprocessing
+
+# resource is only available on unix. Without it the peak memory is not measured.
+try:
+    import resource
+except ImportError:
+    resource = None
+
+#import classes and constants from company_shares module
+from company_shares import SharesInfo
+from company_shares import CsvError
+from company_shares import ENGINES
+from company_shares import READERS
+from company_shares import NUMPY_ENGINE
+from company_shares import CSV_READER
+from company_shares import MIN_YEAR
+from company_shares import MONTH_NAMES
+from company_shares import numpy
+
+# CONSTANTS
+# file shapes of the benchmark: (name, number of companies, number of months)
+BENCHMARK_SHAPES = (('small', 10, 1000),
+                    ('tall', 10, 100000),
+                    ('wide', 1000, 1000),
+                    ('square', 300, 10000))
+
+# rates of the generated anomalies, per row or per cell
+DEFAULT_TIE_RATE = 0.01
+DEFAULT_BAD_CELL_RATE = 0.001
+DEFAULT_SHORT_ROW_RATE = 0.001
+DEFAULT_LONG_ROW_RATE = 0.001
+DEFAULT_OLD_YEAR_RATE = 0.001
+
+MAX_SHARE_VALUE = 100000
+BAD_CELL_VALUE = 'n/a'
+GENERATED_ROWS_PER_WRITE = 1000
+DEFAULT_REPEAT = 3
+DEFAULT_RESULTS_PATH = 'benchmark_results.json'
+RESULTS_FORMAT_VERSION = 1
+
+
+def generateSharesCsv(csvPath, companyCount, monthCount, seed=0, tieRate=DEFAULT_TIE_RATE,
+                      badCellRate=DEFAULT_BAD_CELL_RATE, shortRowRate=DEFAULT_SHORT_ROW_RATE,
+                      longRowRate=DEFAULT_LONG_ROW_RATE, oldYearRate=DEFAULT_OLD_YEAR_RATE):
+    """
+    Write a synthetic CSV file of companyCount companies x monthCount months.
+    The months follow each other from January of MIN_YEAR. The same arguments
+    always give the same file.
+
+    :parameters:
+        csvPath: `string`
+            path of the CSV file to write.
+
+        companyCount: `int`
+            number of company columns.
+
+        monthCount: `int`
+            number of share rows.
+
+        seed: `int`
+            seed of the random share values and anomalies.
+
+        tieRate: `float`
+            rate of the cells repeating the current max value of their company.
+
+        badCellRate: `float`
+            rate of the cells that are not a number.
+
+        shortRowRate, longRowRate: `float`
+            rates of the rows with a missing or an extra share value.
+
+        oldYearRate: `float`
+            rate of the rows with a year before MIN_YEAR.
+
+    :returns:
+        None
+
+    :raises:
+        Exception: `IOError`
+            if the CSV file cannot be written.
+
+    """
+
+    randomGenerator = random.Random(seed)
+    maxValues = [0] * companyCount
+
+    csvFile = open(csvPath, 'wb')
+    try:
+        csvFile.write('Year,Month,%s\n' %','.join('Company %s' %(companyIndex + 1)
+                                                  for companyIndex in range(companyCount)))
+        lineList = []
+        for monthIndex in range(monthCount):
+            year = MIN_YEAR + monthIndex // 12
+            if randomGenerator.random() < oldYearRate:
+                year = MIN_YEAR - 1 - monthIndex % 10
+
+            cellList = [str(year), MONTH_NAMES[monthIndex % 12]]
+            for companyIndex in range(companyCount):
+                if randomGenerator.random() < badCellRate:
+                    cellList.append(BAD_CELL_VALUE)
+                    continue
+                if randomGenerator.random() < tieRate and maxValues[companyIndex]:
+                    shareValue = maxValues[companyIndex]
+                else:
+                    shareValue = randomGenerator.randint(1, MAX_SHARE_VALUE)
+                    maxValues[companyIndex] = max(maxValues[companyIndex], shareValue)
+                cellList.append(str(shareValue))
+
+            rowRandom = randomGenerator.random()
+            if rowRandom < shortRowRate:
+                cellList.pop()
+            elif rowRandom < shortRowRate + longRowRate:
+                cellList.append('1')
+
+            lineList.append(','.join(cellList))
+            if len(lineList) >= GENERATED_ROWS_PER_WRITE:
+                csvFile.write('\n'.join(lineList) + '\n')
+                lineList = []
+
+        if lineList:
+            csvFile.write('\n'.join(lineList) + '\n')
+    finally:
+        csvFile.close()
+
+
+def runBenchmark(csvPath, companyCount, monthCount, engine, reader=CSV_READER, workers=None,
+                 repeat=DEFAULT_REPEAT):
+    """
+    Process a CSV file with an engine and reader repeat times, every time in a
+    new process so that its peak memory is measured on its own.
+    The error messages printed while processing go to os.devnull.
+
+    :parameters:
+        csvPath: `string`
+            path of the CSV file.
+
+        companyCount, monthCount: `int`
+            shape of the CSV file.
+
+        engine: `string`
+            processing engine. One of company_shares.ENGINES.
+
+        reader: `string`
+            reader of the share rows. One of company_shares.READERS.
+
+        workers: `int`
+            number of worker processes of the parallel engines.
+
+        repeat: `int`
+            number of runs. The fastest run is kept.
+
+    :returns:
+        benchmarkResult: `dict`
+            engine, reader, seconds of the fastest run, rowsPerSecond,
+            cellsPerSecond and peakMemoryKb, the highest resident memory of a
+            run and its worker processes. peakMemoryKb is None without the
+            resource module.
+
+    :raises:
+        None
+
+    """
+
+    secondsList = []
+    peakMemoryList = []
+    for runIndex in range(repeat):
+        pool = multiprocessing.Pool(1)
+        try:
+            seconds, peakMemoryKb = pool.apply(_runBenchmarkCase,
+                                               ((csvPath, engine, reader, workers),))
+        finally:
+            pool.close()
+            pool.join()
+        secondsList.append(seconds)
+        peakMemoryList.append(peakMemoryKb)
+
+    seconds = max(min(secondsList), 1e-9)
+    peakMemoryKb = None
+    if resource is not None:
+        peakMemoryKb = max(peakMemoryList)
+    return {'engine': engine,
+            'reader': reader,
+            'seconds': seconds,
+            'rowsPerSecond': monthCount / seconds,
+            'cellsPerSecond': monthCount * companyCount / seconds,
+            'peakMemoryKb': peakMemoryKb}
+
+
+def runBenchmarkSuite(shapeList=BENCHMARK_SHAPES, engineList=ENGINES, readerList=READERS,
+                      workers=None, repeat=DEFAULT_REPEAT, dataDir=None, seed=0):
+    """
+    Generate a CSV file for every shape and benchmark every engine and reader
+    on it. The generated files are removed at the end.
+
+    :parameters:
+        shapeList: `list`
+            (name, companyCount, monthCount) of the files, eg. BENCHMARK_SHAPES.
+
+        engineList, readerList: `list`
+            engines and readers to benchmark. The numpy engine is skipped if
+            numpy is not installed.
+
+        workers: `int`
+            number of worker processes of the parallel engines.
+
+        repeat: `int`
+            number of runs of every case.
+
+        dataDir: `string`
+            directory of the generated files. Defaults to the temporary directory.
+
+        seed: `int`
+            seed of the generated files.
+
+    :returns:
+        resultList: `list`
+            result dictionary of every case as returned by runBenchmark, with
+            the shape name, companies and months.
+
+    :raises:
+        None
+
+    """
+
+    resultList = []
+    for shapeName, companyCount, monthCount in shapeList:
+        fileHandle, csvPath = tempfile.mkstemp(prefix='share_benchmark_%s' %shapeName,
+                                               suffix='.csv', dir=dataDir)
+        os.close(fileHandle)
+        try:
+            generateSharesCsv(csvPath, companyCount, monthCount, seed)
+            for engine in engineList:
+                if engine == NUMPY_ENGINE and numpy is None:
+                    continue
+                for reader in readerList:
+                    benchmarkResult = runBenchmark(csvPath, companyCount, monthCount, engine,
+                                                   reader, workers, repeat)
+                    benchmarkResult.update({'shape': shapeName,
+                                            'companies': companyCount,
+                                            'months': monthCount})
+                    resultList.append(benchmarkResult)
+        finally:
+            os.remove(csvPath)
+    return resultList
+
+
+def saveResults(resultList, resultsPath, label=''):
+    """
+    Save the results of a benchmark suite run as JSON, with a label, eg. the
+    version of the tool, to compare them with a later run.
+
+    :parameters:
+        resultList: `list`
+            results as returned by runBenchmarkSuite.
+
+        resultsPath: `string`
+            path of the JSON file.
+
+        label: `string`
+            label of the run.
+
+    :returns:
+        None
+
+    :raises:
+        Exception: `IOError`
+            if the file cannot be written.
+
+    """
+
+    resultsFile = open(resultsPath, 'wb')
+    try:
+        json.dump({'version': RESULTS_FORMAT_VERSION,
+                   'label': label,
+                   'time': time.strftime('%Y-%m-%d %H:%M:%S'),
+                   'results': resultList}, resultsFile, indent=1, sort_keys=True)
+    finally:
+        resultsFile.close()
+
+
+def loadResults(resultsPath):
+    """
+    Load the results saved by saveResults.
+
+    :parameters:
+        resultsPath: `string`
+            path of the JSON file.
+
+    :returns:
+        (label, resultList): `tuple`
+            label and results of the saved run.
+
+    :raises:
+        Exception: `CsvError`
+            if the file is not a results file of this version.
+
+        Exception: `IOError`
+            if the file cannot be read.
+
+    """
+
+    resultsFile = open(resultsPath, 'rb')
+    try:
+        savedData = json.load(resultsFile)
+    except ValueError, e:
+        raise CsvError("Invalid benchmark results file: %s \n\t%s" %(resultsPath, e))
+    finally:
+        resultsFile.close()
+
+    if not isinstance(savedData, dict) or savedData.get('version') != RESULTS_FORMAT_VERSION:
+        raise CsvError("Unsupported benchmark results file: %s" %resultsPath)
+    return savedData['label'], savedData['results']
+
+
+def displayResults(resultList, baseResultList=None):
+    """
+    Print the results of a benchmark suite run. With baseResultList, the speed
+    of every case is compared to the same case of the base run.
+
+    :parameters:
+        resultList: `list`
+            results as returned by runBenchmarkSuite.
+
+        baseResultList: `list`
+            results of an earlier run, eg. as returned by loadResults.
+
+    :returns:
+        None
+
+    :raises:
+        None
+
+    """
+
+    baseResultDict = {}
+    for baseResult in baseResultList or []:
+        baseResultDict[_getCaseKey(baseResult)] = baseResult
+
+    print "\n\nBenchmark results:"
+    print "===========================================\n"
+    print "%-8s %10s %10s %8s %6s %10s %14s %14s %12s %9s"%('SHAPE', 'COMPANIES', 'MONTHS',
+                                                             'ENGINE', 'READER', 'SECONDS',
+                                                             'ROWS/SEC', 'CELLS/SEC',
+                                                             'PEAK KB', 'VS BASE')
+    for benchmarkResult in resultList:
+        baseResult = baseResultDict.get(_getCaseKey(benchmarkResult))
+        speedRatio = ''
+        if baseResult is not None:
+            speedRatio = '%.2fx' %(baseResult['seconds'] / benchmarkResult['seconds'])
+        peakMemoryKb = benchmarkResult['peakMemoryKb']
+        print "%-8s %10s %10s %8s %6s %10.3f %14.0f %14.0f %12s %9s"%(
+            benchmarkResult['shape'], benchmarkResult['companies'], benchmarkResult['months'],
+            benchmarkResult['engine'], benchmarkResult['reader'], benchmarkResult['seconds'],
+            benchmarkResult['rowsPerSecond'], benchmarkResult['cellsPerSecond'],
+            'NA' if peakMemoryKb is None else peakMemoryKb, speedRatio)
+
+
+def _getCaseKey(benchmarkResult):
+    """
+    Return the key identifying the case of a result across runs.
+    """
+
+    return (benchmarkResult['shape'], benchmarkResult['companies'], benchmarkResult['months'],
+            benchmarkResult['engine'], benchmarkResult['reader'])
+
+
+def _runBenchmarkCase(caseInfo):
+    """
+    Worker function of runBenchmark. Processes the CSV file once.
+
+    :parameters:
+        caseInfo: `tuple`
+            (csvPath, engine, reader, workers)
+
+    :returns:
+        (seconds, peakMemoryKb): `tuple`
+            seconds spent processing and the highest resident memory of the
+            process and its worker processes in kilobytes, None without the
+            resource module.
+
+    """
+
+    csvPath, engine, reader, workers = caseInfo
+    stdout = sys.stdout
+    sys.stdout = open(os.devnull, 'w')
+    try:
+        startTime = time.time()
+        SharesInfo(csvPath, engine, workers, reader)._processCsvFile()
+        seconds = time.time() - startTime
+    finally:
+        sys.stdout.close()
+        sys.stdout = stdout
+
+    peakMemoryKb = None
+    if resource is not None:
+        peakMemoryKb = max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+                           resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+    return seconds, peakMemoryKb
+
+
+def main():
+    """
+    Run the benchmark suite from the command line, print the results and save
+    them. --compare prints the speed of every case against a saved run.
+    """
+
+    shapeNames = [shapeName for shapeName, companyCount, monthCount in BENCHMARK_SHAPES]
+    parser = argparse.ArgumentParser(description="Benchmark the processing engines of "
+                                     "company_shares on generated CSV files.")
+    parser.add_argument('--shapes', nargs='+', choices=shapeNames, default=shapeNames,
+                        help="file shapes to benchmark.")
+    parser.add_argument('--engines', nargs='+', choices=ENGINES, default=list(ENGINES),
+                        help="processing engines to benchmark.")
+    parser.add_argument('--readers', nargs='+', choices=READERS, default=list(READERS),
+                        help="readers of the share rows to benchmark.")
+    parser.add_argument('--workers', type=int, default=None,
+                        help="worker processes of the parallel engines.")
+    parser.add_argument('--repeat', type=int, default=DEFAULT_REPEAT,
+                        help="runs of every case. The fastest run is kept.")
+    parser.add_argument('--output', default=DEFAULT_RESULTS_PATH, dest='resultsPath',
+                        help="JSON file the results are saved to.")
+    parser.add_argument('--label', default='', help="label of the saved results.")
+    parser.add_argument('--compare', default=None, dest='basePath',
+                        help="JSON file of earlier results to compare with.")
+    arguments = parser.parse_args()
+
+    baseResultList = None
+    if arguments.basePath:
+        try:
+            baseLabel, baseResultList = loadResults(arguments.basePath)
+        except (CsvError, IOError), e:
+            print "\nCould not load the results to compare with: \n\t%s" %e
+            sys.exit(2)
+
+    shapeList = [shape for shape in BENCHMARK_SHAPES if shape[0] in arguments.shapes]
+    resultList = runBenchmarkSuite(shapeList, arguments.engines, arguments.readers,
+                                   arguments.workers, arguments.repeat)
+    displayResults(resultList, baseResultList)
+    saveResults(resultList, arguments.resultsPath, arguments.label)
+    print "\nResults saved to: %s" %arguments.resultsPath
+
+
+if __name__ == '__main__':
+    main()
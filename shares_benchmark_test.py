@@ -0,0 +1,90 @@
+#!/usr/bin/env python
+
+import os
+import filecmp
+import tempfile
+import unittest
+
+#import functions from shares_benchmark and company_shares modules
+from shares_benchmark import generateSharesCsv
+from shares_benchmark import runBenchmark
+from shares_benchmark import saveResults
+from shares_benchmark import loadResults
+from shares_benchmark import displayResults
+from company_shares import SharesInfo
+from company_shares import CsvErrorSink
+from company_shares import CsvError
+from company_shares import PYTHON_ENGINE
+
+from company_shares_test import captureOutput
+
+
+class TestSharesBenchmark(unittest.TestCase):
+    """
+    Class for testcases for the module shares_benchmark
+    """
+
+    def setUp(self):
+        self.csvPath = tempfile.mktemp(prefix='share_test', suffix='.csv')
+        self.resultsPath = tempfile.mktemp(prefix='share_test', suffix='.json')
+
+    def tearDown(self):
+        for filePath in (self.csvPath, self.resultsPath):
+            if os.path.exists(filePath):
+                os.remove(filePath)
+
+    # test that generateSharesCsv is deterministic and generates the anomalies.
+    def testGenerateSharesCsv(self):
+
+        generateSharesCsv(self.csvPath, 20, 500, seed=7, badCellRate=0.05,
+                          shortRowRate=0.05, longRowRate=0.05, oldYearRate=0.05)
+        otherCsvPath = tempfile.mktemp(prefix='share_test', suffix='.csv')
+        try:
+            generateSharesCsv(otherCsvPath, 20, 500, seed=7, badCellRate=0.05,
+                              shortRowRate=0.05, longRowRate=0.05, oldYearRate=0.05)
+            self.assertTrue(filecmp.cmp(self.csvPath, otherCsvPath, shallow=False))
+        finally:
+            os.remove(otherCsvPath)
+
+        errorSink = CsvErrorSink(0)
+        maxShareDict = SharesInfo(self.csvPath, errorSink=errorSink)._processCsvFile()
+        self.assertEqual(len(maxShareDict), 20)
+        errorNames = [errorName for errorName, errorCount, companyCounts
+                      in errorSink.getSummary(maxShareDict.keys())]
+        self.assertEqual(errorNames, ['missing share values', 'extra share values',
+                                      'year before 1990', 'invalid share value'])
+
+
+    # test the fields of runBenchmark.
+    def testRunBenchmark(self):
+
+        generateSharesCsv(self.csvPath, 5, 100)
+        benchmarkResult = runBenchmark(self.csvPath, 5, 100, PYTHON_ENGINE, repeat=1)
+        self.assertEqual(benchmarkResult['engine'], PYTHON_ENGINE)
+        self.assertTrue(benchmarkResult['seconds'] > 0)
+        self.assertAlmostEqual(benchmarkResult['cellsPerSecond'],
+                               benchmarkResult['rowsPerSecond'] * 5)
+
+
+    # test saveResults followed by loadResults and the comparison with them.
+    def testSaveAndLoadResults(self):
+
+        resultList = [{'shape': 'small', 'companies': 5, 'months': 100, 'engine': 'python',
+                       'reader': 'csv', 'seconds': 2.0, 'rowsPerSecond': 50.0,
+                       'cellsPerSecond': 250.0, 'peakMemoryKb': None}]
+        saveResults(resultList, self.resultsPath, 'base')
+        label, baseResultList = loadResults(self.resultsPath)
+        self.assertEqual((label, baseResultList), ('base', resultList))
+
+        resultList[0]['seconds'] = 1.0
+        output = captureOutput(displayResults, resultList, baseResultList)[1]
+        self.assertTrue('2.00x' in output)
+
+        resultsFile = open(self.resultsPath, 'wb')
+        resultsFile.write('[]')
+        resultsFile.close()
+        self.assertRaises(CsvError, loadResults, self.resultsPath)
+
+
+if __name__ == '__main__':
+    unittest.main()
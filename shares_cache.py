@@ -0,0 +1,577 @@
+#!/usr/bin/env python
+
+import os
+import sys
+import copy
+import types
+import array
+import marshal
+import hashlib
+import tempfile
+import collections
+
+# CONSTANTS
+CACHE_FORMAT_VERSION = 5
+CACHE_EXTENSION = '.sharecache'
+# the sidecar files are only read from a directory of the current user that no
+# one else can write to, created with CACHE_DIR_MODE.
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'company_shares')
+CACHE_DIR_MODE = 0700
+DEFAULT_MAX_CACHE_SIZE = 256 * 1024 * 1024
+HASH_BLOCK_SIZE = 1024 * 1024
+
+# memory budget of the in-memory cache of processed results
+DEFAULT_MAX_RESULT_SIZE = 64 * 1024 * 1024
+
+# array typecodes of the packed time keys, share values and validity flags
+TIME_TYPECODE = 'i'
+VALUE_TYPECODE = 'l'
+VALID_TYPECODE = 'b'
+
+
+class ParsedDataCache():
+    """
+    class to keep the parsed share matrix of CSV files in compact binary sidecar
+    files, one per CSV file, in a cache directory.
+    An entry is keyed by the resolved CSV path, its size, its modification time
+    and, unless disabled, a hash of its content. An entry whose key does not
+    match the CSV file anymore is a miss and is removed.
+    The sidecar files are unmarshalled, so they are only loaded from a cache
+    directory owned by the current user and not writable by anyone else.
+    When the cache directory grows over maxSize, the least recently used
+    entries are evicted.
+    """
+    def __init__(self, cacheDir=DEFAULT_CACHE_DIR, maxSize=DEFAULT_MAX_CACHE_SIZE,
+                 useContentHash=True):
+        """
+        Initialize the cache.
+
+        :parameters:
+            cacheDir: `string`
+                directory of the sidecar files. Created on the first store, with
+                CACHE_DIR_MODE.
+
+            maxSize: `int`
+                maximum size of all the sidecar files in bytes.
+
+            useContentHash: `bool`
+                if True, a hash of the CSV content is part of the key. Detects
+                changes that keep the size and modification time, eg. a rewrite
+                within the same second, at the cost of reading the CSV file.
+
+        :returns:
+            None
+
+        :raises:
+            None
+
+        """
+        self.cacheDir = cacheDir
+        self.maxSize = maxSize
+        self.useContentHash = useContentHash
+        self.hits = 0
+        self.misses = 0
+
+
+    def getCacheKey(self, csvPath):
+        """
+        Return the key of the CSV file.
+
+        :parameters:
+            csvPath: `string`
+                path of the CSV file.
+
+        :returns:
+            cacheKey: `tuple`
+                (resolved path, size, modification time, content hash or None)
+
+        :raises:
+            Exception: `OSError`
+                if the CSV file cannot be accessed.
+
+        """
+
+        resolvedPath = os.path.realpath(csvPath)
+        fileStat = os.stat(resolvedPath)
+        contentHash = None
+        if self.useContentHash:
+            contentHash = self._getContentHash(resolvedPath)
+        return (resolvedPath, fileStat.st_size, fileStat.st_mtime, contentHash)
+
+
+    def load(self, csvPath, priceDecimals=0, trusted=False):
+        """
+        Return the parsed share matrix of the CSV file if the cache has a valid
+        entry for it, None otherwise.
+
+        :parameters:
+            csvPath: `string`
+                path of the CSV file.
+
+            priceDecimals: `int`
+                number of decimal places the share values are scaled by. An entry
+                stored with another number is a miss.
+
+            trusted: `bool`
+                True if the CSV file is parsed as a trusted feed. An entry stored
+                for the other mode is a miss, the rows kept may differ.
+
+        :returns:
+            parsedData: `tuple`
+                (headerList, timeKeys, valueList, validList, errorList) where
+                timeKeys is an int32 array with the time key of every accepted
+                row, valueList and validList are flat arrays and errorList holds the
+                (reasonCode, rowIndex, columnIndex, value) records of the errors
+                of the CSV file. None on a miss.
+
+        :raises:
+            None
+
+        """
+
+        if not self._isPrivateDir():
+            self.misses+= 1
+            return None
+        try:
+            cacheKey = self.getCacheKey(csvPath)
+        except (IOError, OSError):
+            self.misses+= 1
+            return None
+
+        cacheFilePath = self._getCacheFilePath(cacheKey[0])
+        try:
+            cacheFile = open(cacheFilePath, 'rb')
+        except IOError:
+            self.misses+= 1
+            return None
+
+        try:
+            cacheData = marshal.loads(cacheFile.read())
+            (version, storedKey, itemSize, storedDecimals, storedTrusted, headerList,
+             errorList, timeBytes, valueBytes, validBytes) = cacheData
+        except (ValueError, EOFError, TypeError):
+            cacheData = None
+        finally:
+            cacheFile.close()
+
+        valueList = array.array(VALUE_TYPECODE)
+        if (cacheData is None or version != CACHE_FORMAT_VERSION or storedKey != cacheKey
+            or itemSize != valueList.itemsize):
+            self._removeFile(cacheFilePath)
+            self.misses+= 1
+            return None
+
+        # the entry is kept, the CSV file itself did not change.
+        if storedDecimals != priceDecimals or storedTrusted != trusted:
+            self.misses+= 1
+            return None
+
+        timeKeys = array.array(TIME_TYPECODE)
+        timeKeys.fromstring(timeBytes)
+        valueList.fromstring(valueBytes)
+        validList = array.array(VALID_TYPECODE)
+        validList.fromstring(validBytes)
+
+        # the modification time of the sidecar file tracks its last use.
+        try:
+            os.utime(cacheFilePath, None)
+        except OSError:
+            pass
+
+        self.hits+= 1
+        return headerList, timeKeys, valueList, validList, errorList
+
+
+    def store(self, csvPath, parsedData, priceDecimals=0, trusted=False):
+        """
+        Store the parsed share matrix of the CSV file and evict the least
+        recently used entries if the cache grows over maxSize.
+        Storing is best effort, the CSV file can always be parsed again.
+
+        :parameters:
+            csvPath: `string`
+                path of the CSV file.
+
+            parsedData: `tuple`
+                (headerList, timeKeys, valueList, validList, errorList)
+
+            priceDecimals: `int`
+                number of decimal places the share values are scaled by.
+
+            trusted: `bool`
+                True if the CSV file was parsed as a trusted feed.
+
+        :returns:
+            `bool`
+                True if the entry was stored. False if the share values do not
+                fit the packed format, the entry is bigger than maxSize or the
+                cache directory is not writable.
+
+        :raises:
+            None
+
+        """
+
+        headerList, timeKeys, valueList, validList, errorList = parsedData
+        try:
+            cacheKey = self.getCacheKey(csvPath)
+            packedTimes = array.array(TIME_TYPECODE, timeKeys)
+            packedValues = array.array(VALUE_TYPECODE, valueList)
+            packedValid = array.array(VALID_TYPECODE, validList)
+        except (IOError, OSError, OverflowError):
+            return False
+
+        cacheData = marshal.dumps((CACHE_FORMAT_VERSION, cacheKey, packedValues.itemsize,
+                                   priceDecimals, bool(trusted), list(headerList),
+                                   list(errorList), packedTimes.tostring(),
+                                   packedValues.tostring(), packedValid.tostring()), 2)
+        if len(cacheData) > self.maxSize:
+            return False
+
+        cacheFilePath = self._getCacheFilePath(cacheKey[0])
+        try:
+            if not os.path.isdir(self.cacheDir):
+                os.makedirs(self.cacheDir, CACHE_DIR_MODE)
+            if not self._isPrivateDir():
+                return False
+
+            # write to a temporary file first so that readers never see a
+            # partially written entry.
+            fileHandle, tempPath = tempfile.mkstemp(dir=self.cacheDir, suffix='.tmp')
+            os.write(fileHandle, cacheData)
+            os.close(fileHandle)
+            if os.path.exists(cacheFilePath):
+                os.remove(cacheFilePath)
+            os.rename(tempPath, cacheFilePath)
+        except (IOError, OSError):
+            return False
+
+        self._evict()
+        return True
+
+
+    def invalidate(self, csvPath=None):
+        """
+        Remove the entry of the CSV file, or all the entries if csvPath is None.
+
+        :parameters:
+            csvPath: `string`
+                path of the CSV file.
+
+        :returns:
+            removedCount: `int`
+                number of removed entries.
+
+        :raises:
+            None
+
+        """
+
+        if csvPath is not None:
+            cacheFilePaths = [self._getCacheFilePath(os.path.realpath(csvPath))]
+        else:
+            cacheFilePaths = [cacheFilePath for cacheFilePath, fileSize, lastUse
+                              in self._listCacheFiles()]
+
+        removedCount = 0
+        for cacheFilePath in cacheFilePaths:
+            if self._removeFile(cacheFilePath):
+                removedCount+= 1
+        return removedCount
+
+
+    def getSize(self):
+        """
+        Return the size of all the sidecar files in bytes.
+        """
+
+        return sum(fileSize for cacheFilePath, fileSize, lastUse in self._listCacheFiles())
+
+
+    def _evict(self):
+        """
+        Remove the least recently used entries until the cache fits in maxSize.
+        """
+
+        cacheFiles = sorted(self._listCacheFiles(), key=lambda fileInfo: fileInfo[2])
+        totalSize = sum(fileSize for cacheFilePath, fileSize, lastUse in cacheFiles)
+        for cacheFilePath, fileSize, lastUse in cacheFiles:
+            if totalSize <= self.maxSize:
+                break
+            if self._removeFile(cacheFilePath):
+                totalSize-= fileSize
+
+
+    def _listCacheFiles(self):
+        """
+        Return a list of (path, size, modification time) of the sidecar files.
+        """
+
+        if not os.path.isdir(self.cacheDir):
+            return []
+
+        cacheFiles = []
+        for fileName in os.listdir(self.cacheDir):
+            if not fileName.endswith(CACHE_EXTENSION):
+                continue
+            cacheFilePath = os.path.join(self.cacheDir, fileName)
+            try:
+                fileStat = os.stat(cacheFilePath)
+            except OSError:
+                continue
+            cacheFiles.append((cacheFilePath, fileStat.st_size, fileStat.st_mtime))
+        return cacheFiles
+
+
+    def _isPrivateDir(self):
+        """
+        Return True if the cache directory is owned by the current user and is
+        not writable by the group or others. Always True where there are no
+        user ids.
+        """
+
+        try:
+            dirStat = os.stat(self.cacheDir)
+        except OSError:
+            return False
+        if not hasattr(os, 'getuid'):
+            return True
+        return dirStat.st_uid == os.getuid() and not dirStat.st_mode & 0022
+
+
+    def _getCacheFilePath(self, resolvedPath):
+        """
+        Return the path of the sidecar file of a resolved CSV path.
+        """
+
+        fileName = hashlib.sha1(resolvedPath).hexdigest() + CACHE_EXTENSION
+        return os.path.join(self.cacheDir, fileName)
+
+
+    def _getContentHash(self, csvPath):
+        """
+        Return the sha1 hex digest of the content of the CSV file.
+        """
+
+        contentHash = hashlib.sha1()
+        csvFile = open(csvPath, 'rb')
+        try:
+            for block in iter(lambda: csvFile.read(HASH_BLOCK_SIZE), ''):
+                contentHash.update(block)
+        finally:
+            csvFile.close()
+        return contentHash.hexdigest()
+
+
+    def _removeFile(self, filePath):
+        """
+        Remove a file and return True if it was removed.
+        """
+
+        try:
+            os.remove(filePath)
+        except OSError:
+            return False
+        return True
+
+
+class ResultCache():
+    """
+    class to keep the processed results of CSV files in memory, for long lived
+    processes such as the interactive menu, that process the same files again.
+    An entry is keyed by the resolved CSV path and the processing options, and
+    is only valid while the size and modification time of the CSV file are the
+    ones it had when the entry was stored. An entry of a changed file is a miss
+    and is removed.
+    When the approximate size of the entries grows over maxSize, the least
+    recently used entries are evicted.
+    The results are copied when they are stored and when they are loaded, so
+    that a caller modifying its results cannot change the cached ones.
+    """
+    def __init__(self, maxSize=DEFAULT_MAX_RESULT_SIZE):
+        """
+        Initialize the cache.
+
+        :parameters:
+            maxSize: `int`
+                memory budget of all the entries in bytes.
+
+        :returns:
+            None
+
+        :raises:
+            None
+
+        """
+        self.maxSize = maxSize
+        self.hits = 0
+        self.misses = 0
+
+        # (resolved path, options) -> (file key, results, size), least recently
+        # used first.
+        self.entries = collections.OrderedDict()
+        self.size = 0
+
+
+    def getFileKey(self, csvPath):
+        """
+        Return the key of the CSV file an entry is valid for.
+
+        :parameters:
+            csvPath: `string`
+                path of the CSV file.
+
+        :returns:
+            fileKey: `tuple`
+                (resolved path, size, modification time)
+
+        :raises:
+            Exception: `OSError`
+                if the CSV file cannot be accessed.
+
+        """
+
+        resolvedPath = os.path.realpath(csvPath)
+        fileStat = os.stat(resolvedPath)
+        return (resolvedPath, fileStat.st_size, fileStat.st_mtime)
+
+
+    def load(self, csvPath, resultKey):
+        """
+        Return the results of the CSV file processed with the options of
+        resultKey if the cache has a valid entry for them, None otherwise.
+
+        :parameters:
+            csvPath: `string`
+                path of the CSV file.
+
+            resultKey: `tuple`
+                options the results depend on, eg. from SharesInfo._getResultKey.
+
+        :returns:
+            resultData: `tuple`
+                copy of the (maxShareDict, errorSink, peakMonthIndex) stored.
+                None on a miss.
+
+        :raises:
+            None
+
+        """
+
+        try:
+            fileKey = self.getFileKey(csvPath)
+        except (IOError, OSError):
+            self.misses+= 1
+            return None
+
+        cacheKey = (fileKey[0], resultKey)
+        entry = self.entries.pop(cacheKey, None)
+        if entry is None or entry[0] != fileKey:
+            if entry is not None:
+                self.size-= entry[2]
+            self.misses+= 1
+            return None
+
+        # reinserting the entry makes it the most recently used one.
+        self.entries[cacheKey] = entry
+        self.hits+= 1
+        return copy.deepcopy(entry[1])
+
+
+    def store(self, csvPath, resultKey, resultData):
+        """
+        Store the results of the CSV file and evict the least recently used
+        entries if the cache grows over maxSize.
+
+        :parameters:
+            csvPath: `string`
+                path of the CSV file.
+
+            resultKey: `tuple`
+                options the results depend on.
+
+            resultData: `tuple`
+                (maxShareDict, errorSink, peakMonthIndex), errorSink being the
+                CsvErrorSink of the errors of the CSV file. A copy is stored.
+
+        :returns:
+            `bool`
+                True if the entry was stored. False if the CSV file cannot be
+                accessed or the entry is bigger than maxSize.
+
+        :raises:
+            None
+
+        """
+
+        try:
+            fileKey = self.getFileKey(csvPath)
+        except (IOError, OSError):
+            return False
+
+        resultSize = _getObjectSize(resultData, set())
+        if resultSize > self.maxSize:
+            return False
+
+        cacheKey = (fileKey[0], resultKey)
+        oldEntry = self.entries.pop(cacheKey, None)
+        if oldEntry is not None:
+            self.size-= oldEntry[2]
+        self.entries[cacheKey] = (fileKey, copy.deepcopy(resultData), resultSize)
+        self.size+= resultSize
+
+        while self.size > self.maxSize:
+            cacheKey, (fileKey, resultData, resultSize) = self.entries.popitem(last=False)
+            self.size-= resultSize
+        return True
+
+
+    def invalidate(self, csvPath=None):
+        """
+        Remove the entries of the CSV file, or all the entries if csvPath is None.
+
+        :parameters:
+            csvPath: `string`
+                path of the CSV file.
+
+        :returns:
+            removedCount: `int`
+                number of removed entries.
+
+        :raises:
+            None
+
+        """
+
+        if csvPath is None:
+            cacheKeys = self.entries.keys()
+        else:
+            resolvedPath = os.path.realpath(csvPath)
+            cacheKeys = [cacheKey for cacheKey in self.entries if cacheKey[0] == resolvedPath]
+
+        for cacheKey in cacheKeys:
+            self.size-= self.entries.pop(cacheKey)[2]
+        return len(cacheKeys)
+
+
+def _getObjectSize(value, seenIds):
+    """
+    Return the approximate size in bytes of a value, the items of its
+    containers and the attributes of its objects. An object reachable more
+    than once is counted once.
+    """
+
+    if id(value) in seenIds:
+        return 0
+    seenIds.add(id(value))
+
+    objectSize = sys.getsizeof(value)
+    if isinstance(value, dict):
+        itemList = value.keys() + value.values()
+    elif isinstance(value, (list, tuple, set, frozenset)):
+        itemList = value
+    elif isinstance(value, types.InstanceType):
+        itemList = [value.__dict__]
+    else:
+        itemList = ()
+    return objectSize + sum(_getObjectSize(item, seenIds) for item in itemList)
@@ -0,0 +1,223 @@
+#!/usr/bin/env python
+
+import os
+import time
+import shutil
+import unittest
+import tempfile
+
+#import classes from shares_cache and company_shares modules
+from shares_cache import ParsedDataCache
+from shares_cache import ResultCache
+from company_shares import SharesInfo
+from company_shares import NUMPY_ENGINE
+from company_shares import PYTHON_ENGINE
+from company_shares import CsvErrorSink
+from company_shares import numpy
+
+from company_shares_test import TIES_CSV_LINES
+from company_shares_test import writeTempCsv
+from company_shares_test import captureOutput
+from company_shares_test import getMaxShareLists
+
+
+class TestParsedDataCache(unittest.TestCase):
+    """
+    Class for testcases for the module shares_cache
+    """
+
+    def setUp(self):
+        self.cacheDir = tempfile.mkdtemp(prefix='share_cache_test')
+        self.cache = ParsedDataCache(self.cacheDir)
+        self.csvPath = writeTempCsv(TIES_CSV_LINES)
+        self.parsedData = (['Year', 'Month', 'Company A'], [1990 * 12], [10], [True], [])
+
+    def tearDown(self):
+        shutil.rmtree(self.cacheDir)
+        os.remove(self.csvPath)
+
+    # test ParsedDataCache.load before anything is stored.
+    def testLoadWithEmptyCache(self):
+
+        self.assertEqual(self.cache.load(self.csvPath), None)
+        self.assertEqual(self.cache.misses, 1)
+
+
+    # test ParsedDataCache.store followed by ParsedDataCache.load.
+    def testStoreAndLoad(self):
+
+        self.assertTrue(self.cache.store(self.csvPath, self.parsedData))
+        headerList, timeKeys, valueList, validList, errorList = self.cache.load(self.csvPath)
+        self.assertEqual((headerList, list(timeKeys), list(valueList), list(validList), errorList),
+                         (['Year', 'Month', 'Company A'], [1990 * 12], [10], [1], []))
+        self.assertEqual(self.cache.hits, 1)
+
+
+    # test that an entry is a miss once the CSV file changes.
+    def testLoadAfterFileChange(self):
+
+        self.cache.store(self.csvPath, self.parsedData)
+        csvFile = open(self.csvPath, 'ab')
+        csvFile.write('1993,Jun,1,1,1,1\n')
+        csvFile.close()
+        self.assertEqual(self.cache.load(self.csvPath), None)
+
+
+    # test that an entry is a miss for other parse options.
+    def testLoadWithOtherOptions(self):
+
+        self.cache.store(self.csvPath, self.parsedData, trusted=True)
+        self.assertEqual(self.cache.load(self.csvPath), None)
+        self.assertEqual(self.cache.load(self.csvPath, priceDecimals=2, trusted=True), None)
+        self.assertNotEqual(self.cache.load(self.csvPath, trusted=True), None)
+
+
+    # test that an entry is a miss after a rewrite that keeps the size and the
+    # modification time, and that a cache directory writable by others is not
+    # used.
+    def testLoadWithSameSizeAndTime(self):
+
+        self.cache.store(self.csvPath, self.parsedData)
+        fileStat = os.stat(self.csvPath)
+        csvData = open(self.csvPath, 'rb').read()
+        csvFile = open(self.csvPath, 'wb')
+        csvFile.write(csvData.replace('1990', '1991', 1))
+        csvFile.close()
+        os.utime(self.csvPath, (fileStat.st_atime, fileStat.st_mtime))
+        self.assertEqual(self.cache.load(self.csvPath), None)
+
+        self.cache.store(self.csvPath, self.parsedData)
+        os.chmod(self.cacheDir, 0777)
+        self.assertEqual(self.cache.load(self.csvPath), None)
+        self.assertFalse(self.cache.store(self.csvPath, self.parsedData))
+        os.chmod(self.cacheDir, 0700)
+        self.assertNotEqual(self.cache.load(self.csvPath), None)
+
+
+    # test ParsedDataCache.invalidate for one file.
+    def testInvalidate(self):
+
+        self.cache.store(self.csvPath, self.parsedData)
+        self.assertEqual(self.cache.invalidate(self.csvPath), 1)
+        self.assertEqual(self.cache.load(self.csvPath), None)
+
+
+    # test that the least recently used entry is evicted over maxSize.
+    def testEviction(self):
+
+        otherCsvPath = writeTempCsv(TIES_CSV_LINES)
+        try:
+            self.cache.store(self.csvPath, self.parsedData)
+            self.cache.maxSize = self.cache.getSize() + 1
+            # make sure the second entry is more recent than the first one.
+            time.sleep(0.01)
+            self.cache.store(otherCsvPath, self.parsedData)
+            self.assertEqual(self.cache.load(self.csvPath), None)
+            self.assertNotEqual(self.cache.load(otherCsvPath), None)
+        finally:
+            os.remove(otherCsvPath)
+
+
+    # test that SharesInfo gives the same results and error messages from the
+    # cache as from the CSV file.
+    def testSharesInfoWithCache(self):
+
+        engineList = [PYTHON_ENGINE, NUMPY_ENGINE] if numpy else [PYTHON_ENGINE]
+        expected, expectedOutput = captureOutput(SharesInfo(self.csvPath)._processCsvFile)
+        for engine in engineList:
+            for run in range(2):
+                sharesInfo = SharesInfo(self.csvPath, engine, cache=self.cache)
+                result, output = captureOutput(sharesInfo._processCsvFile)
+                self.assertEqual(getMaxShareLists(result), getMaxShareLists(expected))
+                self.assertEqual(output, expectedOutput)
+        self.assertEqual(self.cache.misses, 1)
+
+
+class TestResultCache(unittest.TestCase):
+    """
+    Class for testcases for the in-memory result cache of the module shares_cache
+    """
+
+    def setUp(self):
+        self.resultCache = ResultCache()
+        self.csvPath = writeTempCsv(TIES_CSV_LINES)
+
+    def tearDown(self):
+        os.remove(self.csvPath)
+
+    # test that a repeated call returns the cached results and reports the
+    # same errors, printed or to an error sink.
+    def testRepeatedProcessing(self):
+
+        expected, expectedOutput = captureOutput(SharesInfo(self.csvPath).processCsvFile)
+        for run in range(2):
+            sharesInfo = SharesInfo(self.csvPath, resultCache=self.resultCache)
+            output = captureOutput(sharesInfo.processCsvFile)[1]
+            self.assertEqual(output, expectedOutput)
+        self.assertEqual((self.resultCache.hits, self.resultCache.misses), (1, 1))
+
+        # the errors of a sink are recorded with its maxRecords.
+        for run in range(2):
+            errorSink = CsvErrorSink(2)
+            result = SharesInfo(self.csvPath, errorSink=errorSink,
+                                resultCache=self.resultCache)._processCsvFile()
+            self.assertEqual((errorSink.errorCount, len(errorSink.getRecords())), (6, 2))
+        self.assertEqual((self.resultCache.hits, self.resultCache.misses), (2, 2))
+
+
+    # test that modifying the returned results does not change the cached ones.
+    def testResultCopies(self):
+
+        expected = SharesInfo(self.csvPath, errorSink=CsvErrorSink())._processCsvFile()
+        for run in range(3):
+            result = SharesInfo(self.csvPath, errorSink=CsvErrorSink(),
+                                resultCache=self.resultCache)._processCsvFile()
+            self.assertEqual(getMaxShareLists(result), getMaxShareLists(expected))
+            result['Company A'].maxShareList.append(('2001', 'Jan', 100))
+            result['Company A'].maxShareValue = 100
+            del result['Company B']
+        self.assertEqual(self.resultCache.hits, 2)
+
+
+    # test that a changed file or other options are misses, and invalidate.
+    def testFileChangeAndOptions(self):
+
+        SharesInfo(self.csvPath, resultCache=self.resultCache, errorSink=CsvErrorSink()
+                   )._processCsvFile()
+        csvFile = open(self.csvPath, 'ab')
+        csvFile.write('1993,Jun,40,1,1,1\n')
+        csvFile.close()
+
+        result = SharesInfo(self.csvPath, resultCache=self.resultCache,
+                            errorSink=CsvErrorSink())._processCsvFile()
+        self.assertEqual(result['Company A'].maxShareList, [('1993', 'Jun', 40)])
+        SharesInfo(self.csvPath, topCount=2, resultCache=self.resultCache,
+                   errorSink=CsvErrorSink())._processCsvFile()
+        self.assertEqual((self.resultCache.hits, self.resultCache.misses), (0, 3))
+        self.assertEqual(len(self.resultCache.entries), 2)
+        self.assertEqual(self.resultCache.invalidate(self.csvPath), 2)
+        self.assertEqual(self.resultCache.size, 0)
+
+
+    # test that the least recently used entry is evicted over maxSize and that
+    # an entry bigger than maxSize is not stored.
+    def testEviction(self):
+
+        otherCsvPath = writeTempCsv(TIES_CSV_LINES)
+        try:
+            for csvPath in (self.csvPath, otherCsvPath, self.csvPath):
+                SharesInfo(csvPath, resultCache=self.resultCache,
+                           errorSink=CsvErrorSink())._processCsvFile()
+                self.resultCache.maxSize = self.resultCache.size + 1
+            self.assertEqual([cacheKey[0] for cacheKey in self.resultCache.entries],
+                             [os.path.realpath(self.csvPath)])
+
+            self.resultCache.maxSize = 1
+            self.assertFalse(self.resultCache.store(otherCsvPath, (),
+                                                    ({}, CsvErrorSink(), None)))
+        finally:
+            os.remove(otherCsvPath)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,230 @@
+#!/usr/bin/env python
+
+import bisect
+
+#import classes, functions and constants from company_shares module
+from company_shares import SharesInfo
+from company_shares import CsvError
+from company_shares import CSV_READER
+from company_shares import getTimeKey
+from company_shares import formatTimeKey
+
+# CONSTANTS
+# value of the invalid cells in the index. Lower than any share value.
+NO_SHARE_VALUE = float('-inf')
+
+
+class ShareRangeIndex():
+    """
+    class to answer range max queries over (year, month) windows per company.
+    The accepted share rows are sorted chronologically and every company gets
+    a sparse table of max values, so the max of a window is found in O(1) after
+    two binary searches. The months tied with the max are found by binary search
+    in the sorted positions of every share value of the company.
+    """
+    def __init__(self, companyNames, timeKeys, valueList, validList):
+        """
+        Build the index from a share matrix as returned by SharesInfo.loadShareMatrix.
+
+        :parameters:
+            companyNames: `list`
+                company names in header order.
+
+            timeKeys: `sequence`
+                time key, year * 12 + month index, of every row of the share matrix.
+
+            valueList: `sequence`
+                flat, row major, share values. rows = months, columns = companies.
+
+            validList: `sequence`
+                flag per share value, False for invalid cells.
+
+        :returns:
+            None
+
+        :raises:
+            None
+
+        """
+
+        companyCount = len(companyNames)
+        self.companyNames = list(companyNames)
+        self.companyIndexDict = dict((companyName, companyIndex)
+                                     for companyIndex, companyName in enumerate(companyNames))
+
+        # equal time keys keep the file order of their rows.
+        keyedRows = sorted((timeKey, rowIndex) for rowIndex, timeKey in enumerate(timeKeys))
+
+        self.timeKeys = [timeKey for timeKey, rowIndex in keyedRows]
+
+        rowCount = len(keyedRows)
+        self.logTable = [0] * (rowCount + 1)
+        for length in range(2, rowCount + 1):
+            self.logTable[length] = self.logTable[length // 2] + 1
+
+        # sparseTables[company][level][position] is the max share value of the
+        # 2**level rows from position.
+        self.sparseTables = []
+        self.valuePositions = []
+        for companyIndex in range(companyCount):
+            shareColumn = []
+            for timeKey, rowIndex in keyedRows:
+                cellIndex = rowIndex * companyCount + companyIndex
+                if validList[cellIndex]:
+                    shareColumn.append(valueList[cellIndex])
+                else:
+                    shareColumn.append(NO_SHARE_VALUE)
+
+            sparseTable = [shareColumn]
+            halfLength = 1
+            while 2 * halfLength <= rowCount:
+                previousLevel = sparseTable[-1]
+                sparseTable.append(map(max, previousLevel[:-halfLength],
+                                       previousLevel[halfLength:]))
+                halfLength*= 2
+            self.sparseTables.append(sparseTable)
+
+            positionDict = {}
+            for position, shareValue in enumerate(shareColumn):
+                positionDict.setdefault(shareValue, []).append(position)
+            self.valuePositions.append(positionDict)
+
+
+    def getCompanyNames(self):
+        """
+        Return the company names of the index in header order.
+        """
+
+        return list(self.companyNames)
+
+
+    def queryRange(self, companyName, start, end):
+        """
+        Return the max share value of a company between two months, both
+        included, with the tied months in chronological order.
+
+        :parameters:
+            companyName: `string`
+                name of the company as in the CSV header.
+
+            start: `tuple`
+                (year, month) of the first month of the window, eg. (2001, 'Mar').
+
+            end: `tuple`
+                (year, month) of the last month of the window, eg. (2008, 11).
+
+        :returns:
+            (maxShareValue, maxShareList): `tuple`
+                max share value and list of (year, month, maxShareValue) tuples
+                like Company.maxShareList, with the months of formatTimeKey, eg.
+                ('2001', 'Mar'). (None, []) if the window has no valid share value.
+
+        :raises:
+            Exception: `CsvError`
+                if the company is unknown.
+                OR
+                if a year or month of the window is invalid.
+
+        """
+
+        return self._queryRange(self._getCompanyIndex(companyName),
+                                getTimeKey(*start), getTimeKey(*end))
+
+
+    def queryRanges(self, queryList):
+        """
+        Answer a batch of range max queries. Companies and time keys are
+        resolved once for all the queries that share them.
+
+        :parameters:
+            queryList: `list`
+                list of (companyName, start, end) as for queryRange.
+
+        :returns:
+            resultList: `list`
+                (maxShareValue, maxShareList) for every query, in query order.
+
+        :raises:
+            Exception: `CsvError`
+                if a company is unknown.
+                OR
+                if a year or month of a window is invalid.
+
+        """
+
+        timeKeyDict = {}
+        resultList = []
+        for companyName, start, end in queryList:
+            for yearMonth in (start, end):
+                if yearMonth not in timeKeyDict:
+                    timeKeyDict[yearMonth] = getTimeKey(*yearMonth)
+            resultList.append(self._queryRange(self._getCompanyIndex(companyName),
+                                               timeKeyDict[start], timeKeyDict[end]))
+        return resultList
+
+
+    def _queryRange(self, companyIndex, startKey, endKey):
+        """
+        Return (maxShareValue, maxShareList) of a company between two time keys.
+        """
+
+        first = bisect.bisect_left(self.timeKeys, startKey)
+        end = bisect.bisect_right(self.timeKeys, endKey)
+        if first >= end:
+            return None, []
+
+        level = self.logTable[end - first]
+        levelTable = self.sparseTables[companyIndex][level]
+        maxShareValue = max(levelTable[first], levelTable[end - (1 << level)])
+        if maxShareValue == NO_SHARE_VALUE:
+            return None, []
+
+        positions = self.valuePositions[companyIndex][maxShareValue]
+        firstTie = bisect.bisect_left(positions, first)
+        endTie = bisect.bisect_left(positions, end)
+        maxShareList = [formatTimeKey(self.timeKeys[position]) + (maxShareValue,)
+                        for position in positions[firstTie:endTie]]
+        return maxShareValue, maxShareList
+
+
+    def _getCompanyIndex(self, companyName):
+        """
+        Return the column index of a company, raise CsvError if it is unknown.
+        """
+
+        try:
+            return self.companyIndexDict[companyName]
+        except KeyError:
+            raise CsvError("Unknown company: %s" %companyName)
+
+
+def buildRangeIndex(csvPath, reader=CSV_READER, cache=None):
+    """
+    Parse the CSV file, or load it from the cache, and build its ShareRangeIndex.
+    The error messages of the ignored rows and cells are printed as by SharesInfo.
+
+    :parameters:
+        csvPath: `string`
+            path of the CSV file.
+
+        reader: `string`
+            reader of the share rows. One of company_shares.READERS.
+
+        cache: `shares_cache.ParsedDataCache`
+            optional on-disk cache of the parsed share matrix.
+
+    :returns:
+        rangeIndex: `ShareRangeIndex`
+            index of the CSV file.
+
+    :raises:
+        Exception: `CsvError`
+            if the CSV file path, reader or header is invalid.
+
+    """
+
+    sharesInfo = SharesInfo(csvPath, reader=reader, cache=cache)
+    sharesInfo.checkCsvPath(csvPath)
+    sharesInfo.checkReader(reader)
+    maxShareDict, timeKeys, valueList, validList = sharesInfo.loadShareMatrix()
+    return ShareRangeIndex(maxShareDict.keys(), timeKeys, valueList, validList)
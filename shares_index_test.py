@@ -0,0 +1,98 @@
+#!/usr/bin/env python
+
+import os
+import random
+import unittest
+
+#import classes from shares_index and company_shares modules
+from shares_index import ShareRangeIndex
+from shares_index import buildRangeIndex
+from shares_index import getTimeKey
+from company_shares import formatTimeKey
+from company_shares import CsvError
+
+from company_shares_test import TIES_CSV_LINES
+from company_shares_test import writeTempCsv
+from company_shares_test import captureOutput
+
+
+class TestShareRangeIndex(unittest.TestCase):
+    """
+    Class for testcases for the module shares_index
+    """
+
+    def setUp(self):
+        self.csvPath = writeTempCsv(TIES_CSV_LINES)
+        self.rangeIndex = captureOutput(buildRangeIndex, self.csvPath)[0]
+
+    def tearDown(self):
+        os.remove(self.csvPath)
+
+    # test getTimeKey with month names and numbers.
+    def testGetTimeKey(self):
+
+        self.assertEqual(getTimeKey('2001', 'Mar'), 2001 * 12 + 2)
+        self.assertEqual(getTimeKey(2001, 3), getTimeKey(2001, 'march'))
+        self.assertRaises(CsvError, getTimeKey, 2001, 'Smarch')
+
+
+    # test ShareRangeIndex.queryRange with windows over ties and invalid cells.
+    def testQueryRange(self):
+
+        self.assertEqual(self.rangeIndex.queryRange('Company A', (1990, 'Jan'), (1991, 'Dec')),
+                         (30, [('1990', 'Feb', 30), ('1991', 'Mar', 30)]))
+        self.assertEqual(self.rangeIndex.queryRange('Company D', (1992, 1), (1992, 12)),
+                         (6, [('1992', 'May', 6)]))
+        self.assertEqual(self.rangeIndex.queryRange('Company C', (1990, 1), (1992, 12)),
+                         (None, []))
+        self.assertEqual(self.rangeIndex.queryRange('Company A', (1995, 1), (1996, 12)),
+                         (None, []))
+        self.assertRaises(CsvError, self.rangeIndex.queryRange, 'Company X',
+                          (1990, 1), (1992, 12))
+
+        # the months are formatted as in Company.maxShareList.
+        rangeIndex = ShareRangeIndex(['A'], [getTimeKey(' 1990', 'january'),
+                                             getTimeKey('1990', '02')], [5, 5], [True, True])
+        self.assertEqual(rangeIndex.queryRange('A', (1990, 1), (1990, 12)),
+                         (5, [('1990', 'Jan', 5), ('1990', 'Feb', 5)]))
+
+
+    # test ShareRangeIndex.queryRanges against a scan of every window.
+    def testQueryRangesMatchesScan(self):
+
+        random.seed(1)
+        timeList = [(str(1990 + month // 12), str(month % 12 + 1)) for month in range(100)]
+        random.shuffle(timeList)
+        valueList = [random.randint(0, 9) for cell in range(len(timeList) * 2)]
+        validList = [random.random() > 0.1 for cell in valueList]
+        rangeIndex = ShareRangeIndex(['A', 'B'], [getTimeKey(year, month)
+                                                  for year, month in timeList],
+                                     valueList, validList)
+
+        queryList = []
+        for query in range(200):
+            start, end = sorted(random.sample(range(1990 * 12, 1999 * 12), 2))
+            queryList.append((random.choice('AB'), (start // 12, start % 12 + 1),
+                              (end // 12, end % 12 + 1)))
+
+        for (companyName, start, end), result in zip(queryList,
+                                                     rangeIndex.queryRanges(queryList)):
+            companyIndex = 'AB'.index(companyName)
+            monthList = []
+            for rowIndex, (year, month) in enumerate(timeList):
+                cellIndex = rowIndex * 2 + companyIndex
+                if validList[cellIndex] and getTimeKey(*start) <= getTimeKey(year, month) \
+                                        <= getTimeKey(*end):
+                    monthList.append((getTimeKey(year, month), year, month,
+                                      valueList[cellIndex]))
+            monthList.sort()
+            maxShareValue = max([shareValue for timeKey, year, month, shareValue
+                                 in monthList] or [None])
+            expected = (maxShareValue, [formatTimeKey(timeKey) + (shareValue,) for timeKey, year,
+                                        month, shareValue in monthList
+                                        if shareValue == maxShareValue])
+            self.assertEqual(result, expected)
+
+
+if __name__ == '__main__':
+    unittest.main()
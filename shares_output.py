@@ -0,0 +1,309 @@
+#!/usr/bin/env python
+
+import sys
+import csv
+import json
+
+#import constants from company_shares module
+from company_shares import CsvError
+from company_shares import INITIAL_SHARE_TUPLE
+from company_shares import formatShareValue
+
+# CONSTANTS
+TEXT_FORMAT = 'text'
+CSV_FORMAT = 'csv'
+JSON_LINES_FORMAT = 'jsonl'
+JSON_FORMAT = 'json'
+OUTPUT_FORMATS = (TEXT_FORMAT, CSV_FORMAT, JSON_LINES_FORMAT, JSON_FORMAT)
+
+# header of the CSV output, one row per company and month
+OUTPUT_CSV_HEADER = ['File', 'Company', 'Year', 'Month', 'Share Value']
+
+# number of formatted records kept before they are written in one go
+OUTPUT_BUFFER_SIZE = 1024
+
+
+class ResultWriter():
+    """
+    base class of the streaming writers of the results. The results are written
+    one company at a time, so a report is never held in memory as a whole.
+    The formatted records are buffered and written OUTPUT_BUFFER_SIZE at a time.
+    Subclasses implement _formatCompany and optionally _getHeader and _getFooter.
+    """
+    def __init__(self, outputFile, closeFile=False):
+        """
+        initialize the writer and write the header of the output format.
+
+        :parameters:
+            outputFile: `file`
+                file object the results are written to, eg. sys.stdout.
+
+            closeFile: `bool`
+                if True, close() also closes outputFile.
+
+        :returns:
+            None
+
+        :raises:
+            None
+
+        """
+
+        self.outputFile = outputFile
+        self.closeFile = closeFile
+        self.companyCount = 0
+        self.buffer = []
+
+        header = self._getHeader()
+        if header:
+            self.buffer.append(header)
+
+
+    def writeCompany(self, companyName, maxShareList, csvPath=None, priceDecimals=0):
+        """
+        Write the months with the max, or top, share values of a company.
+        The initial share tuple of a company without any valid share value is
+        not written. Share values scaled by 10 ** priceDecimals are written
+        with priceDecimals decimal places.
+
+        :parameters:
+            companyName: `string`
+                name of the company.
+
+            maxShareList: `list`
+                list of (year, month, shareValue) as in Company.maxShareList.
+
+            csvPath: `string`
+                path of the CSV file of the company.
+
+            priceDecimals: `int`
+                number of decimal places of the share prices.
+
+        :returns:
+            None
+
+        :raises:
+            None
+
+        """
+
+        shareList = [shareInfoTuple for shareInfoTuple in maxShareList
+                     if shareInfoTuple != INITIAL_SHARE_TUPLE]
+        if priceDecimals:
+            shareList = [(year, month, self._formatShareValue(shareValue, priceDecimals))
+                         for year, month, shareValue in shareList]
+        self.buffer.append(self._formatCompany(companyName, shareList, csvPath))
+        self.companyCount+= 1
+        if len(self.buffer) >= OUTPUT_BUFFER_SIZE:
+            self.flush()
+
+
+    def writeResults(self, maxShareDict, csvPath=None, priceDecimals=0):
+        """
+        Write the results of every company of maxShareDict in its order.
+
+        :parameters:
+            maxShareDict: `dict`
+                dictionary with company name as keys and Company() objects as values.
+
+            csvPath: `string`
+                path of the CSV file of the companies.
+
+            priceDecimals: `int`
+                number of decimal places of the share prices.
+
+        :returns:
+            None
+
+        :raises:
+            None
+
+        """
+
+        for companyName, companyObject in maxShareDict.items():
+            self.writeCompany(companyName, companyObject.maxShareList, csvPath, priceDecimals)
+
+
+    def flush(self):
+        """
+        Write the buffered records to outputFile.
+        """
+
+        self.outputFile.write(''.join(self.buffer))
+        self.buffer = []
+        self.outputFile.flush()
+
+
+    def close(self):
+        """
+        Write the footer of the output format and the buffered records, and
+        close outputFile if the writer opened it.
+        """
+
+        footer = self._getFooter()
+        if footer:
+            self.buffer.append(footer)
+        self.flush()
+        if self.closeFile:
+            self.outputFile.close()
+
+
+    def _getHeader(self):
+        """
+        Return the text written before the first company.
+        """
+
+        return ''
+
+
+    def _getFooter(self):
+        """
+        Return the text written after the last company.
+        """
+
+        return ''
+
+
+    def _formatShareValue(self, shareValue, priceDecimals):
+        """
+        Return a scaled share value in the form written by the output format.
+        """
+
+        return formatShareValue(shareValue, priceDecimals)
+
+
+    def _formatCompany(self, companyName, shareList, csvPath):
+        """
+        Return the text of the record of a company.
+        """
+
+        raise NotImplementedError
+
+
+class CsvResultWriter(ResultWriter):
+    """
+    class to write the results as CSV, one row per company and month. A company
+    without any valid share value gets a row with empty year, month and value.
+    """
+    def __init__(self, outputFile, closeFile=False):
+        self.lineBuffer = _LineBuffer()
+        self.csvWriter = csv.writer(self.lineBuffer, lineterminator='\n')
+        ResultWriter.__init__(self, outputFile, closeFile)
+
+
+    def _getHeader(self):
+        self.csvWriter.writerow(OUTPUT_CSV_HEADER)
+        return self.lineBuffer.getText()
+
+
+    def _formatCompany(self, companyName, shareList, csvPath):
+        if not shareList:
+            shareList = [('', '', '')]
+        self.csvWriter.writerows([(csvPath or '', companyName) + tuple(shareInfoTuple)
+                                  for shareInfoTuple in shareList])
+        return self.lineBuffer.getText()
+
+
+class JsonLinesResultWriter(ResultWriter):
+    """
+    class to write the results as JSON Lines, one JSON object per company:
+    {"file": ..., "company": ..., "peaks": [{"year": ..., "month": ..., "value": ...}]}
+    Decimal share values are written as JSON numbers with all their decimal
+    places, eg. 10.50, without going through a float.
+    """
+    def _formatCompany(self, companyName, shareList, csvPath):
+        return _formatCompanyRecord(companyName, shareList, csvPath) + '\n'
+
+
+class JsonResultWriter(JsonLinesResultWriter):
+    """
+    class to write the results as a single JSON array of the company objects
+    of JsonLinesResultWriter. The array is written as the companies come.
+    """
+    def _getHeader(self):
+        return '['
+
+
+    def _getFooter(self):
+        if self.companyCount:
+            return '\n]\n'
+        return ']\n'
+
+
+    def _formatCompany(self, companyName, shareList, csvPath):
+        separator = '\n' if not self.companyCount else ',\n'
+        return separator + _formatCompanyRecord(companyName, shareList, csvPath)
+
+
+class _LineBuffer():
+    """
+    file like object collecting the lines written by csv.writer.
+    """
+    def __init__(self):
+        self.lines = []
+
+
+    def write(self, line):
+        self.lines.append(line)
+
+
+    def getText(self):
+        text = ''.join(self.lines)
+        self.lines = []
+        return text
+
+
+RESULT_WRITERS = {CSV_FORMAT: CsvResultWriter,
+                  JSON_LINES_FORMAT: JsonLinesResultWriter,
+                  JSON_FORMAT: JsonResultWriter}
+
+
+def openResultWriter(outputFormat, outputPath=None):
+    """
+    Return the streaming writer of an output format, writing to a file or stdout.
+
+    :parameters:
+        outputFormat: `string`
+            CSV_FORMAT, JSON_LINES_FORMAT or JSON_FORMAT.
+
+        outputPath: `string`
+            path of the output file. None or '-' writes to stdout.
+
+    :returns:
+        resultWriter: `ResultWriter`
+            writer of the results. close() has to be called once all the
+            results are written.
+
+    :raises:
+        Exception: `CsvError`
+            if the output format is not supported.
+
+        Exception: `IOError`
+            if the output file cannot be opened.
+
+    """
+
+    if outputFormat not in RESULT_WRITERS:
+        raise CsvError("Output format: %s is not supported. Supported formats: %s"
+                       %(outputFormat, ', '.join(RESULT_WRITERS)))
+
+    writerClass = RESULT_WRITERS[outputFormat]
+    if outputPath is None or outputPath == '-':
+        return writerClass(sys.stdout)
+    return writerClass(open(outputPath, 'wb'), closeFile=True)
+
+
+def _formatCompanyRecord(companyName, shareList, csvPath):
+    """
+    Return the JSON text of the object of a company, with the keys in the same
+    order in every record. The share values, integers or the decimal strings of
+    formatShareValue, are written as they are as JSON numbers, so that no
+    decimal place is lost or added by a float.
+    """
+
+    peakList = ['{"year": %s, "month": %s, "value": %s}' %(json.dumps(year), json.dumps(month),
+                                                           shareValue)
+                for year, month, shareValue in shareList]
+    return '{"file": %s, "company": %s, "peaks": [%s]}' %(json.dumps(csvPath),
+                                                           json.dumps(companyName),
+                                                           ', '.join(peakList))
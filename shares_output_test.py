@@ -0,0 +1,85 @@
+#!/usr/bin/env python
+
+import os
+import json
+import unittest
+import StringIO
+
+#import classes and functions from shares_output and company_shares modules
+from shares_output import CsvResultWriter
+from shares_output import JsonLinesResultWriter
+from shares_output import JsonResultWriter
+from shares_output import openResultWriter
+from company_shares import SharesInfo
+from company_shares import CsvError
+
+from company_shares_test import TIES_CSV_LINES
+from company_shares_test import writeTempCsv
+from company_shares_test import captureOutput
+
+
+class TestSharesOutput(unittest.TestCase):
+    """
+    Class for testcases for the module shares_output
+    """
+
+    def setUp(self):
+        self.csvPath = writeTempCsv(TIES_CSV_LINES)
+
+    def tearDown(self):
+        os.remove(self.csvPath)
+
+    def processCsvFile(self, writerClass):
+        outputFile = StringIO.StringIO()
+        resultWriter = writerClass(outputFile)
+        sharesInfo = SharesInfo(self.csvPath, resultWriter=resultWriter)
+        captureOutput(sharesInfo.processCsvFile)
+        resultWriter.close()
+        return outputFile.getvalue()
+
+    # test CsvResultWriter through SharesInfo.processCsvFile.
+    def testCsvResultWriter(self):
+
+        lines = self.processCsvFile(CsvResultWriter).splitlines()
+        self.assertEqual(lines[0], 'File,Company,Year,Month,Share Value')
+        self.assertEqual(lines[1], '%s,Company A,1990,Feb,30' %self.csvPath)
+        self.assertTrue('%s,Company C,,,' %self.csvPath in lines)
+        self.assertEqual(lines[-1], '%s,Company D,1991,Apr,7' %self.csvPath)
+        self.assertEqual(len(lines), 11)
+
+
+    # test that JsonLinesResultWriter and JsonResultWriter write the same records.
+    def testJsonResultWriters(self):
+
+        recordList = [json.loads(line) for line
+                      in self.processCsvFile(JsonLinesResultWriter).splitlines()]
+        self.assertEqual(json.loads(self.processCsvFile(JsonResultWriter)), recordList)
+        self.assertEqual([record['company'] for record in recordList],
+                         ['Company A', 'Company B', 'Company C', 'Company D'])
+        self.assertEqual(recordList[3]['peaks'], [{'year': '1991', 'month': 'Mar', 'value': 7},
+                                                  {'year': '1991', 'month': 'Apr', 'value': 7}])
+        self.assertEqual(recordList[2]['peaks'], [])
+
+        # decimal share values are written with all their decimal places.
+        outputFile = StringIO.StringIO()
+        resultWriter = JsonLinesResultWriter(outputFile)
+        resultWriter.writeCompany('Company A', [('1990', 'Feb', 1050), ('1991', 'Mar', -5)],
+                                  priceDecimals=2)
+        resultWriter.close()
+        self.assertTrue('"value": 10.50}' in outputFile.getvalue())
+        self.assertTrue('"value": -0.05}' in outputFile.getvalue())
+        self.assertEqual(json.loads(outputFile.getvalue())['peaks'][0]['value'], 10.5)
+
+
+    # test openResultWriter with an unknown format and an empty JSON output.
+    def testOpenResultWriter(self):
+
+        self.assertRaises(CsvError, openResultWriter, 'xml')
+        outputFile = StringIO.StringIO()
+        resultWriter = JsonResultWriter(outputFile)
+        resultWriter.close()
+        self.assertEqual(json.loads(outputFile.getvalue()), [])
+
+
+if __name__ == '__main__':
+    unittest.main()